@@ -0,0 +1,21 @@
+from dateutil import parser
+
+from kardboard.models import FlowReport
+
+
+def backfill(start_date, end_date, replace=False):
+    written = FlowReport.backfill(start_date, end_date, replace=replace)
+    print "Wrote %s flow reports from %s to %s" % (written, start_date, end_date)
+
+
+if __name__ == "__main__":
+    import sys
+    try:
+        start_date = parser.parse(sys.argv[1])
+        end_date = parser.parse(sys.argv[2])
+    except IndexError:
+        print "Usage: {{start date}} {{end date}} [--replace]"
+        raise
+
+    replace = '--replace' in sys.argv[3:]
+    backfill(start_date, end_date, replace)
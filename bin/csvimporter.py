@@ -14,60 +14,52 @@ def parse_date(date_string):
         return None
 
 
+def print_errors(result):
+    for row, e in result.errors:
+        print "Error reported!"
+        print row
+        print str(e)
+        print "============="
+        print
+        print
+    print "Created: %s Updated: %s Errors: %s" % (
+        result.inserted, result.updated, len(result.errors))
+
+
 def parse_kardboard_output(csv_filename):
     reader = csv.DictReader(open(csv_filename))
-    for row in reader:
 
-        try:
-            k = Kard.objects.get(key=row['key'])
-        except Kard.DoesNotExist:
-            k = Kard()
+    def rows():
+        for row in reader:
+            state = row['state']
+            if state == "Unknown":
+                state = "Done"
+            yield {
+                'key': row['key'],
+                'title': row['title'],
+                'state': state,
+                'backlog_date': parse_date(row['backlog_date']),
+                'start_date': parse_date(row['start_date']),
+                'done_date': parse_date(row['done_date']),
+            }
 
-        try:
-            k.category = row['category']
-            k.backlog_date = parse_date(row['backlog_date'])
-            k.start_date = parse_date(row['start_date'])
-            k.done_date = parse_date(row['done_date'])
-            k.key = row['key']
-            k.title = row['title']
-            k.state = row['state']
-            if k.state == "Unknown":
-                k.state = "Done"
-            k.save()
-        except Exception, e:
-            print "Error reported!"
-            print row
-            print str(e)
-            print "============="
-            print
-            print
+    print_errors(Kard.bulk_upsert(rows()))
 
 
 def parse_google_output(csv_filename):
     reader = csv.DictReader(open(csv_filename))
-    for row in reader:
 
-        try:
-            k = Kard.objects.get(key=row['Ticket'])
-        except Kard.DoesNotExist:
-            k = Kard()
+    def rows():
+        for row in reader:
+            yield {
+                'key': row['Ticket'],
+                'title': row['Card title'],
+                'backlog_date': parse_date(row['Backlog Date']),
+                'start_date': parse_date(row['Start Date']),
+                'done_date': parse_date(row['Done Date']),
+            }
 
-        try:
-            k.category = row['Category']
-            k.backlog_date = parse_date(row['Backlog Date'])
-            k.start_date = parse_date(row['Start Date'])
-            k.done_date = parse_date(row['Done Date'])
-            k.key = row['Ticket']
-            k.title = row['Card title']
-            k.shirt_size = row['Shirt Size']
-            k.save()
-        except Exception, e:
-            print "Error reported!"
-            print row
-            print str(e)
-            print "============="
-            print
-            print
+    print_errors(Kard.bulk_upsert(rows()))
 
 if __name__ == "__main__":
     import sys
@@ -3,8 +3,6 @@ import datetime
 from kardboard.models import Kard, DailyRecord
 from kardboard.util import make_start_date, make_end_date
 
-from kardboard.tasks import queue_daily_record_updates
-
 
 def main():
     oldest_card = Kard.objects.all().order_by('+backlog_date')[0]
@@ -18,8 +16,8 @@ def main():
     days = end_date - start_date
     print "Going back %s days" % days.days
 
-    r = queue_daily_record_updates.apply(args=(days.days,))
-    r.get()
+    written = DailyRecord.rebuild_range(start_date, end_date)
+    print "Wrote %s daily records" % written
 
     print "DONE!"
     print "Daily records: %s" % DailyRecord.objects.count()
@@ -0,0 +1,31 @@
+from kardboard.models import Kard, KardTicketData
+from kardboard.util import chunked
+
+# Move ticket data saved on the cards themselves into kard_ticket_data,
+# copying the fields Kard keeps from it as we go.
+collection = Kard.objects._collection
+legacy = collection.find(
+    {'_ticket_system_data': {'$exists': True}},
+    fields=['_ticket_system_data'],
+    snapshot=True,
+)
+
+moved = 0
+for docs in chunked(legacy, 500):
+    ticket_data = dict([(doc['_id'], doc['_ticket_system_data'] or {}) for doc in docs])
+    KardTicketData.store_many(ticket_data)
+
+    for card_id, data in ticket_data.items():
+        k = Kard(_ticket_system_data=data)
+        collection.update({'_id': card_id}, {
+            '$set': {
+                'developers': k._developers,
+                'qaers': k._qaers,
+                'reporter': k._reporter,
+                'ticket_status': k._ticket_status,
+                'ticket_status_icon': k._ticket_status_icon,
+            },
+            '$unset': {'_ticket_system_data': 1},
+        })
+    moved += len(docs)
+    print "Moved ticket data for %s cards" % moved
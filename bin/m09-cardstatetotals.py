@@ -0,0 +1,6 @@
+from kardboard.models import CardStateTotals
+
+# Work out every card's time in each state from its StateLogs. Safe to
+# run again whenever the totals need rebuilding from history.
+count = CardStateTotals.rebuild()
+print "Rebuilt state totals for %s cards" % count
@@ -0,0 +1,6 @@
+from kardboard.models import StateTransitionCount
+
+# Count every card's state entries and exits per day from its StateLogs.
+# Safe to run again whenever the counts need rebuilding from history.
+count = StateTransitionCount.rebuild()
+print "Counted %s state transitions" % count
@@ -0,0 +1,11 @@
+from kardboard.models import FlowReport, FlowSeries
+
+# Lay out every group's FlowReports in monthly columns for the charts.
+# Safe to run again whenever the series need rebuilding.
+first = FlowReport.objects.order_by('date').first()
+last = FlowReport.objects.order_by('-date').first()
+if first is not None:
+    groups = FlowReport.objects.distinct('group')
+    FlowSeries.refresh(first.date, last.date, groups)
+    print "Laid out flow reports for %s groups from %s to %s" % \
+        (len(groups), first.date, last.date)
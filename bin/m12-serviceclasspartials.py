@@ -0,0 +1,21 @@
+from kardboard.app import app
+from kardboard.models import Kard, ServiceClassPartial
+from kardboard.util import month_range, now
+from dateutil.relativedelta import relativedelta
+
+# Total up every month's done cards for each report group, so the
+# service class records can be merged from them.
+# Safe to run again whenever the partials need recomputing, e.g. after
+# SERVICE_CLASSES goals change.
+first = Kard.objects.done().order_by('done_date').first()
+if first is not None:
+    groups = app.config.get('REPORT_GROUPS', {}).keys() + ['all']
+    month = month_range(first.done_date)[0]
+    count = 0
+    while month <= now():
+        for group in groups:
+            ServiceClassPartial.calculate(month, group)
+        month += relativedelta(months=1)
+        count += 1
+    print "Calculated %s months of service class partials for %s groups" % \
+        (count, len(groups))
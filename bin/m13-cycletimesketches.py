@@ -0,0 +1,6 @@
+from kardboard.models import CycleTimeSketch
+
+# Count every done card's cycle time into its team's weekly sketch.
+# Safe to run again whenever the sketches need rebuilding from the cards.
+count = CycleTimeSketch.rebuild()
+print "Counted %s done cards into cycle time sketches" % count
@@ -0,0 +1,6 @@
+from kardboard.models import CardHistory
+
+# Record when each card's archived logs start and end, so flow report
+# backfills can read the histories in order. Safe to run again.
+filled = CardHistory.fill_bounds()
+print "Set the bounds of %s card histories" % filled
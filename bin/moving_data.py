@@ -1,6 +1,6 @@
 from dateutil.relativedelta import relativedelta
 from kardboard.models import Kard, ReportGroup, FlowReport, DailyRecord
-from kardboard.util import make_start_date, make_end_date, average, standard_deviation
+from kardboard.util import make_start_date, make_end_date, RollingStats
 
 
 def parse_date(datestr):
@@ -71,8 +71,9 @@ def moving_data(report_group_slug, start, stop):
     features = [k for k in kards if k.is_card]
     defects = [k for k in kards if not k.is_card]
     over_sla = [k for k in kards if k.cycle_time > k.service_class['upper']]
-    card_cycle_ave = average([k.cycle_time for k in kards]) or 0
-    card_stddev = standard_deviation([k.cycle_time for k in kards]) or 0
+    cycle_times = RollingStats([k.cycle_time for k in kards if k.cycle_time is not None])
+    card_cycle_ave = cycle_times.mean() or 0
+    card_stddev = cycle_times.standard_deviation() or 0
 
     wip = find_wip(report_group_slug, stop)
     tpa = daily_throughput_average(report_group_slug, stop)
@@ -6,8 +6,9 @@ from time_in_state import (
     parse_date,
     _get_team,
     Kard,
-    _get_card_logs,
 )
+from kardboard.models.cardhistory import CardHistory
+from kardboard.models.statelog import StateLog
 
 def histogram(times):
     d = defaultdict(int)
@@ -29,18 +30,26 @@ def state_cycle_history(team_name, state_name, start_date, end_date):
     team = _get_team(team_name)
     cards = _get_cards(team)
 
+    # Every card's logs for the state in one query
+    keys = dict([(card.id, card.key) for card in cards])
+    logs = StateLog.objects._collection.find({
+        'card': {'$in': keys.keys()},
+        'state': state_name,
+        'entered': {'$gte': start_date, '$lte': end_date},
+    })
+    totals = defaultdict(int)
+    for log in logs:
+        totals[keys[log['card']]] += StateLog._from_son(log).duration
+    # Plus the logs of done cards that have been compacted
+    for log in CardHistory.archived_logs(keys.keys(), state=state_name):
+        if start_date <= log.entered <= end_date:
+            totals[keys[log.card_id]] += log.duration
+
     by_card = {}
     state_hours = []
-    for card in cards:
-        card_total_time_in_state = 0
-        logs = _get_card_logs(card)
-        for log in logs:
-            if log.state == state_name:
-                if log.entered >= start_date:
-                    if log.entered <= end_date:
-                        card_total_time_in_state += log.duration
+    for key, card_total_time_in_state in totals.items():
         if card_total_time_in_state > 0:
-            by_card[card.key] = card_total_time_in_state
+            by_card[key] = card_total_time_in_state
             state_hours.append(card_total_time_in_state)
 
     filename = "%s_%s_%s.csv" % \
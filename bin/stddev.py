@@ -1,6 +1,6 @@
 from collections import defaultdict
 
-from kardboard.models import Kard, ReportGroup
+from kardboard.models import Kard, ReportGroup, CycleTimeSketch
 from kardboard.util import standard_deviation, make_start_date, make_end_date, average
 
 
@@ -65,6 +65,12 @@ def std_dev(start, stop):
         print "\t\t Ave: %s" % average(cycle_times)
         print "\t\t Stdev: %s" % standard_deviation(cycle_times)
 
+    # Merged from the weekly sketches, without reading the teams' cards
+    for team in sorted(ReportGroup('dev', None).teams or []):
+        pcts = CycleTimeSketch.percentiles(team, start, stop)
+        print "\t ## %s" % (team)
+        print "\t\t 50/80/95pct: %s / %s / %s" % (pcts[.5], pcts[.8], pcts[.95])
+
 
 if __name__ == "__main__":
     import sys
@@ -8,7 +8,7 @@ from dateutil.relativedelta import relativedelta
 from kardboard.app import app
 from kardboard.models.reportgroup import ReportGroup
 from kardboard.models.kard import Kard
-from kardboard.models.statelog import StateLog
+from kardboard.models.cardstatetotals import CardStateTotals
 from kardboard.models.states import States
 from kardboard.services import teams as team_service
 from kardboard.util import make_start_date, make_end_date, average, standard_deviation
@@ -59,30 +59,10 @@ def _get_cards_by_report_group(rg_slug, start, end):
     return done_cards
 
 
-def _get_card_logs(card):
-    return StateLog.objects.filter(card=card)
-
-
-def _sum_card_history(history):
-    data = {}
-    for state, logs in history.items():
-        state_sum = 0
-        for log in logs:
-            state_sum += log.duration
-        data[state] = state_sum
-    return data
-
-
 def collect_card_state_time(cards):
     data = {}
-    for card in cards:
-        logs = _get_card_logs(card)
-        card_history = {}
-        for log in logs:
-            hist = card_history.get(log.state, [])
-            hist.append(log)
-            card_history[log.state] = hist
-        card_history = _sum_card_history(card_history)
+    totals = CardStateTotals.for_cards([card.id for card in cards])
+    for card_history in totals.values():
         for state, state_sum in card_history.items():
             state_data = data.get(state, [])
             state_data.append(state_sum)
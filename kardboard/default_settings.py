@@ -61,6 +61,17 @@ TICKET_AUTH = False
 # How old can tickets get before we refresh
 TICKET_UPDATE_THRESHOLD = 60 * 5
 
+# How old can the in-memory card date index get before we reload it
+CARD_INDEX_MAX_AGE = 60 * 5
+
+# Write StateLogs in bulk at the end of each request and task
+STATELOG_JOURNAL = False
+STATELOG_JOURNAL_SIZE = 500
+STATELOG_COMPACT_AFTER = 90
+
+# How long a queued task call keeps others like it from being queued
+TASK_COALESCE_TTL = 15 * 60
+
 from celery.schedules import crontab
 CELERYBEAT_SCHEDULE = {
     # How often should we look for old tickets and queue them for updates
@@ -84,19 +95,18 @@ CELERYBEAT_SCHEDULE = {
         'schedule': crontab(minute=1, hour=1),
         'args': (365, ),
     },
-    # How often (probably nighly) should we update daily records for the past
-    # 365 days
+    # How often (probably weekly) should we rebuild daily records for the
+    # past 365 days, to pick up changes to REPORT_GROUPS
     'calc-daily-records-year': {
-        'task': 'tasks.queue_daily_record_updates',
-        'schedule': crontab(minute=1, hour=0),
+        'task': 'tasks.rebuild_daily_records',
+        'schedule': crontab(minute=1, hour=0, day_of_week='sunday'),
         'args': (365, ),
     },
-    # How often should we update daily records for the past
-    # 14 days
-    'calc-daily-records-week': {
-        'task': 'tasks.queue_daily_record_updates',
+    # How often should we update today's daily records, and any earlier
+    # ones that changes to cards have put out of date
+    'calc-daily-records-dirty': {
+        'task': 'tasks.rebuild_dirty_daily_records',
         'schedule': crontab(minute="*/15"),
-        'args': (14, ),
     },
     # Capture/update the day's flow data
     'update_flow_reports': {
@@ -107,5 +117,10 @@ CELERYBEAT_SCHEDULE = {
     'queue_service_class_reports': {
         'task': 'tasks.queue_service_class_reports',
         'schedule': crontab(minute="*/1"),
-    }
+    },
+    # Nightly, archive the StateLogs of cards done for a while
+    'compact_statelogs': {
+        'task': 'tasks.compact_statelogs',
+        'schedule': crontab(minute=30, hour=2),
+    },
 }
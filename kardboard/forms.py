@@ -9,7 +9,7 @@ from wtforms import (
 )
 from wtforms.ext.dateutil.fields import DateField
 
-from kardboard.models import Kard, States
+from kardboard.models import Kard, config_snapshot
 
 
 def _make_choice_field_ready(choice_list):
@@ -34,7 +34,7 @@ class Unique(object):
 
 
 def done_date_validator(form, field):
-        states = States()
+        states = config_snapshot().states
         if form.state.data == states.done:
             if field.data is None:
                 raise ValidationError("Done date required since the card's state is %s" % form.state.data)
@@ -43,7 +43,7 @@ def done_date_validator(form, field):
 
 
 def start_date_validator(form, field):
-        states = States()
+        states = config_snapshot().states
         if states.index(form.state.data) >= states.index(states.start):
             if field.data is None:
                 raise ValidationError("Start date required since the card's state is %s" % form.state.data)
@@ -1,13 +1,23 @@
 from mongoengine.queryset import Q
 
 from kardboard.models.kard import Kard
+from kardboard.models.kardticketdata import KardTicketData
+from kardboard.models.kardview import KardView
 from kardboard.models.dailyrecord import DailyRecord
+from kardboard.models.dailyrecordledger import DailyRecordLedger
 from kardboard.models.person import Person
 from kardboard.models.reportgroup import ReportGroup
 from kardboard.models.states import States
+from kardboard.models.configsnapshot import ConfigSnapshot, config_snapshot
 from kardboard.models.boards import DisplayBoard
 from kardboard.models.personcardset import PersonCardSet
 from kardboard.models.flowreport import FlowReport
+from kardboard.models.flowseries import FlowSeries
 from kardboard.models.statelog import StateLog
-from kardboard.models.serviceclassrecord import ServiceClassRecord, ServiceClassSnapshot
+from kardboard.models.cardstatetotals import CardStateTotals
+from kardboard.models.cardhistory import CardHistory
+from kardboard.models.transitioncount import StateTransitionCount
+from kardboard.models.cycletimesketch import CycleTimeSketch
+from kardboard.models.serviceclassrecord import ServiceClassRecord, ServiceClassSnapshot, ServiceClassPartial
+from kardboard.models.tasklock import TaskLock
 from kardboard.models.team import Team, TeamList
\ No newline at end of file
@@ -3,8 +3,9 @@ from dateutil.relativedelta import relativedelta
 from mongoengine.queryset import Q
 
 from kardboard.app import app
-from kardboard.models.states import States
+from kardboard.models.configsnapshot import config_snapshot
 from kardboard.models.kard import Kard
+from kardboard.services.cardtimes import CardTimes
 from kardboard.util import (
     now,
     log_exception
@@ -13,7 +14,7 @@ from kardboard.util import (
 
 class DisplayBoard(object):
     def __init__(self, teams=None, done_days=7, backlog_limit=None):
-        self.states = States()
+        self.states = config_snapshot().states
         self.done_days = done_days
         self._cards = None
         self._rows = []
@@ -68,8 +69,8 @@ class DisplayBoard(object):
                     non_pri.reverse()
                     cards = pri_cards + non_pri
                 elif state in self.states.in_progress:
-                    cards = sorted(cards, key=lambda c: c.current_cycle_time())
-                    cards.reverse()
+                    times = CardTimes(cards)
+                    cards = times.ordered(times.cycle_times, reverse=True)
                 else:
                     try:
                         cards = sorted(cards, key=lambda c: c.done_date)
@@ -107,20 +108,20 @@ class DisplayBoard(object):
             team__in=self.teams)
         if self.backlog_limit:
             ordered_backlog_cards = Kard.objects.filter(ordered_backlog_q).order_by('priority', 'created_at')
-            ordered_backlog_cards = ordered_backlog_cards.limit(self.backlog_limit).exclude('_ticket_system_data')
+            ordered_backlog_cards = ordered_backlog_cards.limit(self.backlog_limit).views()
             unordered_backlog_cards = []
             if len(ordered_backlog_cards) < self.backlog_limit:
                 unordered_backlog_cards = Kard.objects.filter(unordered_backlog_q).order_by('created_at')
-                unordered_backlog_cards = unordered_backlog_cards.limit(self.backlog_limit).exclude('_ticket_system_data')
+                unordered_backlog_cards = unordered_backlog_cards.limit(self.backlog_limit).views()
 
-            backlog_cards = list(ordered_backlog_cards) + list(unordered_backlog_cards)
+            backlog_cards = ordered_backlog_cards + unordered_backlog_cards
             backlog_cards = backlog_cards[:self.backlog_limit]
 
             cards_query = in_progress_q | done_q
-            cards = list(Kard.objects.filter(cards_query).exclude('_ticket_system_data'))
+            cards = Kard.objects.filter(cards_query).views()
             self._cards = backlog_cards + cards
         else:
             cards_query = total_backlog_q | in_progress_q | done_q
-            self._cards = list(Kard.objects.filter(cards_query).exclude('_ticket_system_data'))
+            self._cards = Kard.objects.filter(cards_query).views()
 
         return self._cards
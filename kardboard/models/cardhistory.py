@@ -0,0 +1,157 @@
+import heapq
+from collections import defaultdict
+
+from kardboard.app import app
+from kardboard.util import chunked, now
+
+
+class CardHistory(app.db.Document):
+    """
+    The closed StateLogs of a done card, folded into one document by
+    compact() so the StateLog collection only holds the logs that are
+    still in play.
+    """
+
+    card_id = app.db.ObjectIdField(primary_key=True)
+    """The id of the card the history belongs to."""
+
+    logs = app.db.ListField()
+    """[state, entered, exited, service_class] for each archived log."""
+
+    first_entered = app.db.DateTimeField()
+    """The earliest entered of the logs."""
+
+    last_exited = app.db.DateTimeField()
+    """The latest exited of the logs."""
+
+    updated_at = app.db.DateTimeField(required=True)
+
+    meta = {
+        'collection': 'card_history',
+        'indexes': ['first_entered'],
+    }
+
+    @classmethod
+    def compact(klass, done_before, chunk_size=500):
+        """
+        Moves the closed StateLogs of cards done on or before done_before
+        into their CardHistory. Running it again after an interruption
+        won't archive a log twice. Returns the number of logs moved.
+        """
+        from kardboard.models.kard import Kard
+        from kardboard.models.statelog import StateLog
+
+        done_cards = Kard.objects._collection.find(
+            {'done_date': {'$lte': done_before}}, fields=['_id'])
+        log_collection = StateLog.objects._collection
+        collection = klass.objects._collection
+
+        moved = 0
+        for docs in chunked(done_cards, chunk_size):
+            logs = list(log_collection.find(
+                {'card': {'$in': [doc['_id'] for doc in docs]},
+                    'exited': {'$exists': True}},
+                fields=['card', 'state', 'entered', 'exited', 'service_class']))
+            if not logs:
+                continue
+
+            by_card = defaultdict(list)
+            for log in logs:
+                by_card[log['card']].append([log['state'], log['entered'],
+                    log['exited'], log.get('service_class')])
+
+            bounds = dict([(doc['_id'], doc) for doc in collection.find(
+                {'_id': {'$in': by_card.keys()}},
+                fields=['first_entered', 'last_exited'])])
+            timestamp = now()
+            for card_id, entries in by_card.items():
+                entered = [entry[1] for entry in entries]
+                exited = [entry[2] for entry in entries]
+                existing = bounds.get(card_id)
+                if existing and existing.get('first_entered'):
+                    entered.append(existing['first_entered'])
+                    exited.append(existing['last_exited'])
+                collection.update(
+                    {'_id': card_id},
+                    {'$addToSet': {'logs': {'$each': entries}},
+                        '$set': {
+                            'first_entered': min(entered),
+                            'last_exited': max(exited),
+                            'updated_at': timestamp,
+                        }},
+                    upsert=True,
+                )
+            log_collection.remove({'_id': {'$in': [log['_id'] for log in logs]}})
+            moved += len(logs)
+        return moved
+
+    @classmethod
+    def archived_logs(klass, card_ids=None, state=None):
+        """
+        Yields the archived logs as unsaved StateLogs, for the cards in
+        card_ids and the given state, or for all of them if None.
+        """
+        from kardboard.models.statelog import StateLog
+
+        spec = {}
+        if card_ids is not None:
+            spec['_id'] = {'$in': list(card_ids)}
+        for doc in klass.objects._collection.find(spec):
+            for log_state, entered, exited, service_class in doc['logs']:
+                if state is not None and log_state != state:
+                    continue
+                yield StateLog._from_son({
+                    'card': doc['_id'],
+                    'state': log_state,
+                    'entered': entered,
+                    'exited': exited,
+                    'service_class': service_class,
+                    'created_at': entered,
+                    'updated_at': exited,
+                })
+
+    @classmethod
+    def spans(klass, start_date, end_date):
+        """
+        Yields (entered, card id, state, exited) for the archived logs
+        open at any time from start_date to end_date, in order of
+        entered. Histories are read in order of their first log, so only
+        the logs of cards whose histories overlap are held at once.
+        """
+        docs = klass.objects._collection.find(
+            {'first_entered': {'$lte': end_date}, 'last_exited': {'$gt': start_date}},
+            fields=['logs', 'first_entered'],
+            sort=[('first_entered', 1)])
+        pending = []
+        for doc in docs:
+            # Every log still to come entered on or after this
+            while pending and pending[0][0] <= doc['first_entered']:
+                yield heapq.heappop(pending)
+            for state, entered, exited, service_class in doc['logs']:
+                if entered <= end_date and exited > start_date:
+                    heapq.heappush(pending, (entered, doc['_id'], state, exited))
+        while pending:
+            yield heapq.heappop(pending)
+
+    @classmethod
+    def fill_bounds(klass):
+        """
+        Sets first_entered and last_exited on histories archived before
+        they were kept. Returns the number of histories updated.
+        """
+        collection = klass.objects._collection
+        filled = 0
+        for doc in collection.find({'first_entered': {'$exists': False}},
+                fields=['logs']):
+            if not doc['logs']:
+                continue
+            collection.update({'_id': doc['_id']}, {'$set': {
+                'first_entered': min([log[1] for log in doc['logs']]),
+                'last_exited': max([log[2] for log in doc['logs']]),
+            }})
+            filled += 1
+        return filled
+
+    @classmethod
+    def remove(klass, card_id):
+        klass.objects._collection.remove({'_id': card_id})
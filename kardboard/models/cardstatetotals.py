@@ -0,0 +1,121 @@
+from collections import defaultdict
+
+from kardboard.app import app
+from kardboard.util import chunked, delta_in_hours, now
+
+
+def _state_key(state):
+    # Field names can't have dots in them
+    return state.replace(u'.', u'\uff0e')
+
+
+def _state_name(key):
+    return key.replace(u'\uff0e', u'.')
+
+
+class CardStateTotals(app.db.Document):
+    """
+    The hours a card has spent in each state, summed over the StateLogs
+    it has exited. StateLog adds to it as logs are closed, and rebuild()
+    works it out again from all the logs.
+    """
+
+    card_id = app.db.ObjectIdField(primary_key=True)
+    """The id of the card the totals belong to."""
+
+    hours = app.db.DictField()
+    """Hours spent in each state, keyed by state."""
+
+    updated_at = app.db.DateTimeField(required=True)
+
+    meta = {
+        'collection': 'card_state_totals',
+    }
+
+    @classmethod
+    def add_logs(klass, logs):
+        """
+        Adds the durations of closed logs, given as (card_id, state,
+        entered, exited, duration) where duration may be None to work it
+        out from entered and exited. Costs one update per card.
+        """
+        by_card = defaultdict(dict)
+        for card_id, state, entered, exited, duration in logs:
+            if duration is None:
+                duration = delta_in_hours(exited - entered)
+            field = 'hours.%s' % _state_key(state)
+            incs = by_card[card_id]
+            incs[field] = incs.get(field, 0) + duration
+
+        collection = klass.objects._collection
+        timestamp = now()
+        for card_id, incs in by_card.items():
+            collection.update(
+                {'_id': card_id},
+                {'$inc': incs, '$set': {'updated_at': timestamp}},
+                upsert=True,
+            )
+
+    @classmethod
+    def for_cards(klass, card_ids, include_open=True):
+        """
+        {card_id: {state: hours}} for the cards, in two queries.
+
+        With include_open, time in the states cards haven't exited yet is
+        counted up to now, the way StateLog.duration does.
+        """
+        from kardboard.models.statelog import StateLog
+
+        card_ids = list(card_ids)
+        totals = dict([(card_id, {}) for card_id in card_ids])
+        docs = klass.objects._collection.find(
+            {'_id': {'$in': card_ids}}, fields=['hours'])
+        for doc in docs:
+            totals[doc['_id']] = dict([(_state_name(key), hours)
+                for key, hours in (doc.get('hours') or {}).items()])
+
+        if include_open:
+            timestamp = now()
+            logs = StateLog.objects._collection.find(
+                {'card': {'$in': card_ids}, 'exited': {'$exists': False}},
+                fields=['card', 'state', 'entered'])
+            for log in logs:
+                hours = totals[log['card']]
+                hours[log['state']] = hours.get(log['state'], 0) + \
+                    delta_in_hours(timestamp - log['entered'])
+        return totals
+
+    @classmethod
+    def remove(klass, card_id):
+        klass.objects._collection.remove({'_id': card_id})
+
+    @classmethod
+    def rebuild(klass):
+        """
+        Replaces every card's totals with ones worked out from all the
+        exited StateLogs, archived ones included. Returns the number of
+        cards with totals.
+        """
+        from kardboard.models.cardhistory import CardHistory
+        from kardboard.models.statelog import StateLog
+
+        logs = StateLog.objects._collection.find(
+            {'exited': {'$exists': True}},
+            fields=['card', 'state', 'entered', 'exited', '_duration'])
+        by_card = defaultdict(lambda: defaultdict(int))
+        for log in logs:
+            duration = log.get('_duration')
+            if duration is None:
+                duration = delta_in_hours(log['exited'] - log['entered'])
+            by_card[log['card']][_state_key(log['state'])] += duration
+        for log in CardHistory.archived_logs():
+            by_card[log.card_id][_state_key(log.state)] += log.duration
+
+        collection = klass.objects._collection
+        collection.remove({})
+        timestamp = now()
+        for chunk in chunked(by_card.items(), 500):
+            collection.insert([
+                {'_id': card_id, 'hours': dict(hours), 'updated_at': timestamp}
+                for card_id, hours in chunk])
+        return len(by_card)
@@ -0,0 +1,86 @@
+from kardboard.app import app
+from kardboard.models.states import States
+
+
+EMPTY_SERVICE_CLASS = {'name': '', 'upper': '', 'lower': '', 'wip': ''}
+
+
+class ConfigSnapshot(object):
+    """
+    The parts of the config that cards and reports look up over and over,
+    worked out once: the States, each service class's goal record and
+    each report group's teams.
+
+    Treat it as read-only; everything in it is shared.
+    """
+
+    WATCHED = (
+        'CARD_STATES',
+        'BACKLOG_STATE',
+        'START_STATE',
+        'DONE_STATE',
+        'FUNNEL_VIEWS',
+        'SERVICE_CLASSES',
+        'REPORT_GROUPS',
+    )
+    """The config keys a snapshot is built from."""
+
+    def __init__(self, config):
+        self.sources = [config.get(name) for name in self.WATCHED]
+        self.states = States(config)
+
+        self.service_classes = {}
+        for name, classdef in config.get('SERVICE_CLASSES', {}).items():
+            self.service_classes[name] = {
+                'name': classdef.get('name', ''),
+                'upper': classdef.get('upper', ''),
+                'lower': classdef.get('lower', ''),
+                'wip': classdef.get('wip', ''),
+            }
+
+        self.report_groups = {}
+        self.report_group_slugs = config.get('REPORT_GROUPS', {}).keys() + ['all']
+        for slug, group in config.get('REPORT_GROUPS', {}).items():
+            if group and group[0]:
+                self.report_groups[slug] = frozenset(group[0])
+
+    def is_current(self, config):
+        """
+        Whether config still has the values the snapshot was built from.
+        Settings are swapped out rather than changed in place, so this
+        compares them by identity.
+        """
+        for name, value in zip(self.WATCHED, self.sources):
+            if config.get(name) is not value:
+                return False
+        return True
+
+    def service_class(self, name):
+        """The goal record for a card's service class name, or the default's."""
+        return self.service_classes.get(name or 'default', EMPTY_SERVICE_CLASS)
+
+    def report_group_teams(self, group):
+        """A report group's teams, or None if it isn't limited to any."""
+        return self.report_groups.get(group)
+
+    def report_groups_for(self, teams):
+        """The slugs of the report groups, 'all' included, that count any of teams."""
+        return [slug for slug in self.report_group_slugs
+            if slug not in self.report_groups or self.report_groups[slug] & set(teams)]
+
+
+_snapshot = None
+
+
+def config_snapshot():
+    """The ConfigSnapshot for app.config, rebuilt if the config has been reloaded."""
+    global _snapshot
+    if _snapshot is None or not _snapshot.is_current(app.config):
+        _snapshot = ConfigSnapshot(app.config)
+    return _snapshot
+
+
+def reset_config_snapshot():
+    """Drops the snapshot, for when settings have been changed in place."""
+    global _snapshot
+    _snapshot = None
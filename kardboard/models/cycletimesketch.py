@@ -0,0 +1,144 @@
+from collections import defaultdict
+
+from kardboard.app import app
+from kardboard.services.sketches import (
+    bucket_cycle_times,
+    cycle_time_changes,
+    merge_histograms,
+    percentile,
+    whole_weeks,
+)
+from kardboard.util import chunked, make_end_date, make_start_date, now
+
+
+class CycleTimeSketch(app.db.Document):
+    """
+    How many of a team's cards of a service class were done in a week
+    with each cycle time. Cards add to it as they're done, and
+    percentiles over any window are worked out by merging its weeks.
+    """
+
+    team = app.db.StringField()
+    week = app.db.DateTimeField(required=True)
+    """The start of the week the cards were done in."""
+
+    service_class = app.db.StringField()
+    """The cards' _service_class, None for cards without one."""
+
+    counts = app.db.DictField()
+    """{cycle time: cards}, with the cycle times as strings."""
+
+    updated_at = app.db.DateTimeField(required=True)
+
+    meta = {
+        'collection': 'cycle_time_sketches',
+        'allow_inheritance': False,
+        'indexes': [('team', 'week')],
+    }
+
+    @classmethod
+    def add(klass, changes):
+        """
+        Applies changes from services.sketches.cycle_time_changes().
+        Costs one update per team, week and service class.
+        """
+        collection = klass.objects._collection
+        timestamp = now()
+        for (team, week, service_class), counts in bucket_cycle_times(changes).items():
+            collection.update(
+                {'team': team, 'week': week, 'service_class': service_class},
+                {
+                    '$inc': dict([('counts.%s' % t, n) for t, n in counts.items()]),
+                    '$set': {'updated_at': timestamp},
+                },
+                upsert=True,
+            )
+
+    @classmethod
+    def histogram(klass, team, start_date, end_date, exclude_classes=()):
+        """
+        {cycle time: cards} for the team's cards done from start_date to
+        end_date. Whole weeks are merged from the sketches and only the
+        cards in the part weeks at either end are read, so the cost
+        doesn't grow with the length of the window.
+        """
+        from kardboard.models.kard import Kard
+
+        start_date = make_start_date(date=start_date)
+        end_date = make_end_date(date=end_date)
+        exclude_classes = list(exclude_classes)
+
+        histograms = []
+        first_week, last_week = whole_weeks(start_date, end_date)
+        if first_week < last_week:
+            docs = klass.objects._collection.find(
+                {
+                    'team': team,
+                    'week': {'$gte': first_week, '$lt': last_week},
+                    'service_class': {'$nin': exclude_classes},
+                },
+                fields=['counts'])
+            histograms.extend([dict([(int(t), n) for t, n in doc['counts'].items()])
+                for doc in docs])
+            spans = [{'$gte': start_date, '$lt': first_week},
+                {'$gte': last_week, '$lte': end_date}]
+        else:
+            spans = [{'$gte': start_date, '$lte': end_date}]
+
+        fields = dict([(name, Kard._fields[name].db_field)
+            for name in ('team', 'done_date', '_service_class', '_cycle_time')])
+        docs = Kard.objects._collection.find(
+            {
+                fields['team']: team,
+                fields['_service_class']: {'$nin': exclude_classes},
+                '$or': [{fields['done_date']: span} for span in spans],
+            },
+            fields=[fields['_cycle_time']])
+        edges = defaultdict(int)
+        for doc in docs:
+            if doc.get(fields['_cycle_time']) is not None:
+                edges[doc[fields['_cycle_time']]] += 1
+        histograms.append(edges)
+
+        return merge_histograms(histograms)
+
+    @classmethod
+    def percentiles(klass, team, start_date, end_date, target_pcts=(.5, .8, .95),
+            exclude_classes=()):
+        """
+        {target_pct: cycle time} for the team's cards done from
+        start_date to end_date, None where there weren't any.
+        """
+        histogram = klass.histogram(team, start_date, end_date, exclude_classes)
+        return dict([(pct, percentile(pct, histogram)) for pct in target_pcts])
+
+    @classmethod
+    def rebuild(klass):
+        """
+        Replaces every sketch with ones worked out from all the done
+        cards. Returns the number of cards counted.
+        """
+        from kardboard.models.kard import Kard
+
+        fields = [Kard._fields[name].db_field
+            for name in ('team', '_service_class', 'start_date', 'done_date')]
+        docs = Kard.objects._collection.find(
+            {fields[3]: {'$ne': None}}, fields=fields)
+        changes = []
+        for doc in docs:
+            changes.extend(cycle_time_changes(None,
+                tuple([doc.get(field) for field in fields])))
+
+        collection = klass.objects._collection
+        collection.remove({})
+        timestamp = now()
+        buckets = bucket_cycle_times(changes)
+        for chunk in chunked(buckets.items(), 500):
+            collection.insert([{
+                'team': team,
+                'week': week,
+                'service_class': service_class,
+                'counts': dict([(str(t), n) for t, n in counts.items()]),
+                'updated_at': timestamp,
+            } for (team, week, service_class), counts in chunk])
+        return len(changes)
@@ -1,9 +1,13 @@
 import datetime
+from collections import defaultdict
 
 from kardboard.app import app
 from kardboard.models.kard import Kard
+from kardboard.models.configsnapshot import config_snapshot
+from kardboard.models.dailyrecordledger import DailyRecordLedger
 from kardboard.models.reportgroup import ReportGroup
-from kardboard.util import make_end_date
+from kardboard.services.dailysweep import sweep_days
+from kardboard.util import make_end_date, make_start_date, chunked, now
 
 class DailyRecord(app.db.Document):
     """
@@ -73,17 +77,105 @@ class DailyRecord(app.db.Document):
             k.date = date
             k.group = group
 
-        k.backlog = ReportGroup(group, Kard.backlogged(date)).queryset.count()
-        k.in_progress = ReportGroup(group, Kard.in_progress(date)).queryset.count()
-        k.done = ReportGroup(group, Kard.objects.filter(done_date__lte=date)).queryset.count()
-        k.completed = ReportGroup(group, Kard.objects.filter(done_date=date)).queryset.count()
-        k.moving_cycle_time = ReportGroup(group, Kard.objects).queryset.moving_cycle_time(
-            year=date.year, month=date.month, day=date.day)
-        k.moving_lead_time = ReportGroup(group, Kard.objects).queryset.moving_lead_time(
-            year=date.year, month=date.month, day=date.day)
-        k.moving_std_dev = ReportGroup(group, Kard.objects).queryset.moving_std_dev(
-            year=date.year, month=date.month, day=date.day)
-        k.moving_median_abs_dev = ReportGroup(group, Kard.objects).queryset.moving_median_abs_dev(
-            year=date.year, month=date.month, day=date.day)
-
-        k.save()
\ No newline at end of file
+        index = Kard.interval_index()
+        teams = ReportGroup(group, None).teams
+        k.backlog = index.backlogged(date, teams)
+        k.in_progress = index.in_progress(date, teams)
+        k.done = index.done(date, teams)
+        k.completed = index.completed(date, teams)
+        moving = ReportGroup(group, Kard.objects).queryset.moving_stats(date)
+        k.moving_cycle_time = moving.cycle_time
+        k.moving_lead_time = moving.lead_time
+        k.moving_std_dev = moving.std_dev
+        k.moving_median_abs_dev = moving.median_abs_dev
+
+        k.save()
+
+    @classmethod
+    def rebuild_range(klass, start_date, end_date, groups=None):
+        """
+        Recreates the DailyRecords for every day from start_date to
+        end_date, for each of groups (all the report groups and 'all' by
+        default).
+
+        Rather than calculating each day separately, it reads the dates
+        and times of every card once, sweeps forward through the days
+        and writes the records in bulk, replacing any already there.
+        Returns the number of records written.
+        """
+        if groups is None:
+            groups = app.config.get('REPORT_GROUPS', {}).keys() + ['all']
+
+        start_date = make_end_date(date=start_date).replace(microsecond=0)
+        end_date = make_end_date(date=end_date)
+        days = []
+        day = start_date
+        while day <= end_date:
+            days.append(day)
+            day += datetime.timedelta(days=1)
+        if not days:
+            return 0
+
+        fields = ('backlog_date', 'start_date', 'done_date', 'team',
+            '_cycle_time', '_lead_time')
+        db_fields = [Kard._fields[name].db_field for name in fields]
+        cards = [[doc.get(f) for f in db_fields]
+            for doc in Kard.objects._collection.find({}, fields=db_fields)]
+
+        updated_at = datetime.datetime.now()
+        records = []
+        for group in groups:
+            teams = ReportGroup(group, None).teams
+            group_cards = [c[:3] + c[4:] for c in cards
+                if teams is None or c[3] in teams]
+            for summary in sweep_days(group_cards, days):
+                records.append(klass(
+                    date=summary.date,
+                    group=group,
+                    backlog=summary.backlog,
+                    in_progress=summary.in_progress,
+                    done=summary.done,
+                    completed=summary.completed,
+                    moving_cycle_time=summary.moving.cycle_time,
+                    moving_lead_time=summary.moving.lead_time,
+                    moving_std_dev=summary.moving.std_dev,
+                    moving_median_abs_dev=summary.moving.median_abs_dev,
+                    updated_at=updated_at,
+                ))
+
+        klass.objects.filter(
+            date__gte=make_start_date(date=days[0]),
+            date__lte=days[-1].replace(microsecond=999999),
+            group__in=groups,
+        ).delete()
+        for chunk in chunked(records, 500):
+            klass.objects.insert(chunk, load_bulk=False)
+        return len(records)
+
+    @classmethod
+    def rebuild_dirty(klass, today=None, days=365):
+        """
+        Recreates the DailyRecords that card saves have put out of date,
+        from each group's watermark in the DailyRecordLedger up to today,
+        plus today's record for every group. Days more than the given
+        number of days back are left alone. Returns the number of records
+        written.
+        """
+        today = make_start_date(date=today or now())
+        oldest = today - datetime.timedelta(days=days - 1)
+
+        claimed = DailyRecordLedger.claim()
+        by_since = defaultdict(list)
+        for group in config_snapshot().report_group_slugs:
+            since = max(claimed.get(group, today), oldest)
+            by_since[since].append(group)
+
+        written = 0
+        try:
+            for since, groups in by_since.items():
+                written += klass.rebuild_range(since, today, groups)
+        except Exception:
+            # Put the watermarks back for the next run to pick up
+            DailyRecordLedger.mark(claimed)
+            raise
+        return written
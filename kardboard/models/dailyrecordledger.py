@@ -0,0 +1,62 @@
+from pymongo.errors import DuplicateKeyError
+
+from kardboard.app import app
+
+
+class DailyRecordLedger(app.db.Document):
+    """
+    The earliest day whose DailyRecords are out of date, for each report
+    group. Card saves mark it, and DailyRecord.rebuild_dirty() claims it
+    to recompute only the days from there on.
+    """
+
+    group = app.db.StringField(primary_key=True)
+    """The report group whose records are out of date."""
+
+    since = app.db.DateTimeField(required=True)
+    """The first day that needs recomputing."""
+
+    meta = {
+        'collection': 'daily_record_ledger',
+    }
+
+    @classmethod
+    def mark(klass, marks):
+        """
+        Moves each group's watermark back to the date in marks, a
+        dictionary of {group: since}, if it's later or there isn't one.
+        Costs up to three queries per group, or more while it's being
+        marked or claimed at the same time.
+        """
+        collection = klass.objects._collection
+        for group, since in marks.items():
+            # claim() can take the watermark away between the writes, and
+            # another mark can put one in, so go round until one sticks
+            while True:
+                result = collection.update(
+                    {'_id': group, 'since': {'$gt': since}},
+                    {'$set': {'since': since}},
+                    safe=True,
+                )
+                if result['n']:
+                    break
+                try:
+                    collection.insert({'_id': group, 'since': since}, safe=True)
+                    break
+                except DuplicateKeyError:
+                    if collection.find_one({'_id': group, 'since': {'$lte': since}}):
+                        break
+
+    @classmethod
+    def claim(klass):
+        """
+        Takes the watermarks off the ledger, returning {group: since}.
+        A group marked earlier while it's being claimed keeps its new
+        watermark for next time.
+        """
+        collection = klass.objects._collection
+        claimed = {}
+        for doc in collection.find():
+            collection.remove({'_id': doc['_id'], 'since': doc['since']})
+            claimed[doc['_id']] = doc['since']
+        return claimed
@@ -1,11 +1,15 @@
 import datetime
+import heapq
 
 from kardboard.app import app
-from kardboard.models.states import States
-from kardboard.models.reportgroup import ReportGroup
+from kardboard.models.configsnapshot import config_snapshot
+from kardboard.models.flowseries import FlowSeries
 from kardboard.models.kard import Kard
+from kardboard.services.flow import count_flow, sweep_flow
 from kardboard.util import (
+    chunked,
     make_end_date,
+    make_start_date,
 )
 
 class FlowReport(app.db.Document):
@@ -41,23 +45,124 @@ class FlowReport(app.db.Document):
 
     @classmethod
     def capture(klass, group='all'):
-        date = datetime.datetime.now()
-        date = make_end_date(date=date)
-        try:
-            r = klass.objects.get(date=date, group=group)
-        except klass.DoesNotExist:
-            r = klass()
-            r.date = date
-            r.group = group
-
-        states = States()
-
-        for state in states:
-            group_cards = ReportGroup(group, Kard.objects.filter(state=state)).queryset
-            r.state_counts[state] = group_cards.count()
-
-            non_defects = [c for c in group_cards.only('_type') if c.is_card]
-            r.state_card_counts[state] = len(non_defects)
-
-        r.save()
-        return r
+        date = make_end_date(date=datetime.datetime.now())
+        klass.capture_all([group], date)
+        return klass.objects.get(date=date, group=group)
+
+    @classmethod
+    def capture_all(klass, groups=None, date=None):
+        """
+        Captures today's FlowReport for each of groups (all the report
+        groups and 'all' by default) from one scan of the cards, with one
+        upsert per group. Returns the number of reports written.
+        """
+        date = make_end_date(date=date or datetime.datetime.now())
+        snapshot = config_snapshot()
+        if groups is None:
+            groups = snapshot.report_group_slugs
+        report_groups = dict([(group, snapshot.report_group_teams(group))
+            for group in groups])
+
+        fields = [Kard._fields[name].db_field for name in ('state', 'team', '_type')]
+        default_type = app.config.get('DEFAULT_TYPE', '')
+        docs = Kard.objects._collection.find({}, fields=fields)
+        cards = ((doc.get(fields[0]), doc.get(fields[1]),
+            doc.get(fields[2]) or default_type) for doc in docs)
+        flow = count_flow(cards, snapshot.states, report_groups,
+            app.config.get('DEFECT_TYPES', []))
+
+        collection = klass.objects._collection
+        updated_at = datetime.datetime.now()
+        for group, (state_counts, state_card_counts) in flow.items():
+            son = klass(
+                date=date,
+                group=group,
+                state_counts=state_counts,
+                state_card_counts=state_card_counts,
+                updated_at=updated_at,
+            ).to_mongo()
+            collection.update({'date': date, 'group': group}, {'$set': son},
+                upsert=True)
+        FlowSeries.refresh(date, date, flow.keys())
+        return len(flow)
+
+    @classmethod
+    def backfill(klass, start_date, end_date, groups=None, replace=False):
+        """
+        Works out the FlowReports for every day from start_date to
+        end_date, for each of groups (all the report groups and 'all' by
+        default), from the cards' StateLogs as they stood at the end of
+        each day. Only the days without a report are written, unless
+        replace is True.
+
+        The StateLogs and archived logs are read in one pass in the order
+        they were entered, holding only the logs open on the day being
+        worked out, and the reports are inserted in chunks as they're
+        made. Returns the number of reports written.
+        """
+        from kardboard.models.cardhistory import CardHistory
+        from kardboard.models.statelog import StateLog
+
+        snapshot = config_snapshot()
+        if groups is None:
+            groups = snapshot.report_group_slugs
+        report_groups = dict([(group, snapshot.report_group_teams(group))
+            for group in groups])
+
+        start_date = make_end_date(date=start_date).replace(microsecond=0)
+        end_date = make_end_date(date=end_date)
+        days = []
+        day = start_date
+        while day <= end_date:
+            days.append(day)
+            day += datetime.timedelta(days=1)
+        if not days:
+            return 0
+
+        existing = klass.objects.filter(
+            date__gte=make_start_date(date=days[0]),
+            date__lte=days[-1].replace(microsecond=999999),
+            group__in=groups,
+        )
+        if replace:
+            existing.delete()
+            skip = set()
+        else:
+            skip = set([(make_start_date(date=r.date), r.group)
+                for r in existing.only('date', 'group')])
+
+        default_type = app.config.get('DEFAULT_TYPE', '')
+        cards = dict([(doc['_id'], (doc.get('team'), doc.get('_type') or default_type))
+            for doc in Kard.objects._collection.find({}, fields=['team', '_type'])])
+
+        # Logs that closed before the range don't matter
+        spec = {'entered': {'$lte': end_date}, '$or': [
+            {'exited': {'$exists': False}}, {'exited': {'$gt': start_date}}]}
+        live = ((doc['entered'], doc['card'], doc['state'], doc.get('exited'))
+            for doc in StateLog.objects._collection.find(spec,
+                fields=['card', 'state', 'entered', 'exited'],
+                sort=[('entered', 1)]))
+        logs = heapq.merge(live, CardHistory.spans(start_date, end_date))
+
+        def reports():
+            updated_at = datetime.datetime.now()
+            flows = sweep_flow(logs, days, snapshot.states, report_groups,
+                cards, app.config.get('DEFECT_TYPES', []))
+            for day, flow in flows:
+                for group, (state_counts, state_card_counts) in flow.items():
+                    if (make_start_date(date=day), group) in skip:
+                        continue
+                    yield klass(
+                        date=day,
+                        group=group,
+                        state_counts=state_counts,
+                        state_card_counts=state_card_counts,
+                        updated_at=updated_at,
+                    )
+
+        written = 0
+        for chunk in chunked(reports(), 500):
+            klass.objects.insert(chunk, load_bulk=False)
+            written += len(chunk)
+        FlowSeries.refresh(days[0], days[-1], groups)
+        return written
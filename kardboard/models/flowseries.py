@@ -0,0 +1,108 @@
+from dateutil.relativedelta import relativedelta
+
+from kardboard.app import app
+from kardboard.models.configsnapshot import config_snapshot
+from kardboard.services.flow import flow_columns, slice_columns
+from kardboard.util import month_range
+
+
+class FlowSeries(app.db.Document):
+    """
+    A month of a report group's FlowReports laid out in columns: the
+    dates, and for each state a list of its counts on those dates. Charts
+    read a few of these instead of a FlowReport per day.
+    """
+
+    group = app.db.StringField(required=True)
+    month = app.db.DateTimeField(required=True)
+    """The start of the month the series covers."""
+
+    dates = app.db.ListField()
+    states = app.db.ListField()
+    counts = app.db.ListField()
+    """A column of state_counts for each of states, None where a day's
+    report didn't have the state."""
+
+    card_counts = app.db.ListField()
+    """The same for state_card_counts."""
+
+    updated_at = app.db.DateTimeField(required=True)
+    """When the newest of the month's reports was updated."""
+
+    meta = {
+        'collection': 'flow_series',
+        'indexes': [{'fields': ['group', 'month'], 'unique': True}],
+        # The series are laid out again from the reports, so spare
+        # copies left by earlier concurrent refreshes can go
+        'index_drop_dups': True,
+    }
+
+    @classmethod
+    def refresh(klass, start_date, end_date, groups):
+        """
+        Lays out again every month from start_date to end_date for each
+        of groups, from the FlowReports. Costs one query and one upsert
+        per month and group.
+        """
+        from kardboard.models.flowreport import FlowReport
+
+        months = []
+        month = month_range(start_date)[0]
+        while month <= end_date:
+            months.append(month_range(month))
+            month += relativedelta(months=1)
+
+        config_states = list(config_snapshot().states)
+        reports = FlowReport.objects._collection
+        collection = klass.objects._collection
+        for group in groups:
+            for month_start, month_end in months:
+                docs = list(reports.find(
+                    {'group': group, 'date': {'$gte': month_start, '$lte': month_end}},
+                    fields=['date', 'state_counts', 'state_card_counts', 'updated_at'],
+                    sort=[('date', 1)]))
+                if not docs:
+                    collection.remove({'group': group, 'month': month_start})
+                    continue
+
+                found = set()
+                for doc in docs:
+                    found.update(doc.get('state_counts', {}).keys())
+                states = config_states + sorted(found - set(config_states))
+                dates, counts = flow_columns(
+                    [(doc['date'], doc.get('state_counts', {})) for doc in docs], states)
+                dates, card_counts = flow_columns(
+                    [(doc['date'], doc.get('state_card_counts', {})) for doc in docs], states)
+
+                collection.update(
+                    {'group': group, 'month': month_start},
+                    {'$set': {
+                        'dates': dates,
+                        'states': states,
+                        'counts': counts,
+                        'card_counts': card_counts,
+                        'updated_at': max([doc['updated_at'] for doc in docs]),
+                    }},
+                    upsert=True,
+                )
+
+    @classmethod
+    def slice(klass, group, start_date, end_date, states, cards_only=False):
+        """
+        (dates, {state: counts}, updated_at) for a report group's days
+        from start_date to end_date, from the months they're in. counts
+        are None for days whose report didn't have the state.
+        """
+        column = 'card_counts' if cards_only else 'counts'
+        docs = list(klass.objects._collection.find(
+            {'group': group, 'month': {
+                '$gte': month_range(start_date)[0], '$lte': end_date}},
+            fields=['dates', 'states', column, 'updated_at'],
+            sort=[('month', 1)]))
+        dates, series = slice_columns(
+            [(doc['dates'], doc['states'], doc[column]) for doc in docs],
+            start_date, end_date, states)
+        updated_at = None
+        if docs:
+            updated_at = max([doc['updated_at'] for doc in docs])
+        return dates, series, updated_at
@@ -1,18 +1,31 @@
-import importlib
 import datetime
-import math
 
 from dateutil.relativedelta import relativedelta
 from collections import namedtuple
 
 from kardboard.app import app
 
+from mongoengine import ValidationError, signals
+from pymongo.errors import DuplicateKeyError
 from mongoengine.queryset import Q
 from flask.ext.mongoengine import QuerySet
 
 from kardboard.models.blocker import BlockerRecord
-from kardboard.models.states import States
+from kardboard.models.kardticketdata import KardTicketData
+from kardboard.models.cardstatetotals import CardStateTotals
+from kardboard.models.cardhistory import CardHistory
+from kardboard.models.cycletimesketch import CycleTimeSketch
+from kardboard.models.serviceclassrecord import ServiceClassPartial
+from kardboard.models.dailyrecordledger import DailyRecordLedger
+from kardboard.models.transitioncount import StateTransitionCount
+from kardboard.models.configsnapshot import config_snapshot
 from kardboard.services import ticketdatasync
+from kardboard.services.cardindex import CardIntervalIndex
+from kardboard.services.cardtimes import cycle_vs_goal
+from kardboard.services.dailysweep import changed_since, window_stats
+from kardboard.services.serviceclasses import changed_months
+from kardboard.services.sketches import cycle_time_changes
+from kardboard.services.transitions import ENTERED
 from kardboard.util import (
     now,
     days_between,
@@ -22,12 +35,12 @@ from kardboard.util import (
     month_range,
     week_range,
     average,
-    standard_deviation,
-    median,
+    chunked,
 )
 
 
 CycleGoalTuple = namedtuple('CycleGoalTuple', ['lower', 'upper'])
+BulkUpsertResult = namedtuple('BulkUpsertResult', ['inserted', 'updated', 'errors'])
 
 class KardQuerySet(QuerySet):
     def done_in_week(self, year=None, month=None, day=None, date=None):
@@ -55,101 +68,53 @@ class KardQuerySet(QuerySet):
     def distinct(self, field_str):
         return super(KardQuerySet, self).distinct(field_str)
 
-    def moving_std_dev(self, year=None, month=None, day=None, weeks=4):
+    def moving_stats(self, date=None, weeks=4):
         """
-        The moving cycle time standard deviation for every day in the last N weeks.
+        The moving average cycle time, average lead time, cycle time
+        standard deviation and cycle time median absolute deviation of
+        the cards done in the N weeks up to the end of date (or today),
+        from a single query.
+        See http://en.wikipedia.org/wiki/Median_absolute_deviation
         """
-
-        end_date = make_end_date(year, month, day)
+        end_date = make_end_date(date=date)
         start_date = end_date - relativedelta(weeks=weeks)
         start_date = make_start_date(date=start_date)
 
-        qs = self.done().filter(
+        times = list(self.done().filter(
             done_date__lte=end_date,
             done_date__gte=start_date,
-        ).scalar('_cycle_time')
+        ).scalar('_cycle_time', '_lead_time'))
 
-        cycle_times = [t for t in qs if t is not None]
-        stdev = standard_deviation(cycle_times)
-        if stdev is not None:
-            stdev = int(round(stdev))
-        else:
-            stdev = 0
+        return window_stats([t[0] for t in times], [t[1] for t in times])
 
-        return stdev
+    def moving_std_dev(self, year=None, month=None, day=None, weeks=4):
+        """
+        The moving cycle time standard deviation for every day in the last N weeks.
+        """
+        date = munge_date(year, month, day)
+        return self.moving_stats(date, weeks).std_dev
 
     def moving_median_abs_dev(self, year=None, month=None, day=None, weeks=4):
         """
         The moving median absolute deviation of cycle time for every day in the last N weeks.
         See http://en.wikipedia.org/wiki/Median_absolute_deviation
         """
-
-        end_date = make_end_date(year, month, day)
-        start_date = end_date - relativedelta(weeks=weeks)
-        start_date = make_start_date(date=start_date)
-
-        qs = self.done().filter(
-            done_date__lte=end_date,
-            done_date__gte=start_date,
-        ).scalar('_cycle_time')
-
-        cycle_times = [t for t in qs if t is not None]
-        median_cycle_time = median(cycle_times)
-
-        if median_cycle_time is not None:
-            absolute_deviations = [math.fabs(median_cycle_time - c) for c in cycle_times]
-            mad = median(absolute_deviations)
-        else:
-            mad = None
-
-        if mad is None:
-            mad = 0
-
-        return int(round(mad))
+        date = munge_date(year, month, day)
+        return self.moving_stats(date, weeks).median_abs_dev
 
     def moving_cycle_time(self, year=None, month=None, day=None, weeks=4):
         """
         The moving average of cycle time for every day in the last N weeks.
         """
-
-        end_date = make_end_date(year, month, day)
-        start_date = end_date - relativedelta(weeks=weeks)
-        start_date = make_start_date(date=start_date)
-
-        qs = self.done().filter(
-            done_date__lte=end_date,
-            done_date__gte=start_date,
-        )
-
-        try:
-            average = qs.average('_cycle_time')
-        except TypeError:
-            average = float('nan')
-
-        if math.isnan(average):
-            return 0
-
-        return int(round(average))
+        date = munge_date(year, month, day)
+        return self.moving_stats(date, weeks).cycle_time
 
     def moving_lead_time(self, year=None, month=None, day=None, weeks=4):
         """
         The moving average of lead time for every day in the last N weeks.
         """
-
-        end_date = make_end_date(year, month, day)
-        start_date = end_date - relativedelta(weeks=weeks)
-        start_date = make_start_date(date=start_date)
-
-        qs = self.done().filter(
-            done_date__lte=end_date,
-            done_date__gte=start_date,
-        )
-
-        average = qs.average('_lead_time')
-        if math.isnan(average):
-            average = 0
-
-        return int(round(average))
+        date = munge_date(year, month, day)
+        return self.moving_stats(date, weeks).lead_time
 
     def done(self):
         """
@@ -172,7 +137,7 @@ class KardQuerySet(QuerySet):
         return results
 
     def for_team_board(self, team, backlog_limit, done_days):
-        states = States()
+        states = config_snapshot().states
 
         in_progress_q = Q(
             state__in=states.in_progress,
@@ -181,9 +146,7 @@ class KardQuerySet(QuerySet):
             team=team)
 
         cards_query = in_progress_q | done_q
-        wip_and_done = list(
-            self.filter(cards_query).exclude('_ticket_system_data')
-        )
+        wip_and_done = self.filter(cards_query).views()
 
         ordered_backlog_q = Q(
             state=states.backlog,
@@ -195,24 +158,225 @@ class KardQuerySet(QuerySet):
             priority__exists=False)
 
         ordered_backlog_cards = self.filter(ordered_backlog_q).order_by('priority', 'created_at')
-        ordered_backlog_cards = ordered_backlog_cards.limit(backlog_limit).exclude('_ticket_system_data')
+        ordered_backlog_cards = ordered_backlog_cards.limit(backlog_limit).views()
         unordered_backlog_cards = []
         if len(ordered_backlog_cards) < backlog_limit:
-            ordered_backlog_cards = list(ordered_backlog_cards)
             unordered_backlog_cards = Kard.objects.filter(unordered_backlog_q).order_by('created_at')
-            unordered_backlog_cards = unordered_backlog_cards.limit(backlog_limit).exclude('_ticket_system_data')
+            unordered_backlog_cards = unordered_backlog_cards.limit(backlog_limit).views()
 
-        backlog = list(ordered_backlog_cards) + list(unordered_backlog_cards)
+        backlog = ordered_backlog_cards + unordered_backlog_cards
         backlog = backlog[:backlog_limit]
 
         return backlog + wip_and_done
 
+    def views(self):
+        """
+        The matching cards as read-only KardViews, fetching only the
+        fields they need and skipping document construction.
+        """
+        from kardboard.models.kardview import KardView
+
+        cursor = self._collection.find(self._query, fields=KardView.DB_FIELDS)
+        if not self._ordering and self._document._meta['ordering']:
+            self.order_by(*self._document._meta['ordering'])
+        if self._ordering:
+            cursor.sort(self._ordering)
+        if self._limit is not None:
+            cursor.limit(self._limit - (self._skip or 0))
+        if self._skip is not None:
+            cursor.skip(self._skip)
+        return [KardView(doc) for doc in cursor]
+
 
-class Kard(app.db.Document):
+class KardMixin(object):
+    """
+    What's worked out from a card's fields rather than stored, shared by
+    Kard and the read-only KardView.
+    """
+    __slots__ = ()
+
+    @property
+    def service_class(self):
+        return config_snapshot().service_class(self._service_class)
+
+    @property
+    def time_in_state(self):
+        if self._time_in_current_state is None and self.id is not None:
+            from kardboard.models.statelog import StateLog
+            statelog = StateLog.objects.filter(card=self.id, state=self.state).order_by('-entered')
+            try:
+                self._time_in_current_state = statelog[0].duration
+            except IndexError:
+                return None
+        return self._time_in_current_state
+
+    @property
+    def type(self):
+        # Fill in the type from the ticket helper if
+        # there is one, and if not the config'd default
+        return self._type or app.config.get('DEFAULT_TYPE', '')
+
+    @property
+    def cycle_time(self):
+        """
+        Caclucation of the number of days between the start of a card
+        and its completion. Returns None if the card hasn't completed yet.
+        """
+        if self.start_date and self.done_date:
+            return days_between(self.start_date, self.done_date)
+
+    @property
+    def lead_time(self):
+        """
+        Caclucation of the number of days between the backlogging of a card
+        and its completion. Returns None if the card hasn't completed yet.
+        """
+        if self.done_date:
+            return days_between(self.backlog_date, self.done_date)
+
+    def current_cycle_time(self, today=None):
+        """
+        Caclucation of the number of days between the start of a card
+        and a comparison point (defaults to today).
+        Returns None if the card hasn't started yet.
+        """
+        if not self.start_date:
+            return None
+
+        if today is None and self.done_date is None:
+            today = now()
+        elif today is None and self.done_date is not None:
+            today = self.done_date
+        return days_between(self.start_date, today)
+
+    def current_lead_time(self, today=None):
+        """
+        Caclucation of the number of days between the backlogging of a card
+        and a comparison point (defaults to today).
+        """
+        if not self.backlog_date:
+            return None
+
+        if today is None and self.done_date is None:
+            today = now()
+        elif today is None and self.done_date is not None:
+            today = self.done_date
+        return days_between(self.backlog_date, today)
+
+    @property
+    def cycle_goal(self):
+        classdef = self.service_class
+        lower = classdef.get('lower')
+        upper = classdef.get('upper')
+        if lower is not None and upper is not None:
+            return CycleGoalTuple(lower, upper)
+        return None
+
+    @property
+    def cycle_in_goal(self):
+        if self.cycle_vs_goal == 0:
+            return True
+        return False
+
+    @property
+    def cycle_over_goal(self):
+        if self.cycle_vs_goal > 0:
+            return True
+        return False
+
+    @property
+    def is_card(self):
+        defect_types = app.config.get('DEFECT_TYPES', [])
+        if self.type in defect_types:
+            return False
+        return True
+
+    @property
+    def cycle_vs_goal(self):
+        return cycle_vs_goal(self.current_cycle_time(), self.cycle_goal)
+
+    def __unicode__(self):
+        backlog, start, done = self.backlog_date, self.start_date, \
+            self.done_date
+        priority = ""
+
+        if backlog:
+            backlog = backlog.strftime("%m/%d/%Y")
+        if start:
+            start = start.strftime("%m/%d/%Y")
+        if done:
+            done = done.strftime("%m/%d/%Y")
+        if hasattr(self, 'priority') and self.priority:
+            priority = "P%s | " % (self.priority, )
+
+        return u"%s -- %s%s | %s | %s" % (self.key, priority, backlog, start, done)
+
+    @property
+    def ticket_system(self):
+        """
+        Instance of :ref:`TICKET_HELPER`
+        """
+        if self._ticket_system:
+            return self._ticket_system
+
+        from kardboard.tickethelpers import get_ticket_helper
+        self._ticket_system = get_ticket_helper(self)
+        return self._ticket_system
+
+    @property
+    def assignee(self):
+        return self._assignee
+
+    @property
+    def reporter(self):
+        return self._reporter or ''
+
+    @property
+    def developers(self):
+        return self._developers or []
+
+    @property
+    def qaers(self):
+        return self._qaers or []
+
+    @property
+    def ticket_status(self):
+        """The name of the ticket's status in the ticket system."""
+        return self._ticket_status or ''
+
+    @property
+    def ticket_status_icon(self):
+        return self._ticket_status_icon or ''
+
+    def _calculate_worked_on(self):
+        assignees = [self._assignee or "", ]
+        testers = self.qaers
+        testers = [t for t in testers if t not in assignees]
+        worked_on = assignees + testers
+
+        developers = self.developers
+        developers = [d for d in developers if d not in worked_on]
+        worked_on = worked_on + developers
+        return worked_on
+
+    @property
+    def worked_on(self):
+        if not self._worked_on:
+            return self._calculate_worked_on()
+        return self._worked_on
+
+
+class Kard(KardMixin, app.db.Document):
     """
     Represents a card on a Kanban board.
     """
     _ticket_system = None
+    _interval_index = None
+    _interval_index_refreshed_at = None
+
+    INDEX_REFRESH_OVERLAP = 60
+    """Seconds before the last refresh that the next one looks back to,
+    for processes whose clocks are a little behind this one's."""
 
     key = app.db.StringField(required=True, unique=True)
     """A unique string that matches a Kard up to a ticket in a parent system."""
@@ -252,6 +416,10 @@ class Kard(app.db.Document):
 
     created_at = app.db.DateTimeField(required=True)
 
+    updated_at = app.db.DateTimeField()
+    """When the card was last written, for other processes' interval
+    indexes to pick up the change."""
+
     due_date = app.db.DateTimeField(required=False)
 
     _time_in_current_state = app.db.FloatField(required=False, db_field="time_in_current_state")
@@ -265,14 +433,32 @@ class Kard(app.db.Document):
     _version = app.db.StringField(required=False, db_field="version")
 
     _ticket_system_updated_at = app.db.DateTimeField()
-    _ticket_system_data = app.db.DictField()
+
+    # Copied from the ticket data so they can be read without loading it
+    _developers = app.db.ListField(
+        field=app.db.StringField(required=False),
+        required=False,
+        db_field="developers",
+    )
+    _qaers = app.db.ListField(
+        field=app.db.StringField(required=False),
+        required=False,
+        db_field="qaers",
+    )
+    _reporter = app.db.StringField(db_field="reporter")
+    _ticket_status = app.db.StringField(db_field="ticket_status")
+    _ticket_status_icon = app.db.StringField(db_field="ticket_status_icon")
+
+    _ticket_data = None
+    _ticket_data_changed = False
+    _ticket_data_legacy = False
 
     meta = {
         'queryset_class': KardQuerySet,
         'collection': 'kard',
         'ordering': ['-due_date', '+priority', '-backlog_date'],
         'auto_create_index': True,
-        'indexes': [('state', 'team'), ('team', 'done_date'), 'team', '_type', '_service_class', '_cycle_time', '_lead_time', 'due_date'],
+        'indexes': [('state', 'team'), ('team', 'done_date'), 'team', '_type', '_service_class', '_cycle_time', '_lead_time', 'due_date', 'updated_at'],
     }
 
     EXPORT_FIELDNAMES = (
@@ -284,22 +470,150 @@ class Kard(app.db.Document):
         'state',
     )
 
-    @property
-    def service_class(self):
-        if self._service_class:
-            classdef = app.config.get('SERVICE_CLASSES', {}).get(
-                self._service_class, {})
-        else:
-            classdef = app.config.get('SERVICE_CLASSES', {}).get(
-                'default', {})
+    TRACKED_FIELDS = (
+        'state',
+        'backlog_date',
+        'done_date',
+        'start_date',
+        'team',
+        'blocked',
+        '_service_class',
+    )
+    """Fields whose last persisted value is remembered so saves can
+    tell what's changing without asking the database."""
+
+    LEDGER_FIELDS = ('backlog_date', 'start_date', 'done_date', 'team')
+    """Fields that change a card's DailyRecords."""
+
+    SKETCH_FIELDS = ('team', '_service_class', 'start_date', 'done_date')
+    """Fields that change where a card's cycle time is in the
+    CycleTimeSketches and the ServiceClassPartials."""
 
-        service_class = {
-            'name': classdef.get('name', ''),
-            'upper': classdef.get('upper', ''),
-            'lower': classdef.get('lower', ''),
-            'wip': classdef.get('wip', ''),
-        }
-        return service_class
+    _persisted = None
+
+    _state_change = None
+    """The change StateLog's journal saw in pre_save, for post_save."""
+
+    INDEX_FIELDS = (
+        'backlog_date',
+        'start_date',
+        'done_date',
+        'team',
+        '_type',
+    )
+    """Fields kept in the interval index, in CardIntervalIndex.add order."""
+
+    @classmethod
+    def _from_son(cls, son):
+        kard = super(Kard, cls)._from_son(son)
+        loaded = [name for name in cls.TRACKED_FIELDS
+            if cls._fields[name].db_field in son]
+        kard._record_persisted(loaded)
+        # Saved before ticket data had its own collection
+        kard._ticket_data_legacy = '_ticket_system_data' in son
+        return kard
+
+    def _record_persisted(self, fields):
+        persisted = dict(self._persisted or {})
+        for name in fields:
+            persisted[name] = getattr(self, name)
+        self._persisted = persisted
+
+    def _get_ticket_system_data(self):
+        if self._ticket_data is None:
+            if self.id is None:
+                self._ticket_data = {}
+            else:
+                self._ticket_data = KardTicketData.load(self.id)
+        return self._ticket_data
+
+    def _set_ticket_system_data(self, data):
+        data = data or {}
+        self._ticket_data = data
+        self._ticket_data_changed = True
+
+        self._developers = data.get('developers', [])
+        self._qaers = data.get('qaers', [])
+        self._reporter = data.get('reporter', '')
+        status = data.get('status', None) or {}
+        self._ticket_status = status.get('name', '')
+        self._ticket_status_icon = status.get('icon', '')
+
+    _ticket_system_data = property(_get_ticket_system_data, _set_ticket_system_data)
+    """The ticket data, stored in KardTicketData and loaded on first use."""
+
+    def _store_ticket_data(self):
+        if not self._ticket_data_changed:
+            return
+        KardTicketData.store(self.id, self._ticket_data)
+        if self._ticket_data_legacy:
+            self.__class__.objects._collection.update(
+                {'_id': self.id}, {'$unset': {'_ticket_system_data': 1}})
+            self._ticket_data_legacy = False
+        self._ticket_data_changed = False
+
+    def _fields_being_written(self):
+        if self.id is None or self._persisted is None:
+            return self.TRACKED_FIELDS
+        changed = self._get_changed_fields()
+        return [name for name in self.TRACKED_FIELDS
+            if name in self._persisted or name in changed]
+
+    def persisted_value(self, name, default=None):
+        """
+        The value of a tracked field as it was last loaded from or
+        saved to the database. Returns default if it isn't known.
+        """
+        return (self._persisted or {}).get(name, default)
+
+    def _daily_record_marks(self, deleted=False):
+        """
+        {group: since} for the DailyRecords that writing the card, or
+        deleting it, puts out of date.
+        """
+        old = tuple([self.persisted_value(name) for name in self.LEDGER_FIELDS])
+        new = tuple([getattr(self, name) for name in self.LEDGER_FIELDS])
+        if deleted:
+            old, new = new, (None, ) * len(self.LEDGER_FIELDS)
+        since, teams = changed_since(old, new)
+        if since is None:
+            return {}
+        groups = config_snapshot().report_groups_for(teams)
+        return dict([(group, since) for group in groups])
+
+    def _cycle_time_changes(self, deleted=False):
+        """
+        The changes to the CycleTimeSketches that writing the card, or
+        deleting it, makes.
+        """
+        return cycle_time_changes(*self._sketch_values(deleted))
+
+    def _service_class_marks(self, deleted=False):
+        """
+        (group, month) for the ServiceClassPartials that writing the
+        card, or deleting it, puts out of date.
+        """
+        marks = set()
+        for team, month in changed_months(*self._sketch_values(deleted)):
+            for group in config_snapshot().report_groups_for([team]):
+                marks.add((group, month))
+        return marks
+
+    def _sketch_values(self, deleted=False):
+        old = tuple([self.persisted_value(name) for name in self.SKETCH_FIELDS])
+        new = tuple([getattr(self, name) for name in self.SKETCH_FIELDS])
+        if deleted:
+            new = None
+        return old, new
+
+    def field_changing(self, name):
+        """
+        Is the tracked field about to be written with a value
+        different from the one in the database.
+        """
+        if self._persisted is None or name not in self._persisted:
+            return True
+        return self._persisted[name] != getattr(self, name)
 
     def _convert_dates_to_datetimes(self, date):
         if not date:
@@ -343,19 +657,12 @@ class Kard(app.db.Document):
         if not self.created_at:
             self.created_at = now()
 
-    @property
-    def time_in_state(self):
-        if self._time_in_current_state is None and self.id is not None:
-            from kardboard.models.statelog import StateLog
-            statelog = StateLog.objects.filter(card=self, state=self.state).order_by('-entered')
-            try:
-                self._time_in_current_state = statelog[0].duration
-            except IndexError:
-                return None
-        return self._time_in_current_state
-
     @property
     def old_state(self):
+        if self._persisted is not None and 'state' in self._persisted:
+            return self._persisted['state']
+
+        # Never loaded, so the only way to know is to ask
         try:
             k = Kard.objects.only('state').get(key=self.key, )
             old_state = k.state
@@ -377,7 +684,7 @@ class Kard(app.db.Document):
             self.state = target_state
 
     def _auto_state_changes(self):
-        states = States()
+        states = config_snapshot().states
 
         # Auto move to done
         if self.done_date:
@@ -430,19 +737,226 @@ class Kard(app.db.Document):
         ticketdatasync.set_due_date_from_ticket(self, self.ticket_system_data)
 
         self._auto_state_changes()
+        self.updated_at = now()
+        written = self._fields_being_written()
         super(Kard, self).save(*args, **kwargs)
+        DailyRecordLedger.mark(self._daily_record_marks())
+        CycleTimeSketch.add(self._cycle_time_changes())
+        ServiceClassPartial.mark(self._service_class_marks())
+        self._record_persisted(written)
+        self._store_ticket_data()
+
+    def delete(self, *args, **kwargs):
+        card_id = self.id
+        super(Kard, self).delete(*args, **kwargs)
+        DailyRecordLedger.mark(self._daily_record_marks(deleted=True))
+        CycleTimeSketch.add(self._cycle_time_changes(deleted=True))
+        ServiceClassPartial.mark(self._service_class_marks(deleted=True))
+        KardTicketData.remove(card_id)
+        CardStateTotals.remove(card_id)
+        CardHistory.remove(card_id)
+
+    def reload(self, *args, **kwargs):
+        obj = super(Kard, self).reload(*args, **kwargs)
+        self._persisted = obj._persisted
+        # Ticket data is loaded again the next time it's asked for
+        self._ticket_data = None
+        self._ticket_data_changed = False
+        self._ticket_data_legacy = obj._ticket_data_legacy
+        return obj
+
+    def _set_derived_fields(self):
+        """
+        The in-memory part of save(), used by bulk_upsert. It never calls
+        the ticket helper or the database, so any ticket data has to be
+        supplied up front in _ticket_system_data.
+        """
+        self._set_dates()
+        self._set_cycle_lead_times()
+        self._set_blocked_time()
+        self.key = self.key.upper()
+
+        # Only what this upsert supplied; existing data isn't loaded
+        data = self._ticket_data_changed and self._ticket_data or {}
+        if data:
+            self._assignee = data.get('assignee', '')
+            self.title = data.get('summary', '')
+            ticket_class = data.get('service_class', None)
+            if ticket_class:
+                self._service_class = ticket_class
+            ticketdatasync.set_due_date_from_ticket(self, data)
+
+        self._type = (self._type or app.config.get('DEFAULT_TYPE', '')).strip()
+        if data or self.id is None:
+            # Existing cards are loaded without their ticket data
+            self._worked_on = self._calculate_worked_on()
+
+        self._auto_state_changes()
+        if self.field_changing('state'):
+            self._time_in_current_state = None
+
+    @classmethod
+    def bulk_upsert(klass, rows, chunk_size=500):
+        """
+        Creates or updates many cards at once from an iterable of
+        dictionaries keyed by field name, matching existing cards by key.
+
+        Each chunk costs one query to find the existing cards, one insert
+        for the new ones and one update per card that actually changed.
+        Save signals aren't sent; the StateLog rows they would have
+        written are opened and closed in bulk instead.
+
+        Returns a BulkUpsertResult whose errors are (row, exception)
+        pairs for the rows that had no key or failed validation and were
+        skipped.
+        """
+        inserted, updated, errors = 0, 0, []
+        for chunk in chunked(rows, chunk_size):
+            result = klass._bulk_upsert_chunk(chunk)
+            inserted += result.inserted
+            updated += result.updated
+            errors.extend(result.errors)
+        return BulkUpsertResult(inserted, updated, errors)
+
+    @classmethod
+    def _bulk_upsert_chunk(klass, rows):
+        from kardboard.models.statelog import StateLog
+
+        errors = []
+        keyed = []
+        for row in rows:
+            if not row.get('key'):
+                errors.append((row, ValidationError("Field is required",
+                    field_name='key')))
+            else:
+                keyed.append(row)
+        rows = keyed
+
+        keys = [row['key'].upper() for row in rows]
+        existing = klass.objects.filter(key__in=keys)
+        kards = dict((k.key, k) for k in existing)
+        new_keys, failed_keys = set(), set()
+
+        for row in rows:
+            fields = dict([(name, value) for name, value in row.items()
+                if name in klass._fields or name == '_ticket_system_data'])
+            key = fields['key'] = fields['key'].upper()
+
+            kard = kards.get(key, None)
+            if kard is None:
+                kard = klass(**fields)
+                # Known not to be in the database yet
+                kard._persisted = dict([(name, None) for name in klass.TRACKED_FIELDS])
+                new_keys.add(key)
+            else:
+                for name, value in fields.items():
+                    setattr(kard, name, value)
+
+            try:
+                kard._set_derived_fields()
+                kard.validate()
+            except ValidationError, e:
+                errors.append((row, e))
+                failed_keys.add(key)
+            else:
+                # A later row for the key can put right an earlier one
+                failed_keys.discard(key)
+            kards[key] = kard
+
+        new_kards = [kards[key] for key in new_keys - failed_keys]
+        changed_kards = [k for k in kards.values()
+            if k.key not in new_keys and k.key not in failed_keys and
+            k._get_changed_fields()]
+        moved_kards = [k for k in changed_kards if k.field_changing('state')]
+        timestamp = now()
+        for kard in new_kards + changed_kards:
+            kard.updated_at = timestamp
+
+        collection = klass.objects._collection
+        lost_keys = set()
+        if new_kards:
+            docs = [kard.to_mongo() for kard in new_kards]
+            try:
+                collection.insert(docs, safe=True, continue_on_error=True)
+            except DuplicateKeyError:
+                # Another import stored some of the keys first; the rest
+                # went in, and those keys are retried as updates below
+                stored = set([doc['_id'] for doc in collection.find(
+                    {'_id': {'$in': [doc['_id'] for doc in docs]}}, fields=[])])
+                lost_keys = set([kard.key for kard, doc in zip(new_kards, docs)
+                    if doc['_id'] not in stored])
+            for kard, doc in zip(new_kards, docs):
+                if kard.key not in lost_keys:
+                    kard.id = doc['_id']
+            new_kards = [kard for kard in new_kards if kard.key not in lost_keys]
+        for kard in changed_kards:
+            updates, removals = kard._delta()
+            if updates:
+                collection.update({'_id': kard.id}, {'$set': updates})
+            if removals:
+                collection.update({'_id': kard.id}, {'$unset': removals})
+
+        StateLog.close_open_logs(dict([(k.id, timestamp) for k in moved_kards]))
+
+        entering = new_kards + moved_kards
+        logs = [StateLog(
+            card=kard,
+            state=kard.state,
+            entered=timestamp,
+            service_class=kard.service_class.get('name'),
+            created_at=timestamp,
+            updated_at=timestamp,
+        ) for kard in entering]
+        if logs:
+            StateLog.objects.insert(logs, load_bulk=False)
+            StateTransitionCount.add(
+                [(kard.id, kard.state, ENTERED, timestamp) for kard in entering],
+                dict([(kard.id, kard.team) for kard in entering]))
+
+        marks = {}
+        for kard in new_kards + changed_kards:
+            for group, since in kard._daily_record_marks().items():
+                marks[group] = min(since, marks.get(group, since))
+        DailyRecordLedger.mark(marks)
+        CycleTimeSketch.add([change for kard in new_kards + changed_kards
+            for change in kard._cycle_time_changes()])
+        ServiceClassPartial.mark(set([mark for kard in new_kards + changed_kards
+            for mark in kard._service_class_marks()]))
+
+        for kard in new_kards + changed_kards:
+            kard._clear_changed_fields()
+            kard._created = False
+            kard._record_persisted(klass.TRACKED_FIELDS)
+            klass.index_card(kard)
+
+        ticket_data = dict([(k.id, k._ticket_data) for k in kards.values()
+            if k.key not in failed_keys and k.key not in lost_keys and
+            k._ticket_data_changed])
+        KardTicketData.store_many(ticket_data)
+        legacy_ids = [k.id for k in kards.values()
+            if k.id in ticket_data and k._ticket_data_legacy]
+        if legacy_ids:
+            collection.update({'_id': {'$in': legacy_ids}},
+                {'$unset': {'_ticket_system_data': 1}}, multi=True)
+        for kard in kards.values():
+            if kard.id in ticket_data:
+                kard._ticket_data_changed = False
+                kard._ticket_data_legacy = False
+
+        inserted, updated = len(new_kards), len(changed_kards)
+        if lost_keys:
+            retried = klass._bulk_upsert_chunk(
+                [row for row in rows if row['key'].upper() in lost_keys])
+            inserted += retried.inserted
+            updated += retried.updated
+            errors.extend(retried.errors)
+        return BulkUpsertResult(inserted, updated, errors)
 
     @classmethod
     def update_flow_records(cls):
         if app.config.get('UPDATE_FLOW_ON_SAVE', False):
-            from kardboard.tasks import update_flow_reports
-            update_flow_reports.apply_async(expires=15 * 60)
-
-    @property
-    def type(self):
-        # Fill in the type from the ticket helper if
-        # there is one, and if not the config'd default
-        return self._type or app.config.get('DEFAULT_TYPE', '')
+            from kardboard.tasks import delay_coalesced, update_flow_reports
+            delay_coalesced(update_flow_reports)
 
     @classmethod
     def in_progress(klass, date=None):
@@ -467,17 +981,8 @@ class Kard(app.db.Document):
             return klass.objects.filter(done_date=None,
                 start_date__exists=True)
 
-        query_a = Q(done_date=None) & Q(start_date__lte=date)
-        query_b = Q(done_date__gt=date) & Q(start_date__lte=date)
-
-        results_a = list(klass.objects.filter(query_a))
-        results_b = list(klass.objects.filter(query_b))
-
-        all_ids = [c.id for c in results_a]
-        all_ids = set(all_ids)
-        all_ids.update([c.id for c in results_b])
-        qs = klass.objects.filter(id__in=all_ids)
-        return qs
+        return klass.objects.filter(Q(start_date__lte=date) &
+            (Q(done_date=None) | Q(done_date__gt=date)))
 
     @classmethod
     def backlogged(klass, date=None):
@@ -503,148 +1008,76 @@ class Kard(app.db.Document):
         if not date:
             return klass.objects.filter(start_date=None)
 
-        query_a = Q(start_date=None) & \
-            Q(backlog_date__lte=date)
-        query_b = Q(start_date__gt=date) & \
-            Q(backlog_date__lte=date)
-
-        results_a = list(klass.objects.filter(query_a))
-        results_b = list(klass.objects.filter(query_b))
-
-        all_ids = [c.id for c in results_a]
-        all_ids = set(all_ids)
-        all_ids.update([c.id for c in results_b])
-        return klass.objects.filter(id__in=all_ids)
-
-    @property
-    def cycle_time(self):
-        """
-        Caclucation of the number of days between the start of a card
-        and its completion. Returns None if the card hasn't completed yet.
-        """
-        if self.start_date and self.done_date:
-            return days_between(self.start_date, self.done_date)
-
-    @property
-    def lead_time(self):
-        """
-        Caclucation of the number of days between the backlogging of a card
-        and its completion. Returns None if the card hasn't completed yet.
-        """
-        if self.done_date:
-            return days_between(self.backlog_date, self.done_date)
+        return klass.objects.filter(Q(backlog_date__lte=date) &
+            (Q(start_date=None) | Q(start_date__gt=date)))
 
-    def current_cycle_time(self, today=None):
-        """
-        Caclucation of the number of days between the start of a card
-        and a comparison point (defaults to today).
-        Returns None if the card hasn't started yet.
-        """
-        if not self.start_date:
-            return None
-
-        if today is None and self.done_date is None:
-            today = now()
-        elif today is None and self.done_date is not None:
-            today = self.done_date
-        return days_between(self.start_date, today)
-
-    def current_lead_time(self, today=None):
+    @classmethod
+    def interval_index(klass):
         """
-        Caclucation of the number of days between the backlogging of a card
-        and a comparison point (defaults to today).
+        A CardIntervalIndex of every card, for counting cards backlogged,
+        in progress or done as of a date without querying for them.
+
+        It's loaded with one projected scan of the collection and kept up
+        to date by saves in this process. Once it's older than
+        :ref:`CARD_INDEX_MAX_AGE` the cards written since are read again
+        to pick up saves made elsewhere. It's only scanned in full again
+        if cards have been deleted or stored without an updated_at.
         """
-        if not self.backlog_date:
-            return None
+        max_age = app.config.get('CARD_INDEX_MAX_AGE', 60 * 5)
+        refreshed_at = klass._interval_index_refreshed_at
+        if klass._interval_index is None:
+            klass._load_interval_index()
+        elif (now() - refreshed_at).total_seconds() > max_age:
+            klass._refresh_interval_index()
+        return klass._interval_index
 
-        if today is None and self.done_date is None:
-            today = now()
-        elif today is None and self.done_date is not None:
-            today = self.done_date
-        return days_between(self.backlog_date, today)
-
-    @property
-    def cycle_goal(self):
-        classdef = self.service_class
-        lower = classdef.get('lower')
-        upper = classdef.get('upper')
-        if lower is not None and upper is not None:
-            return CycleGoalTuple(lower, upper)
-        return None
-
-    @property
-    def cycle_in_goal(self):
-        if self.cycle_vs_goal == 0:
-            return True
-        return False
-
-    @property
-    def cycle_over_goal(self):
-        if self.cycle_vs_goal > 0:
-            return True
-        return False
-
-    @property
-    def is_card(self):
-        defect_types = app.config.get('DEFECT_TYPES', [])
-        if self.type in defect_types:
-            return False
-        return True
+    @classmethod
+    def _index_docs(klass, index, spec):
+        db_fields = [klass._fields[name].db_field
+            for name in klass.INDEX_FIELDS]
+        for doc in klass.objects._collection.find(spec, fields=db_fields):
+            index.add(doc['_id'], *[doc.get(f) for f in db_fields])
 
-    @property
-    def cycle_vs_goal(self):
-        if not self.cycle_goal:
-            return 0
+    @classmethod
+    def _load_interval_index(klass):
+        refreshed_at = now()
+        index = CardIntervalIndex()
+        klass._index_docs(index, {})
+        klass._interval_index = index
+        klass._interval_index_refreshed_at = refreshed_at
 
-        lower, upper = self.cycle_goal
-        super_upper = upper * 2
-        if self.done_date:
-            current = self.cycle_time
+    @classmethod
+    def _refresh_interval_index(klass):
+        refreshed_at = now()
+        since = klass._interval_index_refreshed_at - \
+            datetime.timedelta(seconds=klass.INDEX_REFRESH_OVERLAP)
+        index = klass._interval_index
+        klass._index_docs(index, {klass._fields['updated_at'].db_field: {'$gte': since}})
+        if klass.objects._collection.count() != len(index):
+            klass._load_interval_index()
         else:
-            current = self.current_cycle_time()
-
-        if current < lower:
-            return -1
-        elif current >= lower and current <= upper:
-            return 0
-        elif current >= super_upper:
-            return 2
-        elif current >= upper:
-            return 1
-
-    def __unicode__(self):
-        backlog, start, done = self.backlog_date, self.start_date, \
-            self.done_date
-        priority = ""
-
-        if backlog:
-            backlog = backlog.strftime("%m/%d/%Y")
-        if start:
-            start = start.strftime("%m/%d/%Y")
-        if done:
-            done = done.strftime("%m/%d/%Y")
-        if hasattr(self, 'priority') and self.priority:
-            priority = "P%s | " % (self.priority, )
+            klass._interval_index_refreshed_at = refreshed_at
 
-        return u"%s -- %s%s | %s | %s" % (self.key, priority, backlog, start, done)
+    @classmethod
+    def reset_interval_index(klass):
+        klass._interval_index = None
+        klass._interval_index_refreshed_at = None
 
-    @property
-    def ticket_system(self):
-        """
-        Instance of :ref:`TICKET_HELPER`
-        """
-        if self._ticket_system:
-            return self._ticket_system
+    @classmethod
+    def index_card(klass, kard):
+        """Brings the card's entry in the interval index, if loaded, up to date."""
+        if klass._interval_index is not None:
+            klass._interval_index.add(kard.id,
+                *[getattr(kard, name) for name in klass.INDEX_FIELDS])
 
-        helper_setting = app.config['TICKET_HELPER']
-        modname = '.'.join(helper_setting.split('.')[:-1])
-        klassnam = helper_setting.split('.')[-1]
-        mod = importlib.import_module(modname)
-        klass = getattr(mod, klassnam)
+    @classmethod
+    def index_post_save(klass, sender, document, **kwargs):
+        klass.index_card(document)
 
-        helper = klass(app.config, self)
-        self._ticket_system = helper
-        return helper
+    @classmethod
+    def index_post_delete(klass, sender, document, **kwargs):
+        if klass._interval_index is not None:
+            klass._interval_index.remove(document.id)
 
     @property
     def ticket_system_data(self):
@@ -658,20 +1091,5 @@ class Kard(app.db.Document):
         else:
             return self._ticket_system_data
 
-    @property
-    def assignee(self):
-        return self._assignee
-
-    @property
-    def worked_on(self):
-        if not self._worked_on:
-            assignees = [self._assignee or "", ]
-            testers = self.ticket_system_data.get('qaers', [])
-            testers = [t for t in testers if t not in assignees]
-            worked_on = assignees + testers
-
-            developers = self.ticket_system_data.get('developers', [])
-            developers = [d for d in developers if d not in worked_on]
-            worked_on = worked_on + developers
-            return worked_on
-        return self._worked_on
+signals.post_save.connect(Kard.index_post_save, sender=Kard)
+signals.post_delete.connect(Kard.index_post_delete, sender=Kard)
@@ -0,0 +1,58 @@
+from kardboard.app import app
+from kardboard.util import now
+
+
+class KardTicketData(app.db.Document):
+    """
+    The data a card's :ref:`TICKET_HELPER` fetched for it, kept apart
+    from the card so that card queries don't carry it around.
+    """
+
+    card_id = app.db.ObjectIdField(primary_key=True)
+    """The id of the card the data belongs to."""
+
+    data = app.db.DictField()
+    """The ticket data, as stored in Kard.ticket_system_data."""
+
+    updated_at = app.db.DateTimeField(required=True)
+
+    meta = {
+        'collection': 'kard_ticket_data',
+    }
+
+    @classmethod
+    def load(klass, card_id):
+        """The stored data for a card, or {} if there isn't any."""
+        doc = klass.objects._collection.find_one({'_id': card_id}, fields=['data'])
+        if doc is None:
+            return {}
+        return doc.get('data') or {}
+
+    @classmethod
+    def store(klass, card_id, data):
+        klass.objects._collection.update(
+            {'_id': card_id},
+            {'$set': {'data': data, 'updated_at': now()}},
+            upsert=True,
+        )
+
+    @classmethod
+    def store_many(klass, ticket_data):
+        """Stores {card_id: data}, inserting all the new documents at once."""
+        if not ticket_data:
+            return
+        collection = klass.objects._collection
+        existing = set(doc['_id'] for doc in collection.find(
+            {'_id': {'$in': ticket_data.keys()}}, fields=['_id']))
+
+        timestamp = now()
+        new_docs = [{'_id': card_id, 'data': data, 'updated_at': timestamp}
+            for card_id, data in ticket_data.items() if card_id not in existing]
+        if new_docs:
+            collection.insert(new_docs)
+        for card_id in existing:
+            klass.store(card_id, ticket_data[card_id])
+
+    @classmethod
+    def remove(klass, card_id):
+        klass.objects._collection.remove({'_id': card_id})
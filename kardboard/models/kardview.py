@@ -0,0 +1,76 @@
+from kardboard.models.blocker import BlockerRecord
+from kardboard.models.kard import Kard, KardMixin
+from kardboard.models.kardticketdata import KardTicketData
+
+
+class KardView(KardMixin):
+    """
+    A read-only card built straight from a raw kard document, for pages
+    that only display cards. It has the same calculated properties as
+    Kard without the cost of building, validating and change tracking a
+    full document. Get them with KardQuerySet.views().
+    """
+
+    FIELDS = (
+        'key',
+        'title',
+        'backlog_date',
+        'start_date',
+        'done_date',
+        'team',
+        'state',
+        'priority',
+        'blocked',
+        'blocked_ever',
+        'blocked_time',
+        'blockers',
+        'created_at',
+        'due_date',
+        '_cycle_time',
+        '_lead_time',
+        '_time_in_current_state',
+        '_service_class',
+        '_type',
+        '_assignee',
+        '_worked_on',
+        '_version',
+        '_ticket_system_updated_at',
+        '_developers',
+        '_qaers',
+        '_reporter',
+        '_ticket_status',
+        '_ticket_status_icon',
+    )
+
+    DB_FIELDS = tuple([Kard._fields[name].db_field for name in FIELDS])
+    """The projection to fetch a KardView's document with."""
+
+    __slots__ = ('id', '_ticket_system', '_ticket_data') + FIELDS
+
+    def __init__(self, doc):
+        self.id = doc['_id']
+        self._ticket_system = None
+        self._ticket_data = None
+        for name, db_field in zip(self.FIELDS, self.DB_FIELDS):
+            value = doc.get(db_field, None)
+            if value is None:
+                value = Kard._fields[name].default
+                if callable(value):
+                    value = value()
+            setattr(self, name, value)
+        self.blockers = [BlockerRecord._from_son(b) for b in self.blockers or []]
+
+    def __eq__(self, other):
+        return isinstance(other, KardView) and self.id == other.id
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return '<KardView: %s>' % self.key
+
+    @property
+    def ticket_system_data(self):
+        if self._ticket_data is None:
+            self._ticket_data = KardTicketData.load(self.id)
+        return self._ticket_data
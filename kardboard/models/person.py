@@ -2,6 +2,7 @@ import datetime
 
 from kardboard.app import app
 from kardboard.models.kard import Kard
+from kardboard.services.cardtimes import CardTimes
 
 class Person(app.db.Document):
     name = app.db.StringField(required=True, unique=True)
@@ -44,9 +45,8 @@ class Person(app.db.Document):
     def in_progress(self, kardlist):
         kards = [k for k in kardlist if self._is_card(k)]
         wip = [k for k in kards if not k.done_date]
-        wip.sort(key=lambda r: r.current_cycle_time())
-        wip.reverse()
-        return wip
+        times = CardTimes(wip)
+        return times.ordered(times.cycle_times, reverse=True)
 
     def is_done(self, kardlist):
         kards = [k for k in kardlist if self._is_card(k)]
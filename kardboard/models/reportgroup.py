@@ -1,6 +1,4 @@
-from mongoengine.queryset import Q
-
-from kardboard.app import app
+from kardboard.models.configsnapshot import config_snapshot
 
 
 class ReportGroup(object):
@@ -10,16 +8,13 @@ class ReportGroup(object):
         super(ReportGroup, self).__init__()
 
     @property
-    def queryset(self):
-        groups_config = app.config.get('REPORT_GROUPS', {})
-        group = groups_config.get(self.group, ())
-        query = Q()
-
-        if group:
-            teams = group[0]
-            for team in teams:
-                query = Q(team=team) | query
+    def teams(self):
+        """The group's teams, or None if it isn't limited to any."""
+        return config_snapshot().report_group_teams(self.group)
 
-        if query:
-            return self.qs.filter(query)
+    @property
+    def queryset(self):
+        teams = self.teams
+        if teams:
+            return self.qs.filter(team__in=list(teams))
         return self.qs
@@ -1,39 +1,156 @@
+from dateutil.relativedelta import relativedelta
+
 from kardboard.app import app
+from kardboard.models.configsnapshot import config_snapshot
+from kardboard.services.serviceclasses import ServiceClassAggregator
 from kardboard.util import (
     now,
     make_end_date,
     make_start_date,
-    average,
+    month_range,
 )
 
 
 def report_on_cards(cards):
-    data = {}
+    aggregator = ServiceClassAggregator(config_snapshot().service_class)
     for k in cards:
-        class_cards = data.get(k.service_class.get('name'), [])
-        class_cards.append(k)
-        data[k.service_class.get('name')] = class_cards
+        aggregator.add(k._service_class, k.start_date, k.done_date)
+    return aggregator.report()
+
+
+def aggregate_queryset(queryset):
+    """
+    A ServiceClassAggregator with the cards a queryset matches added,
+    read from a cursor of just the fields it needs so the cards are
+    never all in memory.
+    """
+    from kardboard.models import Kard
+
+    fields = [Kard._fields[name].db_field
+        for name in ('_service_class', 'start_date', 'done_date')]
+    aggregator = ServiceClassAggregator(config_snapshot().service_class)
+    for doc in queryset._collection.find(queryset._query, fields=fields):
+        aggregator.add(*[doc.get(field) for field in fields])
+    return aggregator
+
+
+def report_on_queryset(queryset):
+    """report_on_cards for the cards a queryset matches."""
+    return aggregate_queryset(queryset).report()
+
+
+def done_between(start_date, end_date, group):
+    from kardboard.models import Kard
+    from kardboard.models import ReportGroup
+
+    return ReportGroup(group,
+        Kard.objects.filter(
+            done_date__gte=start_date,
+            done_date__lte=end_date,
+        )
+    ).queryset
 
-    total = sum([len(v) for k, v in data.items()])
 
-    report = {}
-    for classname, cards in data.items():
-        sclass = cards[0].service_class
-        cycle_time_average = int(round(average(
-            [c.current_cycle_time() for c in cards])))
-        cards_hit_goal = len([c.key for c in cards
-            if c.current_cycle_time() <= sclass.get('upper')])
+class ServiceClassPartial(app.db.Document):
+    """
+    The service class totals for the cards a report group finished in a
+    month. ServiceClassRecords that span whole months are merged from
+    these, so each month's cards are only read when its partial is
+    calculated.
+    """
+    group = app.db.StringField(required=True, default="all")
+
+    month = app.db.DateTimeField(required=True)
+    """The start of the month the cards were done in."""
+
+    classes = app.db.ListField()
+    """ServiceClassAggregator.partial() for the month's cards."""
+
+    calculated_at = app.db.DateTimeField(required=True)
+    """When the cards were read for classes."""
+
+    dirty_at = app.db.DateTimeField()
+    """When a card done in the month was last changed. The partial is
+    out of date if that's since it was calculated."""
 
-        report[classname] = {
-            'service_class': sclass.get('name'),
-            'wip': len(cards),
-            'wip_percent': len(cards) / float(total),
-            'cycle_time_average': cycle_time_average,
-            'cards_hit_goal': cards_hit_goal,
-            'cards_hit_goal_percent': cards_hit_goal / float(len(cards)),
-        }
+    updated_at = app.db.DateTimeField(required=True)
 
-    return report
+    meta = {
+        'collection': 'service_class_partials',
+        'indexes': [{'fields': ['group', 'month'], 'unique': True}],
+        # Partials are recalculated from the cards, so spare copies left
+        # by earlier concurrent runs can go
+        'index_drop_dups': True,
+    }
+
+    @classmethod
+    def mark(klass, marks):
+        """
+        Puts the partials for marks, a collection of (group, month start),
+        out of date. Costs one update per month.
+        """
+        by_month = {}
+        for group, month in marks:
+            by_month.setdefault(month, set()).add(group)
+        collection = klass.objects._collection
+        timestamp = now()
+        for month, groups in by_month.items():
+            collection.update(
+                {'group': {'$in': list(groups)}, 'month': month},
+                {'$set': {'dirty_at': timestamp}},
+                multi=True,
+            )
+
+    @classmethod
+    def calculate(klass, date, group="all"):
+        """
+        Totals up the cards done in date's month again. Costs one
+        projected query and one upsert. Returns the partial.
+        """
+        start_date, end_date = month_range(date)
+        # Cards changed while they're being read leave it marked out of date
+        calculated_at = now()
+        partial = aggregate_queryset(
+            done_between(start_date, end_date, group)).partial()
+        klass.objects._collection.update(
+            {'group': group, 'month': start_date},
+            {'$set': {
+                'classes': partial,
+                'calculated_at': calculated_at,
+                'updated_at': now(),
+            }},
+            upsert=True,
+        )
+        return partial
+
+    @classmethod
+    def merged(klass, start_date, end_date, group="all"):
+        """
+        A ServiceClassAggregator with the partials for every month from
+        start_date's to end_date's merged in. Months that don't have a
+        partial yet, or whose cards have changed since it was calculated,
+        are calculated.
+        """
+        months = []
+        month = month_range(start_date)[0]
+        while month <= end_date:
+            months.append(month)
+            month += relativedelta(months=1)
+
+        docs = klass.objects._collection.find(
+            {'group': group, 'month': {'$gte': months[0], '$lte': months[-1]}},
+            fields=['month', 'classes', 'calculated_at', 'dirty_at'])
+        partials = dict([(doc['month'], doc['classes']) for doc in docs
+            if doc.get('dirty_at') is None or
+            doc['dirty_at'] < doc['calculated_at']])
+
+        aggregator = ServiceClassAggregator(config_snapshot().service_class)
+        for month in months:
+            partial = partials.get(month)
+            if partial is None:
+                partial = klass.calculate(month, group)
+            aggregator.merge(partial)
+        return aggregator
 
 
 class ServiceClassSnapshot(app.db.Document):
@@ -68,7 +185,7 @@ class ServiceClassSnapshot(app.db.Document):
             record.data = {}
 
         kards = ReportGroup(group, Kard.in_progress())
-        record.data = report_on_cards(list(kards.queryset))
+        record.data = report_on_queryset(kards.queryset)
         record.save()
         return record
 
@@ -106,12 +223,33 @@ class ServiceClassRecord(app.db.Document):
 
     @classmethod
     def calculate(cls, start_date, end_date, group="all"):
-        from kardboard.models import Kard
-        from kardboard.models import ReportGroup
-
         start_date = make_start_date(date=start_date)
         end_date = make_end_date(date=end_date)
 
+        record = cls._get_or_create(start_date, end_date, group)
+        record.data = report_on_queryset(
+            done_between(start_date, end_date, group))
+        record.save()
+        return record
+
+    @classmethod
+    def calculate_months(cls, start_date, end_date, group="all"):
+        """
+        calculate() for every card done from the start of start_date's
+        month to the end of end_date's, merged from the months'
+        ServiceClassPartials rather than read from the cards.
+        """
+        start_date = month_range(start_date)[0]
+        end_date = month_range(end_date)[1]
+
+        record = cls._get_or_create(start_date, end_date, group)
+        record.data = ServiceClassPartial.merged(
+            start_date, end_date, group).report()
+        record.save()
+        return record
+
+    @classmethod
+    def _get_or_create(cls, start_date, end_date, group):
         try:
             record = cls.objects.get(
                 group=group,
@@ -124,13 +262,4 @@ class ServiceClassRecord(app.db.Document):
             record.end_date = end_date
             record.group = group
             record.data = {}
-
-        kards = ReportGroup(group,
-            Kard.objects.filter(
-                done_date__gte=start_date,
-                done_date__lte=end_date,
-            )
-        )
-        record.data = report_on_cards(list(kards.queryset))
-        record.save()
         return record
@@ -3,6 +3,70 @@ from mongoengine import signals
 from kardboard.app import app
 from kardboard.util import now, delta_in_hours
 from kardboard.models.kard import Kard
+from kardboard.models.cardstatetotals import CardStateTotals
+from kardboard.models.cardhistory import CardHistory
+from kardboard.models.transitioncount import StateTransitionCount
+from kardboard.services.statejournal import (
+    NEW,
+    MOVED,
+    RECLASSED,
+    StateChange,
+    plan_flush,
+)
+from kardboard.services.transitions import ENTERED, EXITED
+
+
+class StateLogJournal(object):
+    """
+    Holds the state changes of saved cards until they're flushed to
+    StateLog in bulk, at the end of each request and task or once
+    :ref:`STATELOG_JOURNAL_SIZE` changes have built up.
+    """
+    def __init__(self):
+        self.changes = []
+
+    def __len__(self):
+        return len(self.changes)
+
+    def record(self, change):
+        self.changes.append(change)
+        if len(self.changes) >= app.config.get('STATELOG_JOURNAL_SIZE', 500):
+            self.flush()
+
+    def flush(self):
+        """Writes out the held changes. Returns the number of logs inserted."""
+        changes, self.changes = self.changes, []
+        if not changes:
+            return 0
+
+        plan = plan_flush(changes)
+        collection = StateLog.objects._collection
+        timestamp = now()
+        for card_id, state, service_class in plan.reclassed:
+            collection.update(
+                {'card': card_id, 'state': state, 'exited': {'$exists': False}},
+                {'$set': {'service_class': service_class, 'updated_at': timestamp}},
+                multi=True,
+            )
+        StateLog.close_open_logs(dict(plan.closed))
+
+        docs = []
+        for log in plan.logs:
+            doc = dict(log, created_at=timestamp, updated_at=timestamp)
+            if doc['exited'] is None:
+                # Open logs are found by not having one
+                del doc['exited']
+            docs.append(doc)
+        if docs:
+            collection.insert(docs)
+        CardStateTotals.add_logs([
+            (doc['card'], doc['state'], doc['entered'], doc['exited'], None)
+            for doc in docs if 'exited' in doc])
+        StateTransitionCount.add(
+            [(doc['card'], doc['state'], ENTERED, doc['entered']) for doc in docs] +
+            [(doc['card'], doc['state'], EXITED, doc['exited'])
+                for doc in docs if 'exited' in doc])
+        return len(docs)
 
 
 class StateLog(app.db.Document):
@@ -30,16 +94,119 @@ class StateLog(app.db.Document):
     meta = {
         'cascade': False,
         'ordering': ['-created_at'],
-        'indexes': ['card', 'state', ['card', 'created_at']]
+        'indexes': ['card', 'state', 'entered', ['card', 'created_at'], ['card', 'state', 'entered']]
     }
 
     def save(self, *args, **kwargs):
-        if self.id is None:
+        opening = self.id is None
+        if opening:
             self.created_at = now()
+        # The duration's only worked out once, when the log is closed
+        closing = self.entered and self.exited and self._duration is None
         if self.entered and self.exited:
             self._duration = self.duration
         self.updated_at = now()
         super(StateLog, self).save(*args, **kwargs)
+        card_id = self.card_id
+        if closing:
+            CardStateTotals.add_logs([(card_id, self.state,
+                self.entered, self.exited, self._duration)])
+
+        transitions = []
+        if opening:
+            transitions.append((card_id, self.state, ENTERED, self.entered))
+        if closing:
+            transitions.append((card_id, self.state, EXITED, self.exited))
+        if transitions:
+            # Only use the team if the card's already loaded; add()
+            # projects just the team otherwise
+            teams = {}
+            card = self._data.get('card')
+            if isinstance(card, Kard):
+                teams[card_id] = card.team
+            StateTransitionCount.add(transitions, teams)
+
+    @classmethod
+    def latest(cls, pairs):
+        """
+        The most recently entered log for each of pairs of (card_id,
+        state), in one query. Returns {(card_id, state): StateLog}, without
+        the pairs that have no log.
+        """
+        pairs = set(pairs)
+        if not pairs:
+            return {}
+        card_ids = list(set([card_id for card_id, state in pairs]))
+        states = list(set([state for card_id, state in pairs]))
+        docs = cls.objects._collection.find(
+            {'card': {'$in': card_ids}, 'state': {'$in': states}},
+            sort=[('entered', 1)])
+
+        latest = {}
+        for doc in docs:
+            pair = (doc['card'], doc['state'])
+            if pair in pairs:
+                latest[pair] = doc
+        latest = dict([(pair, cls._from_son(doc)) for pair, doc in latest.items()])
+
+        # Logs of done cards may have been compacted into their history
+        missing = pairs - set(latest.keys())
+        if missing:
+            card_ids = set([card_id for card_id, state in missing])
+            for log in CardHistory.archived_logs(card_ids):
+                pair = (log.card_id, log.state)
+                if pair in missing and (pair not in latest or
+                        log.entered >= latest[pair].entered):
+                    latest[pair] = log
+        return latest
+
+    @classmethod
+    def for_card(cls, card):
+        """
+        All of a card's logs, newest first, including any that have been
+        compacted into its CardHistory.
+        """
+        logs = list(cls.objects.filter(card=card))
+        logs.extend(CardHistory.archived_logs([card.id]))
+        logs.sort(key=lambda log: log.created_at, reverse=True)
+        return logs
+
+    @property
+    def card_id(self):
+        """The id of the log's card, without loading the card."""
+        card = self._data.get('card')
+        return getattr(card, 'id', card)
+
+    @classmethod
+    def close_open_logs(cls, exits):
+        """
+        Closes the open logs of the cards in exits, a dictionary of
+        {card_id: exited}, and adds them to the cards' CardStateTotals
+        and StateTransitionCounts. Costs one query, one update per
+        distinct exit time and one update per card.
+        """
+        if not exits:
+            return
+        collection = cls.objects._collection
+        open_logs = collection.find(
+            {'card': {'$in': exits.keys()}, 'exited': {'$exists': False}},
+            fields=['card', 'state', 'entered'])
+        closed = [(log['card'], log['state'], log['entered'],
+            exits[log['card']], None) for log in open_logs]
+
+        by_exit = {}
+        for card_id, exited in exits.items():
+            by_exit.setdefault(exited, []).append(card_id)
+        timestamp = now()
+        for exited, card_ids in by_exit.items():
+            collection.update(
+                {'card': {'$in': card_ids}, 'exited': {'$exists': False}},
+                {'$set': {'exited': exited, 'updated_at': timestamp}},
+                multi=True,
+            )
+        CardStateTotals.add_logs(closed)
+        StateTransitionCount.add([(card_id, state, EXITED, exited)
+            for card_id, state, entered, exited, duration in closed])
 
     def __repr__(self):
         return "<StateLog: %s, %s, %s -- %s, %s hours>" % (
@@ -50,10 +217,24 @@ class StateLog(app.db.Document):
             self._duration
         )
 
+    journal = StateLogJournal()
+
+    @classmethod
+    def journaling(cls):
+        return app.config.get('STATELOG_JOURNAL', False)
+
+    @classmethod
+    def flush_journal(cls, *args, **kwargs):
+        """Flushes the journal. Takes any arguments so it can be a signal handler."""
+        return cls.journal.flush()
+
     @classmethod
     def kard_pre_save(cls, sender, document, **kwargs):
         observed_card = document
 
+        if cls.journaling():
+            return cls._journal_pre_save(observed_card)
+
         if observed_card.state_changing is False:
             # No need to worry about logging it, nothing's changing!
             return None
@@ -82,6 +263,9 @@ class StateLog(app.db.Document):
     def kard_post_save(cls, sender, document, **kwargs):
         observed_card = document
 
+        if cls.journaling():
+            return cls._journal_post_save(observed_card)
+
         # Is there a currently open state log
         logs = cls.objects.filter(
             card=observed_card,
@@ -100,6 +284,36 @@ class StateLog(app.db.Document):
         sl.service_class = observed_card.service_class.get('name')
         sl.save()
 
+    @classmethod
+    def _journal_pre_save(cls, observed_card):
+        # The card's id isn't known until it's saved, so just note
+        # what kind of change this is for post_save to journal
+        old_state = observed_card.old_state
+        if old_state != observed_card.state:
+            kind = MOVED if old_state is not None else NEW
+        elif observed_card.field_changing('_service_class'):
+            kind = RECLASSED
+        else:
+            kind = None
+
+        observed_card._state_change = None
+        if kind is not None:
+            observed_card._state_change = (kind, now())
+
+    @classmethod
+    def _journal_post_save(cls, observed_card):
+        if not observed_card._state_change:
+            return None
+        kind, at = observed_card._state_change
+        observed_card._state_change = None
+        cls.journal.record(StateChange(
+            observed_card.id,
+            kind,
+            observed_card.state,
+            observed_card.service_class.get('name'),
+            at,
+        ))
+
     @property
     def duration(self):
         if self._duration is not None:
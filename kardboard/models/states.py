@@ -22,6 +22,11 @@ class States(object):
         self.config = config
         self.states = self._parse_state_config(config.get('CARD_STATES', ()))
         self.state_names = [s.name for s in self.states]
+        self._positions = dict((s, i) for i, s in enumerate(self.states))
+        self._name_positions = {}
+        for i, name in enumerate(self.state_names):
+            self._name_positions.setdefault(name, i)
+        self._by_slug = dict((slugify(n), n) for n in self.state_names)
         self.backlog_state = self._find_backlog()
         self.start_state = self._find_start()
         self.done_state = self._find_done()
@@ -62,17 +67,15 @@ class States(object):
         Find all states, in order, that come
         before a start_date is applied.
         """
-        return [s.name for s in self.states if self.states.index(s) < self.states.index(self.start_state)]
+        return self.state_names[:self._positions[self.start_state]]
 
     def _find_in_progress(self):
         """
         Find all states, in order, that come after after backlog
         but before done.
         """
-        in_progress = [s.name for s in self.states
-            if self.states.index(s) > self.states.index(self.backlog_state) and
-            self.states.index(s) < self.states.index(self.done_state)]
-        return in_progress
+        return self.state_names[self._positions[self.backlog_state] + 1:
+            self._positions[self.done_state]]
 
     def _find_done(self):
         default = -1
@@ -108,15 +111,15 @@ class States(object):
         differently than requests for the new in 1.12 State objects.
         """
         if isinstance(arg, (str, unicode)):
-            return self.state_names.index(arg)
+            position = self._name_positions.get(arg)
         else:
-            return self.states.index(arg)
+            position = self._positions.get(arg)
+        if position is None:
+            raise ValueError("%r is not a state" % (arg, ))
+        return position
 
     def find_by_slug(self, slug):
-        by_slug = {}
-        for state in self:
-            by_slug[slugify(state)] = state
-        return by_slug[slug]
+        return self._by_slug[slug]
 
     @property
     def orderable(self):
@@ -0,0 +1,51 @@
+import datetime
+
+from pymongo.errors import DuplicateKeyError
+
+from kardboard.app import app
+from kardboard.util import now
+
+
+class TaskLock(app.db.Document):
+    """
+    Marks a task call as queued and not yet started, so the same call
+    isn't queued again in the meantime. Locks are released when the task
+    starts, and expire in case it never does.
+    """
+
+    key = app.db.StringField(primary_key=True)
+    """The task's name and arguments."""
+
+    expires_at = app.db.DateTimeField(required=True)
+
+    meta = {
+        'collection': 'task_locks',
+        'allow_inheritance': False,
+        # Mongo clears out expired locks by itself
+        'indexes': [{'fields': ['expires_at'], 'expireAfterSeconds': 0}],
+    }
+
+    @classmethod
+    def acquire(klass, key, ttl):
+        """
+        Takes the lock for ttl seconds. Returns False if someone else
+        holds it and it hasn't expired.
+        """
+        collection = klass.objects._collection
+        timestamp = now()
+        expires_at = timestamp + datetime.timedelta(seconds=ttl)
+        try:
+            collection.insert({'_id': key, 'expires_at': expires_at}, safe=True)
+            return True
+        except DuplicateKeyError:
+            # Mongo only sweeps expired documents once a minute
+            result = collection.update(
+                {'_id': key, 'expires_at': {'$lte': timestamp}},
+                {'$set': {'expires_at': expires_at}},
+                safe=True,
+            )
+            return result['n'] == 1
+
+    @classmethod
+    def release(klass, key):
+        klass.objects._collection.remove({'_id': key})
@@ -0,0 +1,110 @@
+from collections import defaultdict
+
+from kardboard.app import app
+from kardboard.util import chunked, now
+from kardboard.services.transitions import ENTERED, EXITED, bucket_transitions
+
+
+class StateTransitionCount(app.db.Document):
+    """
+    How many of a team's cards entered and exited a state on a day.
+    StateLog adds to it as logs are opened and closed, and rebuild()
+    counts them again from all the logs.
+    """
+
+    team = app.db.StringField()
+    state = app.db.StringField(required=True)
+    date = app.db.DateTimeField(required=True)
+    """Midnight of the day the transitions happened on."""
+
+    entered = app.db.IntField(default=0)
+    exited = app.db.IntField(default=0)
+
+    updated_at = app.db.DateTimeField(required=True)
+
+    meta = {
+        'collection': 'state_transition_counts',
+        'indexes': [['state', 'date'], ['team', 'state', 'date']],
+    }
+
+    @classmethod
+    def add(klass, transitions, teams=None):
+        """
+        Counts transitions, given as (card_id, state, kind, at) where kind
+        is ENTERED or EXITED. The teams of cards missing from teams, a
+        dictionary of {card_id: team}, are looked up in one query. Costs
+        one update per team, state and day.
+        """
+        from kardboard.models.kard import Kard
+
+        transitions = list(transitions)
+        if not transitions:
+            return
+        teams = dict(teams or {})
+        missing = set([t[0] for t in transitions]) - set(teams.keys())
+        if missing:
+            docs = Kard.objects._collection.find(
+                {'_id': {'$in': list(missing)}}, fields=['team'])
+            teams.update([(doc['_id'], doc.get('team')) for doc in docs])
+
+        collection = klass.objects._collection
+        timestamp = now()
+        buckets = bucket_transitions(transitions, teams)
+        for (team, state, day), counts in buckets.items():
+            collection.update(
+                {'team': team, 'state': state, 'date': day},
+                {'$inc': counts, '$set': {'updated_at': timestamp}},
+                upsert=True,
+            )
+
+    @classmethod
+    def counts(klass, state, start, end, teams=None):
+        """
+        {day: {ENTERED: count, EXITED: count}} for a state between start
+        and end, summed over teams, or over every team if None.
+        """
+        spec = {'state': state, 'date': {'$gte': start, '$lte': end}}
+        if teams is not None:
+            spec['team'] = {'$in': list(teams)}
+        docs = klass.objects._collection.find(spec,
+            fields=['date', ENTERED, EXITED])
+
+        counts = defaultdict(lambda: {ENTERED: 0, EXITED: 0})
+        for doc in docs:
+            day = counts[doc['date']]
+            day[ENTERED] += doc.get(ENTERED, 0)
+            day[EXITED] += doc.get(EXITED, 0)
+        return dict(counts)
+
+    @classmethod
+    def rebuild(klass):
+        """
+        Replaces every count with ones worked out from all the StateLogs,
+        archived ones included. Returns the number of transitions counted.
+        """
+        from kardboard.models.cardhistory import CardHistory
+        from kardboard.models.kard import Kard
+        from kardboard.models.statelog import StateLog
+
+        logs = StateLog.objects._collection.find(
+            fields=['card', 'state', 'entered', 'exited'])
+        transitions = []
+        for log in logs:
+            transitions.append((log['card'], log['state'], ENTERED, log['entered']))
+            if log.get('exited'):
+                transitions.append((log['card'], log['state'], EXITED, log['exited']))
+        for log in CardHistory.archived_logs():
+            transitions.append((log.card_id, log.state, ENTERED, log.entered))
+            transitions.append((log.card_id, log.state, EXITED, log.exited))
+
+        teams = dict([(doc['_id'], doc.get('team'))
+            for doc in Kard.objects._collection.find(fields=['team'])])
+        buckets = bucket_transitions(transitions, teams)
+
+        collection = klass.objects._collection
+        collection.remove({})
+        timestamp = now()
+        for chunk in chunked(buckets.items(), 500):
+            collection.insert([dict(counts, team=team, state=state, date=day,
+                updated_at=timestamp) for (team, state, day), counts in chunk])
+        return len(transitions)
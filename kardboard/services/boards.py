@@ -1,5 +1,7 @@
 from collections import defaultdict
 
+from kardboard.services.cardtimes import CardTimes
+
 
 def wip_state(wip, wip_limit):
     if wip_limit is None:
@@ -49,8 +51,8 @@ class TeamBoard(object):
         elif state_name in self.states.pre_start:
             cards.sort(key=lambda c: c.priority)
         else:
-            cards.sort(key=lambda c: c.current_cycle_time())
-            cards.reverse()
+            times = CardTimes(cards)
+            cards[:] = times.ordered(times.cycle_times, reverse=True)
 
         return cards
 
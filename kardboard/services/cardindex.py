@@ -0,0 +1,124 @@
+"""
+An in-memory index of card dates for answering "as of" questions
+without going back to the database.
+"""
+from bisect import bisect_left, bisect_right, insort
+from collections import defaultdict
+
+
+def _ms(date):
+    # Compare at the database's millisecond precision
+    if date is None:
+        return None
+    return date.replace(microsecond=date.microsecond // 1000 * 1000)
+
+
+def _remove(values, value):
+    i = bisect_left(values, value)
+    if i < len(values) and values[i] == value:
+        del values[i]
+
+
+class _Bucket(object):
+    """
+    Sorted date lists for every card of one team and type.
+
+    left_backlog and left_progress hold the date a card stopped being
+    backlogged or in progress, which is the later of the two dates
+    bounding that span. Counting them separately means a card started
+    before it was backlogged is still only counted once.
+    """
+    def __init__(self):
+        self.backlogged = []
+        self.left_backlog = []
+        self.started = []
+        self.left_progress = []
+        self.done = []
+
+    def _lists(self, backlog_date, start_date, done_date):
+        lists = []
+        if backlog_date is not None:
+            lists.append((self.backlogged, backlog_date))
+        if start_date is not None:
+            lists.append((self.started, start_date))
+            if backlog_date is not None:
+                lists.append((self.left_backlog, max(backlog_date, start_date)))
+            if done_date is not None:
+                lists.append((self.left_progress, max(start_date, done_date)))
+        if done_date is not None:
+            lists.append((self.done, done_date))
+        return lists
+
+    def add(self, backlog_date, start_date, done_date):
+        for values, value in self._lists(backlog_date, start_date, done_date):
+            insort(values, value)
+
+    def remove(self, backlog_date, start_date, done_date):
+        for values, value in self._lists(backlog_date, start_date, done_date):
+            _remove(values, value)
+
+
+class CardIntervalIndex(object):
+    """
+    Holds one entry per card of (backlog_date, start_date, done_date,
+    team, type) and counts the cards that were backlogged, in progress
+    or done as of a date by binary search.
+
+    Every count takes an optional list of teams and of types to limit
+    it to; None means all of them.
+    """
+    def __init__(self):
+        self.entries = {}
+        self.buckets = defaultdict(_Bucket)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, card_id):
+        return card_id in self.entries
+
+    def add(self, card_id, backlog_date, start_date, done_date, team, card_type):
+        if card_id in self.entries:
+            self.remove(card_id)
+        entry = (_ms(backlog_date), _ms(start_date), _ms(done_date),
+            team, card_type)
+        self.entries[card_id] = entry
+        self.buckets[(team, card_type)].add(*entry[:3])
+
+    def remove(self, card_id):
+        entry = self.entries.pop(card_id, None)
+        if entry is not None:
+            self.buckets[entry[3:]].remove(*entry[:3])
+
+    def _buckets(self, teams, types):
+        for (team, card_type), bucket in self.buckets.items():
+            if teams is not None and team not in teams:
+                continue
+            if types is not None and card_type not in types:
+                continue
+            yield bucket
+
+    def _count(self, name, date, teams, types):
+        date = _ms(date)
+        return sum([bisect_right(getattr(b, name), date)
+            for b in self._buckets(teams, types)])
+
+    def backlogged(self, date, teams=None, types=None):
+        """Cards backlogged on or before date and not started by then."""
+        return self._count('backlogged', date, teams, types) - \
+            self._count('left_backlog', date, teams, types)
+
+    def in_progress(self, date, teams=None, types=None):
+        """Cards started on or before date and not done by then."""
+        return self._count('started', date, teams, types) - \
+            self._count('left_progress', date, teams, types)
+
+    def done(self, date, teams=None, types=None):
+        """Cards done on or before date."""
+        return self._count('done', date, teams, types)
+
+    def completed(self, date, teams=None, types=None):
+        """Cards whose done_date is exactly date."""
+        date = _ms(date)
+        return sum([bisect_right(b.done, date) - bisect_left(b.done, date)
+            for b in self._buckets(teams, types)])
@@ -0,0 +1,81 @@
+"""
+Works out the cycle time, lead time, age and goal status of a batch of
+cards in one pass against a single "today", so boards and reports can
+sort and bucket on them without asking each card again.
+"""
+from kardboard.util import days_between, now
+
+
+def cycle_vs_goal(current, cycle_goal):
+    """
+    Where a cycle time sits against a (lower, upper) goal: -1 under it,
+    0 within it, 1 over it and 2 at least twice the upper bound. With no
+    goal every cycle time is within it.
+
+    >>> [cycle_vs_goal(days, (2, 5)) for days in (1, 3, 7, 10)]
+    [-1, 0, 1, 2]
+    """
+    if not cycle_goal:
+        return 0
+
+    lower, upper = cycle_goal
+    super_upper = upper * 2
+    if current < lower:
+        return -1
+    elif current >= lower and current <= upper:
+        return 0
+    elif current >= super_upper:
+        return 2
+    elif current >= upper:
+        return 1
+
+
+class CardTimes(object):
+    """
+    Parallel lists for cards, worked out the same way the cards' own
+    methods do:
+
+    cycle_times
+        Kard.current_cycle_time(), to the done date or today.
+    lead_times
+        Kard.current_lead_time(), to the done date or today.
+    ages
+        Days since an unfinished card was started; None once it's done.
+    goal_statuses
+        Kard.cycle_vs_goal.
+    """
+    def __init__(self, cards, today=None):
+        self.cards = list(cards)
+        self.today = today or now()
+
+        self.cycle_times = []
+        self.lead_times = []
+        self.ages = []
+        self.goal_statuses = []
+        for card in self.cards:
+            end = card.done_date or self.today
+            cycle_time = None
+            if card.start_date:
+                cycle_time = days_between(card.start_date, end)
+            lead_time = None
+            if card.backlog_date:
+                lead_time = days_between(card.backlog_date, end)
+
+            self.cycle_times.append(cycle_time)
+            self.lead_times.append(lead_time)
+            self.ages.append(cycle_time if not card.done_date else None)
+            self.goal_statuses.append(cycle_vs_goal(cycle_time, card.cycle_goal))
+
+    def __len__(self):
+        return len(self.cards)
+
+    def ordered(self, values, reverse=False):
+        """
+        The cards sorted by one of the lists, such as self.cycle_times.
+        reverse works like sorting and then calling list.reverse(), so
+        ties come out the same way they did when sorting the cards.
+        """
+        order = sorted(range(len(self.cards)), key=values.__getitem__)
+        if reverse:
+            order.reverse()
+        return [self.cards[i] for i in order]
@@ -0,0 +1,148 @@
+"""
+Computes a run of consecutive days' DailyRecord figures in one pass
+over the cards, instead of querying for each day separately.
+"""
+import math
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+
+from dateutil.relativedelta import relativedelta
+
+from kardboard.util import RollingStats, make_start_date
+
+
+MovingStats = namedtuple('MovingStats',
+    ['cycle_time', 'lead_time', 'std_dev', 'median_abs_dev'])
+
+DaySummary = namedtuple('DaySummary',
+    ['date', 'backlog', 'in_progress', 'done', 'completed', 'moving'])
+
+BACKLOG, IN_PROGRESS, DONE = range(3)
+
+
+def _rounded(value):
+    if value is None or math.isnan(value):
+        return 0
+    return int(round(value))
+
+
+def rolling_stats(cycle_times, lead_times):
+    """
+    The moving stats for windows of cycle and lead times held in
+    RollingStats, rounded the way DailyRecord stores them. Anything
+    that can't be calculated comes back as 0.
+    """
+    return MovingStats(
+        _rounded(cycle_times.mean()),
+        _rounded(lead_times.mean()),
+        _rounded(cycle_times.standard_deviation()),
+        _rounded(cycle_times.median_abs_dev()),
+    )
+
+
+def window_stats(cycle_times, lead_times):
+    """
+    The moving average cycle and lead time, cycle time standard deviation
+    and cycle time median absolute deviation of the cards done in a
+    window. Missing values are ignored.
+
+    >>> window_stats([2, 4, 9], [5, 7, None])
+    MovingStats(cycle_time=5, lead_time=6, std_dev=4, median_abs_dev=2)
+    """
+    return rolling_stats(
+        RollingStats([t for t in cycle_times if t is not None]),
+        RollingStats([t for t in lead_times if t is not None]),
+    )
+
+
+def sweep_days(cards, days, weeks=4):
+    """
+    Yields a DaySummary for each of days, which must be ascending
+    end-of-day datetimes, from an iterable of (backlog_date, start_date,
+    done_date, cycle_time, lead_time) tuples.
+
+    The counts match Kard.backlogged, Kard.in_progress and cards done on
+    or before (done) or exactly on (completed) the date. The moving stats
+    cover cards done from the start of the day N weeks earlier.
+    """
+    events = []
+    done_cards = []
+    for backlog_date, start_date, done_date, cycle_time, lead_time in cards:
+        if backlog_date is not None:
+            events.append((backlog_date, BACKLOG, 1))
+        if start_date is not None:
+            events.append((start_date, IN_PROGRESS, 1))
+            if backlog_date is not None:
+                events.append((max(backlog_date, start_date), BACKLOG, -1))
+            if done_date is not None:
+                events.append((max(start_date, done_date), IN_PROGRESS, -1))
+        if done_date is not None:
+            events.append((done_date, DONE, 1))
+            done_cards.append((done_date, cycle_time, lead_time))
+    events.sort()
+    done_cards.sort()
+    done_dates = [c[0] for c in done_cards]
+
+    counts = [0, 0, 0]
+    event_i = 0
+    window_start_i = window_end_i = 0
+    cycle_times, lead_times = RollingStats(), RollingStats()
+    for day in days:
+        while event_i < len(events) and events[event_i][0] <= day:
+            counts[events[event_i][1]] += events[event_i][2]
+            event_i += 1
+
+        # Only the cards entering or leaving the window are touched
+        window_start = make_start_date(date=day - relativedelta(weeks=weeks))
+        while window_end_i < len(done_cards) and done_dates[window_end_i] <= day:
+            _slide(done_cards[window_end_i], cycle_times, lead_times, 'add')
+            window_end_i += 1
+        while window_start_i < window_end_i and done_dates[window_start_i] < window_start:
+            _slide(done_cards[window_start_i], cycle_times, lead_times, 'remove')
+            window_start_i += 1
+
+        yield DaySummary(
+            day,
+            counts[BACKLOG],
+            counts[IN_PROGRESS],
+            counts[DONE],
+            bisect_right(done_dates, day) - bisect_left(done_dates, day),
+            rolling_stats(cycle_times, lead_times),
+        )
+
+
+def _slide(done_card, cycle_times, lead_times, action):
+    done_date, cycle_time, lead_time = done_card
+    if cycle_time is not None:
+        getattr(cycle_times, action)(cycle_time)
+    if lead_time is not None:
+        getattr(lead_times, action)(lead_time)
+
+
+def changed_since(old, new):
+    """
+    The earliest date whose DailyRecords change when a card's
+    (backlog_date, start_date, done_date, team) go from old to new, and
+    the teams whose records change, or (None, set()) if none do. A card
+    changing teams changes both teams' records from its earliest date.
+
+    >>> import datetime
+    >>> june = lambda d: datetime.datetime(2013, 6, d)
+    >>> changed_since((june(1), june(5), None, 'Team 1'),
+    ...     (june(1), june(5), june(9), 'Team 1'))
+    (datetime.datetime(2013, 6, 9, 0, 0), set(['Team 1']))
+    """
+    if old == new:
+        return None, set()
+
+    if old[3] != new[3]:
+        dates = list(old[:3]) + list(new[:3])
+    else:
+        dates = []
+        for old_date, new_date in zip(old[:3], new[:3]):
+            if old_date != new_date:
+                dates.extend([old_date, new_date])
+    dates = [d for d in dates if d is not None]
+    if not dates:
+        return None, set()
+    return make_start_date(date=min(dates)), set([old[3], new[3]]) - set([None])
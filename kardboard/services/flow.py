@@ -0,0 +1,129 @@
+"""
+Counts cards by state for every report group in one pass over the
+cards, or over their StateLogs for days gone by, for FlowReport, and
+lays the counts out in columns for FlowSeries.
+"""
+import heapq
+from bisect import bisect_left, bisect_right
+
+
+def count_flow(cards, states, report_groups, defect_types=()):
+    """
+    {group: (state_counts, state_card_counts)} from an iterable of
+    (state, team, type) for each card. report_groups is {group: teams},
+    where teams is None for a group that counts every team. Cards in
+    states that aren't in states, or of one of defect_types for
+    state_card_counts, aren't counted.
+
+    >>> cards = [('Todo', 'Team 1', 'Card'), ('Todo', 'Team 2', 'Defect')]
+    >>> flow = count_flow(cards, ['Todo', 'Done'],
+    ...     {'all': None, 'team-1': frozenset(['Team 1'])}, ['Defect'])
+    >>> flow['all'] == ({'Todo': 2, 'Done': 0}, {'Todo': 1, 'Done': 0})
+    True
+    >>> flow['team-1'] == ({'Todo': 1, 'Done': 0}, {'Todo': 1, 'Done': 0})
+    True
+    """
+    states = list(states)
+    defect_types = set(defect_types)
+    by_team = {}
+    for state, team, card_type in cards:
+        counts = by_team.setdefault((state, team), [0, 0])
+        counts[0] += 1
+        if card_type not in defect_types:
+            counts[1] += 1
+    return _group_counts(by_team, states, report_groups)
+
+
+def _group_counts(by_team, states, report_groups):
+    # Adds up {(state, team): [count, card_count]} for each group
+    flow = {}
+    for group, teams in report_groups.items():
+        state_counts = dict([(state, 0) for state in states])
+        state_card_counts = dict(state_counts)
+        for (state, team), (count, card_count) in by_team.items():
+            if state in state_counts and (teams is None or team in teams):
+                state_counts[state] += count
+                state_card_counts[state] += card_count
+        flow[group] = (state_counts, state_card_counts)
+    return flow
+
+
+def sweep_flow(logs, days, states, report_groups, cards, defect_types=()):
+    """
+    Yields (day, flow) for each of days, which must be ascending
+    end-of-day datetimes, with flow as count_flow would have worked it
+    out at the end of that day.
+
+    logs is an iterable of (entered, card_id, state, exited) in order,
+    with exited None for logs still open, and cards is
+    {card_id: (team, type)}. Only the logs open at the current day are
+    held in memory, so logs can be a cursor over any number of rows.
+    """
+    states = list(states)
+    defect_types = set(defect_types)
+    by_team = {}
+    exits = []
+
+    logs = iter(logs)
+    pending = next(logs, None)
+    for day in days:
+        while pending is not None and pending[0] <= day:
+            entered, card_id, state, exited = pending
+            team, card_type = cards.get(card_id, (None, None))
+            is_card = int(card_type not in defect_types)
+            counts = by_team.setdefault((state, team), [0, 0])
+            counts[0] += 1
+            counts[1] += is_card
+            if exited is not None:
+                heapq.heappush(exits, (exited, state, team, is_card))
+            pending = next(logs, None)
+
+        while exits and exits[0][0] <= day:
+            exited, state, team, is_card = heapq.heappop(exits)
+            counts = by_team[(state, team)]
+            counts[0] -= 1
+            counts[1] -= is_card
+
+        yield day, _group_counts(by_team, states, report_groups)
+
+
+def flow_columns(reports, states):
+    """
+    (dates, columns) from reports, an iterable of (date, counts) in date
+    order, with one column of counts for each of states. Reports that
+    don't mention a state have None for it.
+
+    >>> reports = [(1, {'Todo': 3}), (2, {'Todo': 2, 'Done': 1})]
+    >>> flow_columns(reports, ['Todo', 'Done'])
+    ([1, 2], [[3, 2], [None, 1]])
+    """
+    dates = []
+    columns = [[] for state in states]
+    for date, counts in reports:
+        dates.append(date)
+        for state, column in zip(states, columns):
+            column.append(counts.get(state))
+    return dates, columns
+
+
+def slice_columns(chunks, start, end, states):
+    """
+    (dates, {state: values}) for the dates from start to end, joined up
+    from chunks, an iterable of (dates, chunk_states, columns) in date
+    order. States a chunk doesn't have come out as None.
+    """
+    dates = []
+    series = dict([(state, []) for state in states])
+    for chunk_dates, chunk_states, columns in chunks:
+        lo = bisect_left(chunk_dates, start)
+        hi = bisect_right(chunk_dates, end)
+        if lo >= hi:
+            continue
+        dates.extend(chunk_dates[lo:hi])
+        positions = dict([(state, i) for i, state in enumerate(chunk_states)])
+        for state in states:
+            if state in positions:
+                series[state].extend(columns[positions[state]][lo:hi])
+            else:
+                series[state].extend([None] * (hi - lo))
+    return dates, series
@@ -23,39 +23,54 @@ class Funnel(object):
         return False
 
     def find_cards(self):
-        cards = Kard.objects.filter(
-            state=self.state,
-        ).exclude('_ticket_system_data')
-        return list(cards)
+        return Kard.objects.filter(state=self.state).views()
 
     def state_duration(self, card):
-        statelog = StateLog.objects.filter(card=card, state=self.state).order_by('-entered')
+        statelog = StateLog.objects.filter(card=card.id, state=self.state).order_by('-entered')
         return statelog[0].duration
 
-    def times_in_state(self):
+    def times_in_state(self, cards=None):
+        """
+        How long each card has been in the funnel's state, keyed by card
+        key, from one query for all their latest StateLogs.
+        """
+        if cards is None:
+            cards = self.find_cards()
+        logs = StateLog.latest([(c.id, self.state) for c in cards])
         times_in_state = {}
-        for c in self.find_cards():
-            times_in_state[c.key] = self.state_duration(c)
+        for c in cards:
+            log = logs.get((c.id, self.state), None)
+            if log is not None:
+                times_in_state[c.key] = log.duration
+            else:
+                times_in_state[c.key] = None
         return times_in_state
 
-    def ordered_cards(self):
-        cards = self.find_cards()
+    def ordered_cards(self, cards=None, times_in_state=None):
+        if cards is None:
+            cards = self.find_cards()
 
         cards_with_ordering = [c for c in cards if c.priority]
         cards_without_ordering = [c for c in cards if c.priority is None]
 
+        if times_in_state is None:
+            times_in_state = self.times_in_state(cards_without_ordering)
+
         cards_with_ordering = sorted(cards_with_ordering, key=lambda c: c.priority)
-        cards_without_ordering = sorted(cards_without_ordering, key=lambda c: self.state_duration(c))
+        cards_without_ordering = sorted(cards_without_ordering, key=lambda c: times_in_state.get(c.key))
         cards_without_ordering.reverse()
         cards = cards_with_ordering + cards_without_ordering
         return cards
 
-    def markers(self):
+    def markers(self, cards=None):
+        if cards is None:
+            cards = self.find_cards()
+
         funnel_markers = []
         if self.throughput:
             counter = 0
             batch_counter = 0
-            for k in self.find_cards():
+            for k in cards:
                 if counter % self.throughput == 0:
                     if len(funnel_markers) > 0:
                         base_date = funnel_markers[-1]
@@ -0,0 +1,130 @@
+"""
+Reports on cards by service class in one pass, keeping running totals
+per class rather than a list of each class's cards.
+"""
+from kardboard.util import days_between, month_range, now
+
+PARTIAL_FIELDS = ('name', 'cards', 'timed', 'cycle_time_sum', 'hits')
+
+
+class ServiceClassAggregator(object):
+    """
+    Add cards to it one at a time, by their service class name and
+    start and done dates, then ask for the report.
+
+    service_class looks up the goal record for a card's service class
+    name, the way Kard.service_class does, and cards are reported under
+    the record's name.
+
+    The totals for one set of cards can be stored with partial() and
+    merged with another's, so a report on several months can be put
+    together from a partial for each month.
+    """
+    def __init__(self, service_class, today=None):
+        self.service_class = service_class
+        self.today = today or now()
+        self.totals = {}
+
+    def add(self, service_class_name, start_date, done_date):
+        sclass = self.service_class(service_class_name)
+        totals = self._totals(sclass['name'])
+
+        cycle_time = None
+        if start_date:
+            cycle_time = days_between(start_date, done_date or self.today)
+            totals[1] += 1
+            totals[2] += cycle_time
+        totals[0] += 1
+        if cycle_time <= sclass.get('upper'):
+            totals[3] += 1
+
+    def _totals(self, classname):
+        totals = self.totals.get(classname)
+        if totals is None:
+            # [cards, cards with a cycle time, cycle time sum, goal hits]
+            totals = self.totals[classname] = [0, 0, 0, 0]
+        return totals
+
+    def partial(self):
+        """
+        The totals so far as a list of dictionaries, one per service
+        class, that can be stored and handed to merge() later.
+        """
+        return [dict(zip(PARTIAL_FIELDS, [classname] + totals))
+            for classname, totals in sorted(self.totals.items())]
+
+    def merge(self, partial):
+        """
+        Adds the totals from another aggregator's partial().
+
+        >>> classes = {'Expedite': {'name': 'Expedite', 'upper': 3}}
+        >>> import datetime
+        >>> june = lambda d: datetime.datetime(2013, 6, d)
+        >>> may, july = ServiceClassAggregator(classes.get), ServiceClassAggregator(classes.get)
+        >>> may.add('Expedite', june(1), june(3))
+        >>> july.add('Expedite', june(1), june(7))
+        >>> july.merge(may.partial())
+        >>> july.report()['Expedite']['wip'], july.report()['Expedite']['cards_hit_goal']
+        (2, 1)
+        """
+        for row in partial:
+            totals = self._totals(row['name'])
+            for i, field in enumerate(PARTIAL_FIELDS[1:]):
+                totals[i] += row[field]
+
+    def report(self):
+        """
+        {class name: {service_class, wip, wip_percent, cycle_time_average,
+        cards_hit_goal, cards_hit_goal_percent}} for the cards added.
+
+        >>> classes = {'Expedite': {'name': 'Expedite', 'upper': 3}}
+        >>> aggregator = ServiceClassAggregator(classes.get)
+        >>> import datetime
+        >>> june = lambda d: datetime.datetime(2013, 6, d)
+        >>> aggregator.add('Expedite', june(1), june(3))
+        >>> aggregator.add('Expedite', june(1), june(7))
+        >>> report = aggregator.report()['Expedite']
+        >>> report['wip'], report['cycle_time_average'], report['cards_hit_goal']
+        (2, 4, 1)
+        """
+        total = sum([totals[0] for totals in self.totals.values()])
+
+        report = {}
+        for classname, totals in self.totals.items():
+            count, timed, cycle_time_sum, hits = totals
+            cycle_time_average = 0
+            if timed:
+                cycle_time_average = int(round(cycle_time_sum / float(timed)))
+            report[classname] = {
+                'service_class': classname,
+                'wip': count,
+                'wip_percent': count / float(total),
+                'cycle_time_average': cycle_time_average,
+                'cards_hit_goal': hits,
+                'cards_hit_goal_percent': hits / float(count),
+            }
+        return report
+
+
+def changed_months(old, new):
+    """
+    The (team, month start) of the monthly partials a card's change puts
+    out of date, given its (team, service class, start date, done date)
+    before and after, or None if it didn't or doesn't exist. Only done
+    cards are in a month's partial.
+
+    >>> import datetime
+    >>> old = ('A', None, datetime.datetime(2013, 5, 20), datetime.datetime(2013, 5, 31))
+    >>> new = ('A', None, datetime.datetime(2013, 5, 20), datetime.datetime(2013, 6, 1))
+    >>> sorted(changed_months(old, new))
+    [('A', datetime.datetime(2013, 5, 1, 0, 0)), ('A', datetime.datetime(2013, 6, 1, 0, 0))]
+    >>> changed_months(new, new)
+    set([])
+    """
+    if old == new:
+        return set()
+    months = set()
+    for values in (old, new):
+        if values is not None and values[3]:
+            months.add((values[0], month_range(values[3])[0]))
+    return months
@@ -0,0 +1,118 @@
+"""
+Mergeable summaries of cycle times. Cycle times are whole days, so a
+count of cards per cycle time is small, exact, and merges by adding the
+counts up: percentiles for any run of weeks come from summing the weeks'
+histograms instead of reading their cards.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from kardboard.util import days_between, week_range
+
+
+def cycle_time_changes(old, new):
+    """
+    [(team, service class, done date, cycle time, +1 or -1)] that takes a
+    card's done cycle time out of the summaries and puts it back, given
+    its (team, service class, start date, done date) before and after,
+    or None if it didn't or doesn't exist. Cards that aren't done, or
+    weren't, add or take nothing away.
+
+    >>> import datetime
+    >>> june = lambda d: datetime.datetime(2013, 6, d)
+    >>> cycle_time_changes(('A', None, june(1), None), ('A', None, june(1), june(4)))
+    [('A', None, datetime.datetime(2013, 6, 4, 0, 0), 3, 1)]
+    >>> cycle_time_changes(('A', None, june(1), june(4)), ('A', None, june(1), june(4)))
+    []
+    """
+    if old == new:
+        return []
+    changes = []
+    for values, delta in ((old, -1), (new, 1)):
+        if values is None:
+            continue
+        team, service_class, start_date, done_date = values
+        if start_date and done_date:
+            changes.append((team, service_class, done_date,
+                days_between(start_date, done_date), delta))
+    return changes
+
+
+def bucket_cycle_times(changes):
+    """
+    {(team, week, service class): {cycle time: count}} for changes from
+    cycle_time_changes(), where week is the start of the week they were
+    done in. Counts that cancel out are left out.
+
+    >>> import datetime
+    >>> done = datetime.datetime(2013, 6, 5)
+    >>> bucket_cycle_times([('A', None, done, 3, 1), ('A', None, done, 3, 1),
+    ...     ('A', None, done, 4, -1), ('A', None, done, 4, 1)])
+    {('A', datetime.datetime(2013, 6, 2, 0, 0), None): {3: 2}}
+    """
+    buckets = defaultdict(lambda: defaultdict(int))
+    for team, service_class, done_date, cycle_time, delta in changes:
+        key = (team, week_range(done_date)[0], service_class)
+        buckets[key][cycle_time] += delta
+
+    result = {}
+    for key, counts in buckets.items():
+        counts = dict([(t, n) for t, n in counts.items() if n])
+        if counts:
+            result[key] = counts
+    return result
+
+
+def whole_weeks(start_date, end_date):
+    """
+    (first, last) where the weeks starting from first up to but not
+    including last lie wholly between start_date and end_date. first
+    isn't before last when there aren't any.
+
+    >>> import datetime
+    >>> first, last = whole_weeks(datetime.datetime(2013, 6, 5),
+    ...     datetime.datetime(2013, 6, 29, 23, 59, 59))
+    >>> first.day, last.day
+    (9, 30)
+    """
+    first = week_range(start_date)[0]
+    if first < start_date:
+        first += timedelta(days=7)
+    last, last_end = week_range(end_date)
+    if end_date >= last_end:
+        last += timedelta(days=7)
+    return first, last
+
+
+def merge_histograms(histograms):
+    """
+    The sum of {cycle time: count} histograms.
+
+    >>> merge_histograms([{1: 2, 3: 1}, {3: 4}, {}])
+    {1: 2, 3: 5}
+    """
+    merged = defaultdict(int)
+    for histogram in histograms:
+        for cycle_time, count in histogram.items():
+            merged[cycle_time] += count
+    return dict([(t, n) for t, n in merged.items() if n > 0])
+
+
+def percentile(target_pct, histogram):
+    """
+    The smallest cycle time that at least target_pct of the histogram's
+    cards are at or under, or None if it's empty.
+
+    >>> percentile(.8, {1: 2, 3: 5, 10: 3})
+    10
+    >>> percentile(.5, {1: 2, 3: 5, 10: 3})
+    3
+    """
+    total = sum(histogram.values())
+    pct_threshold = target_pct * total
+
+    card_total = 0
+    for cycle_time in sorted(histogram.keys()):
+        card_total += histogram[cycle_time]
+        if card_total >= pct_threshold:
+            return cycle_time
@@ -0,0 +1,74 @@
+"""
+Plans the StateLog writes for a batch of journaled card state changes,
+so they can be made with a handful of bulk operations.
+"""
+from collections import namedtuple
+
+
+NEW, MOVED, RECLASSED = 'new', 'moved', 'reclassed'
+
+StateChange = namedtuple('StateChange',
+    ['card_id', 'kind', 'state', 'service_class', 'at'])
+"""
+A card entering state at a datetime, either as a NEW card or MOVED from
+another state, or being RECLASSED into service_class while in state.
+"""
+
+JournalPlan = namedtuple('JournalPlan', ['reclassed', 'closed', 'logs'])
+"""
+reclassed
+    (card_id, state, service_class) for logs already open in the
+    database whose service class changed.
+closed
+    (card_id, exited) for cards whose open logs should be closed.
+logs
+    Dictionaries of the new logs' card, state, service_class, entered
+    and exited, which is None for logs left open.
+"""
+
+
+def plan_flush(changes):
+    """
+    Turns changes, in the order they happened, into a JournalPlan. The
+    updates in reclassed have to be made before the ones in closed, and
+    both before the logs are inserted.
+
+    A card that moves several times gets one closed entry, for its first
+    move, and the logs in between are written already closed.
+    """
+    by_card = {}
+    order = []
+    for change in changes:
+        if change.card_id not in by_card:
+            by_card[change.card_id] = []
+            order.append(change.card_id)
+        by_card[change.card_id].append(change)
+
+    reclassed, closed, logs = [], [], []
+    for card_id in order:
+        pending = None
+        card_reclassed = {}
+        for change in by_card[card_id]:
+            if change.kind == RECLASSED:
+                if pending is not None:
+                    pending['service_class'] = change.service_class
+                else:
+                    card_reclassed[change.state] = change.service_class
+                continue
+
+            if pending is not None:
+                pending['exited'] = change.at
+            elif change.kind == MOVED:
+                closed.append((card_id, change.at))
+            pending = {
+                'card': card_id,
+                'state': change.state,
+                'service_class': change.service_class,
+                'entered': change.at,
+                'exited': None,
+            }
+            logs.append(pending)
+        reclassed.extend([(card_id, state, service_class)
+            for state, service_class in card_reclassed.items()])
+
+    return JournalPlan(reclassed, closed, logs)
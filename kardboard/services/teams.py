@@ -1,10 +1,13 @@
 from dateutil.relativedelta import relativedelta
 from datetime import datetime
 from collections import defaultdict
+import copy
 
 from kardboard.models.kard import Kard
-from kardboard.models.states import States
+from kardboard.models.cycletimesketch import CycleTimeSketch
+from kardboard.models.configsnapshot import config_snapshot
 from kardboard.models.team import Team, TeamList
+from kardboard.services.sketches import percentile
 from kardboard.util import make_start_date, make_end_date, standard_deviation, average, median
 
 
@@ -68,7 +71,7 @@ class TeamStats(object):
         return [c for c in cycle_time_list if c is not None]
 
     def wip(self):
-        states = States()
+        states = config_snapshot().states
         wip = Kard.objects.filter(
             team=self.team_name,
             done_date=None,
@@ -83,9 +86,12 @@ class TeamStats(object):
         start_date, end_date, weeks = self.throughput_date_range(weeks, weeks_offset)
         return len(self.done_in_range(start_date, end_date))
 
+    def today(self):
+        return datetime.now()
+
     def throughput_date_range(self, weeks=4, weeks_offset=0):
         oldest_card_date = self.oldest_card_date()
-        end_date = datetime.now() - relativedelta(weeks=weeks_offset)
+        end_date = self.today() - relativedelta(weeks=weeks_offset)
         start_date = end_date - relativedelta(weeks=weeks)
 
         if oldest_card_date and start_date < oldest_card_date:
@@ -146,19 +152,7 @@ class TeamStats(object):
         return dict(d)
 
     def percentile(self, target_pct, weeks=4, weeks_offset=0):
-        hist = self.histogram(weeks, weeks_offset)
-        total = sum(hist.values())
-        pct_threshold = target_pct * total
-
-        card_total = 0
-        sorted_keys = hist.keys()
-        sorted_keys.sort()
-        for key in sorted_keys:
-            cycle_time = key
-            card_count = hist[key]
-            card_total += card_count
-            if card_total >= pct_threshold:
-                return cycle_time
+        return percentile(target_pct, self.histogram(weeks, weeks_offset))
 
     def hit_sla(self, weeks=4, weeks_offset=0):
         start_date, end_date, weeks = self.throughput_date_range(weeks, weeks_offset)
@@ -172,6 +166,108 @@ class TeamStats(object):
             return 0
 
 
+class TeamStatsSnapshot(TeamStats):
+    """
+    TeamStats that reads the key, done date, cycle time and service
+    class of the team's cards done in the last `weeks` weeks once, and
+    works out every metric, offset windows included, from those. Windows
+    reaching back further than that are read from the database.
+
+    The cards are read regardless of exclude_classes, so without()
+    can hand out a TeamStatsSnapshot over the same cards that excludes
+    different classes.
+    """
+    FIELDS = ('key', 'done_date', '_cycle_time', '_service_class')
+
+    def __init__(self, team_name, exclude_classes=[], weeks=8, today=None):
+        super(TeamStatsSnapshot, self).__init__(team_name, exclude_classes)
+        self._today = today or datetime.now()
+        self.start_date = make_start_date(
+            date=self._today - relativedelta(weeks=weeks))
+        self.rows = self._load(self.start_date, make_end_date(date=self._today))
+        self._oldest_card_date = None
+
+    def without(self, exclude_classes):
+        """This snapshot's cards, leaving out exclude_classes instead."""
+        other = copy.copy(self)
+        other.exclude_classes = exclude_classes
+        other.card_info = []
+        other._oldest_card_date = None
+        return other
+
+    def _load(self, start_date, end_date):
+        """
+        (service class name, card_info dictionary) for the team's cards
+        done from start_date to end_date, sorted by done date. Costs one
+        projected query.
+        """
+        service_class = config_snapshot().service_class
+        fields = [Kard._fields[name].db_field for name in self.FIELDS]
+        docs = Kard.objects._collection.find(
+            {
+                Kard._fields['team'].db_field: self.team_name,
+                fields[1]: {'$gte': start_date, '$lte': end_date},
+            },
+            fields=fields,
+            sort=[(fields[1], 1)],
+        )
+        rows = []
+        for doc in docs:
+            key, done_date, cycle_time, classname = [doc.get(f) for f in fields]
+            rows.append((classname, {
+                'key': key,
+                'done_date': done_date,
+                'cycle_time': cycle_time,
+                'service_class': service_class(classname),
+            }))
+        return rows
+
+    def today(self):
+        return self._today
+
+    def oldest_card_date(self):
+        if self._oldest_card_date is None:
+            self._oldest_card_date = super(TeamStatsSnapshot, self).oldest_card_date()
+        return self._oldest_card_date
+
+    def done_in_range(self, start_date, end_date):
+        end_date = make_end_date(date=end_date)
+        start_date = make_start_date(date=start_date)
+
+        rows = self.rows
+        if start_date < self.start_date:
+            rows = self._load(start_date, end_date)
+        done = [info for classname, info in rows
+            if start_date <= info['done_date'] <= end_date and
+            classname not in self.exclude_classes]
+
+        self.card_info = done
+        return done
+
+    def cycle_times(self, weeks=4, weeks_offset=0):
+        start_date, end_date, weeks = self.throughput_date_range(weeks, weeks_offset)
+        return [r['cycle_time'] for r in self.done_in_range(start_date, end_date)
+            if r['cycle_time'] is not None]
+
+    def histogram(self, weeks=4, weeks_offset=0):
+        # Windows older than the snapshot come from the weekly sketches
+        start_date, end_date = self.throughput_date_range(weeks, weeks_offset)[:2]
+        if make_start_date(date=start_date) < self.start_date:
+            return CycleTimeSketch.histogram(self.team_name, start_date, end_date,
+                self.exclude_classes)
+        return super(TeamStatsSnapshot, self).histogram(weeks, weeks_offset)
+
+    def hit_sla(self, weeks=4, weeks_offset=0):
+        start_date, end_date, weeks = self.throughput_date_range(weeks, weeks_offset)
+        done = self.done_in_range(start_date, end_date)
+        hit_sla = [r for r in done if r['cycle_time'] <= r['service_class']['upper']]
+
+        try:
+            return len(hit_sla) / float(len(done))
+        except ZeroDivisionError:
+            return 0
+
+
 class EfficiencyStats(object):
     """
     Takes in team state data and returns info about the teams
@@ -210,3 +306,26 @@ class EfficiencyStats(object):
                 previous_value = previous_values[i - 1]
             data[i][key] = data[i][key] - previous_value
         return data
+
+    def calculate_columns(self, columns, mapping=None):
+        """
+        calculate() for columns of counts, {state: [count, ...]} all of
+        the same length, without a dictionary per day. Missing states
+        and counts of None add nothing.
+        """
+        mapping = self._get_mapping(mapping)
+        length = max([len(c) for c in columns.values()] or [0])
+        sums = {}
+        for sum_name, list_of_states in mapping.items():
+            totals = [0] * length
+            for state in list_of_states:
+                for i, count in enumerate(columns.get(state, ())):
+                    totals[i] += count or 0
+            sums[sum_name] = totals
+        return sums
+
+    def make_incremental_column(self, values):
+        """make_incremental() for a single column of counts."""
+        values = [v or 0 for v in values]
+        return [current - previous
+            for previous, current in zip(values[:1] + values, values)]
@@ -0,0 +1,68 @@
+"""
+Daily counts of cards entering and leaving states, kept up to date by
+StateLog so transition reports read a row per day rather than querying
+the logs for every day.
+"""
+from collections import defaultdict
+
+from dateutil.relativedelta import relativedelta
+
+from kardboard.util import make_start_date
+
+
+ENTERED, EXITED = 'entered', 'exited'
+
+
+def bucket_transitions(transitions, teams):
+    """
+    Counts transitions, given as (card_id, state, kind, at) where kind is
+    ENTERED or EXITED, by the day they happened on and the team of the
+    card, looked up in teams. Returns {(team, state, day): {kind: count}}.
+    """
+    buckets = defaultdict(lambda: defaultdict(int))
+    for card_id, state, kind, at in transitions:
+        key = (teams.get(card_id), state, make_start_date(date=at))
+        buckets[key][kind] += 1
+    return dict([(key, dict(counts)) for key, counts in buckets.items()])
+
+
+def daily_series(counts, start, end, kind=EXITED, weekdays_only=False):
+    """
+    [(day, count)] for every day from start to end, counting the days
+    without any transitions as 0. counts is {day: {kind: count}}.
+
+    >>> import datetime
+    >>> days = [datetime.datetime(2013, 6, d) for d in (3, 4, 5)]
+    >>> counts = {days[0]: {EXITED: 2}, days[2]: {EXITED: 1, ENTERED: 4}}
+    >>> [count for day, count in daily_series(counts, days[0], days[2])]
+    [2, 0, 1]
+    """
+    series = []
+    day = make_start_date(date=start)
+    end = make_start_date(date=end)
+    while day <= end:
+        if not weekdays_only or day.weekday() < 5:
+            series.append((day, counts.get(day, {}).get(kind, 0)))
+        day += relativedelta(days=1)
+    return series
+
+
+def histogram(series):
+    """{count: number of days with that count} for a daily_series."""
+    hist = defaultdict(int)
+    for day, count in series:
+        hist[count] += 1
+    return dict(hist)
+
+
+def state_transitions(state, start, end, group='all', kind=EXITED,
+        weekdays_only=False):
+    """
+    The daily_series of a report group's cards entering or exiting a
+    state between start and end.
+    """
+    from kardboard.models import config_snapshot, StateTransitionCount
+
+    teams = config_snapshot().report_group_teams(group)
+    counts = StateTransitionCount.counts(state, start, end, teams=teams)
+    return daily_series(counts, start, end, kind, weekdays_only)
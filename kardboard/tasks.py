@@ -3,12 +3,45 @@ import datetime
 from dateutil import relativedelta
 import statsd
 
-from kardboard.models import Kard, Person, Q
+from celery.signals import task_postrun
+
+from kardboard.models import Kard, Person, Q, StateLog, TaskLock
 from flask.ext.celery import Celery
 from kardboard.app import app
 from kardboard.util import log_exception
 
 celery = Celery(app)
+task_postrun.connect(StateLog.flush_journal)
+
+
+def _coalesce_key(task, args):
+    return "%s:%r" % (task.name, tuple(args))
+
+
+def delay_coalesced(task, *args):
+    """
+    Queues task with args, unless the same call is already queued and
+    hasn't started yet. The calls skipped are counted in statsd.
+
+    task is called with coalesced=True, and should call
+    coalesced_started() when it is, so runs queued some other way, like
+    celerybeat's, don't let a duplicate in while one is still queued.
+    """
+    ttl = app.config.get('TASK_COALESCE_TTL', 15 * 60)
+    statsd_conn = app.statsd.get_client('tasks.coalesce.%s' % task.name.split('.')[-1])
+    queued_counter = statsd_conn.get_client('queued', class_=statsd.Counter)
+    skipped_counter = statsd_conn.get_client('skipped', class_=statsd.Counter)
+
+    if not TaskLock.acquire(_coalesce_key(task, args), ttl):
+        skipped_counter += 1
+        return None
+    queued_counter += 1
+    return task.apply_async(args=args, kwargs={'coalesced': True}, expires=ttl)
+
+
+def coalesced_started(task, *args):
+    """Lets the call be queued again, now it's too late to skip it."""
+    TaskLock.release(_coalesce_key(task, args))
 
 
 @celery.task(name="tasks.force_update_ticket", ignore_result=True)
@@ -130,46 +163,42 @@ def update_daily_record(target_date, group):
 
     logger = update_daily_record.get_logger()
 
-    should_recalc = False
-
-    # We need all this logic because this job can be pulled
-    # by two workers in parallel leading to a race condition
-    try:
-        dr = DailyRecord.objects.get(date=target_date, group=group)
-        one_minute_ago = datetime.datetime.now() - relativedelta.relativedelta(minutes=1)
-        if dr.updated_at <= one_minute_ago:
-            should_recalc = True
-        else:
-            logger.debug("DailyRecord: %s / %s was recalulcated in the last minute" % (target_date, group))
-    except DailyRecord.DoesNotExist:
-        should_recalc = True
-
-    if should_recalc:
-        DailyRecord.calculate(date=target_date, group=group)
-        logger.info("Successfully calculated DailyRecord: Date: %s / Group: %s" % (target_date, group))
+    DailyRecord.calculate(date=target_date, group=group)
+    logger.info("Successfully calculated DailyRecord: Date: %s / Group: %s" % (target_date, group))
 
 @celery.task(name="tasks.queue_daily_record_updates", ignore_result=True)
 def queue_daily_record_updates(days=365):
-    from kardboard.app import app
-    from kardboard.util import make_end_date
+    # DailyRecord.rebuild_dirty is the ledger's only consumer, since it
+    # puts the watermarks back if the records can't be written
+    rebuild_dirty_daily_records(days)
 
-    report_groups = app.config.get('REPORT_GROUPS', {})
-    group_slugs = report_groups.keys()
-    group_slugs.append('all')
 
-    now = datetime.datetime.now()
+@celery.task(name="tasks.rebuild_daily_records", ignore_result=True)
+def rebuild_daily_records(days=365):
+    from kardboard.models import DailyRecord
+
+    logger = rebuild_daily_records.get_logger()
+
+    end_date = datetime.datetime.now()
+    start_date = end_date - relativedelta.relativedelta(days=days - 1)
+    written = DailyRecord.rebuild_range(start_date, end_date)
+    logger.info("Rebuilt %s DailyRecords over the last %s days" % (written, days))
+
+
+@celery.task(name="tasks.rebuild_dirty_daily_records", ignore_result=True)
+def rebuild_dirty_daily_records(days=365):
+    from kardboard.models import DailyRecord
+
+    logger = rebuild_dirty_daily_records.get_logger()
 
-    for i in xrange(0, days):
-        target_date = now - relativedelta.relativedelta(days=i)
-        target_date = make_end_date(date=target_date)
-        for slug in group_slugs:
-            update_daily_record.delay(target_date, slug)
+    written = DailyRecord.rebuild_dirty(days=days)
+    logger.info("Rebuilt %s out of date DailyRecords" % (written, ))
 
 
 @celery.task(name="tasks.queue_service_class_reports", ignore_result=True)
 def queue_service_class_reports():
     from kardboard.app import app
-    from kardboard.models import ServiceClassRecord, ServiceClassSnapshot
+    from kardboard.models import ServiceClassPartial, ServiceClassRecord, ServiceClassSnapshot
     from kardboard.util import now, month_ranges
 
     logger = queue_service_class_reports.get_logger()
@@ -180,14 +209,19 @@ def queue_service_class_reports():
     for slug in group_slugs:
         logger.info("ServiceClassSnapshot: %s" % slug)
         ServiceClassSnapshot.calculate(slug)
+        # Cards done in the last minutes of last month may have been
+        # missed by its last run; earlier months are recalculated once
+        # card changes mark them out of date
+        start = now()
+        ServiceClassPartial.calculate(start - relativedelta.relativedelta(months=1), slug)
+        ServiceClassPartial.calculate(start, slug)
         for x in [1, 3, 6, 9, 12]:
-            start = now()
             months_ranges = month_ranges(start, x)
             start_date = months_ranges[0][0]
             end_date = months_ranges[-1][1]
             try:
                 logger.info("ServiceClassRecord: %s %s - %s" % (slug, start_date, end_date))
-                ServiceClassRecord.calculate(
+                ServiceClassRecord.calculate_months(
                     start_date=start_date,
                     end_date=end_date,
                     group=slug,
@@ -199,16 +233,30 @@ def queue_service_class_reports():
 
 
 @celery.task(name="tasks.update_flow_reports", ignore_result=True)
-def update_flow_reports():
-    from kardboard.app import app
+def update_flow_reports(coalesced=False):
     from kardboard.models import FlowReport
 
-    report_groups = app.config.get('REPORT_GROUPS', {})
-    group_slugs = report_groups.keys()
-    group_slugs.append('all')
+    if coalesced:
+        coalesced_started(update_flow_reports)
+    # Every group's report from one pass over the cards
+    FlowReport.capture_all()
 
-    for slug in group_slugs:
-        FlowReport.capture(slug)
+
+@celery.task(name="tasks.compact_statelogs", ignore_result=True)
+def compact_statelogs(days=None):
+    from kardboard.app import app
+    from kardboard.models import CardHistory
+
+    logger = compact_statelogs.get_logger()
+    if days is None:
+        days = app.config.get('STATELOG_COMPACT_AFTER', None)
+    if days is None:
+        logger.debug("SKIPPING compact_statelogs because STATELOG_COMPACT_AFTER is None")
+        return None
+
+    done_before = datetime.datetime.now() - relativedelta.relativedelta(days=days)
+    moved = CardHistory.compact(done_before)
+    logger.info("Compacted %s StateLogs of cards done before %s" % (moved, done_before))
 
 
 def _get_person(name, cache):
@@ -236,9 +284,9 @@ def normalize_people(days=7):
 
     for k in kards:
         logger.debug("Considering %s" % k.key)
-        reporter = k.ticket_system_data.get('reporter', '')
-        devs = k.ticket_system_data.get('developers', [])
-        testers = k.ticket_system_data.get('qaers', [])
+        reporter = k.reporter
+        devs = k.developers
+        testers = k.qaers
 
         logger.debug("Reporter: %s / Devs: %s / Testers: %s" % (reporter, devs, testers))
 
@@ -261,7 +309,7 @@ def normalize_people(days=7):
 @celery.task(name="tasks.jira_add_team_cards", ignore_result=True)
 def jira_add_team_cards(team, filter_id):
     from kardboard.tickethelpers import JIRAHelper
-    from kardboard.models import States
+    from kardboard.models import config_snapshot
     from kardboard.app import app
 
     statsd_conn = app.statsd.get_client('tasks.jira_add_team_cards')
@@ -272,26 +320,44 @@ def jira_add_team_cards(team, filter_id):
 
     logger = jira_add_team_cards.get_logger()
     logger.info("JIRA BACKLOG SYNC %s: %s" % (team, filter_id))
-    states = States()
+    states = config_snapshot().states
     helper = JIRAHelper(app.config, None)
     issues = helper.service.getIssuesFromFilter(helper.auth, filter_id)
+    existing_keys = set(Kard.objects.filter(
+        key__in=[issue.key for issue in issues]).scalar('key'))
+
+    rows = []
     for issue in issues:
-        if Kard.objects.filter(key=issue.key):
+        if issue.key in existing_keys:
             # Card exists, pass
-            pass
-        else:
-            logger.info("JIRA BACKLOGGING %s: %s" % (team, issue.key))
-            defaults = {
-                'key': issue.key,
-                'title': issue.summary,
-                'backlog_date': datetime.datetime.now(),
-                'team': team,
-                'state': states.backlog,
-            }
-            c = Kard(**defaults)
-            c.ticket_system.actually_update(issue)
-            c.save()
-            counter += 1
+            continue
+
+        logger.info("JIRA BACKLOGGING %s: %s" % (team, issue.key))
+        defaults = {
+            'key': issue.key,
+            'title': issue.summary,
+            'backlog_date': datetime.datetime.now(),
+            'team': team,
+            'state': states.backlog,
+        }
+        c = Kard(**defaults)
+        c.ticket_system.actually_update(issue)
+        defaults.update({
+            'state': c.state,
+            'start_date': c.start_date,
+            'done_date': c.done_date,
+            'created_at': c.created_at,
+            '_type': c.ticket_system.type,
+            '_version': c.ticket_system.get_version(),
+            '_ticket_system_data': c._ticket_system_data,
+            '_ticket_system_updated_at': c._ticket_system_updated_at,
+        })
+        rows.append(defaults)
+
+    result = Kard.bulk_upsert(rows)
+    counter += result.inserted
+    for row, e in result.errors:
+        logger.error("JIRA BACKLOGGING %s: %s failed: %s" % (team, row['key'], e))
 
     total_timer.stop()
 
@@ -63,6 +63,9 @@ class KardboardTestCase(unittest2.TestCase):
             if 'system.' not in name]
         [db.drop_collection(name) for name in names]
 
+        from kardboard.models import Kard
+        Kard.reset_interval_index()
+
     def _get_target_url(self):
         raise NotImplementedError
 
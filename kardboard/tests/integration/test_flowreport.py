@@ -78,3 +78,57 @@ class FlowReportTestCase(KardboardTestCase):
             }
 
         assert expected == r.state_counts
+
+    def test_capture_all(self):
+        Report = self._get_target_class()
+        written = Report.capture_all()
+
+        self.assertEqual(3, written)
+        self.assertEqual(3, Report.objects.count())
+        r = Report.objects.get(group='team-2')
+        assert {
+            self.states.backlog: 1,
+            self.states.start: 1,
+            self.states.done: 2,
+        } == dict([(state, count) for state, count in r.state_counts.items()
+            if count])
+
+        # Captured again, the reports are updated rather than added to
+        Report.capture_all()
+        self.assertEqual(3, Report.objects.count())
+
+    def test_backfill(self):
+        from kardboard.util import now
+        from dateutil.relativedelta import relativedelta
+
+        Report = self._get_target_class()
+        Report.capture_all()
+
+        # Only the days without a report are filled in
+        written = Report.backfill(now() - relativedelta(days=2), now())
+        self.assertEqual(6, written)
+        self.assertEqual(9, Report.objects.count())
+
+        r = Report.objects.get(group='all', date=Report.objects.order_by('-date')[0].date)
+        assert 2 == r.state_counts[self.states.backlog]
+
+        written = Report.backfill(now() - relativedelta(days=2), now(), replace=True)
+        self.assertEqual(9, written)
+        self.assertEqual(9, Report.objects.count())
+
+        # The cards were all made today, so they weren't anywhere before
+        r = Report.objects.filter(group='all').order_by('date')[0]
+        assert 0 == sum(r.state_counts.values())
+
+    def test_flow_series(self):
+        from kardboard.models import FlowSeries
+        from kardboard.util import now
+
+        Report = self._get_target_class()
+        Report.capture_all()
+
+        states = [self.states.backlog, self.states.done]
+        dates, columns, updated_at = FlowSeries.slice('team-1',
+            now().replace(day=1), now(), states)
+        self.assertEqual(1, len(dates))
+        self.assertEqual({self.states.backlog: [1], self.states.done: [2]}, columns)
@@ -73,3 +73,42 @@ class NewKardTests(KardboardTestCase):
 
         expected = ['starbuck', 'chief', 'gaeda', 'apollo']
         assert k.worked_on == expected
+
+    def test_ticket_data_is_stored_apart(self):
+        from kardboard.models import KardTicketData
+
+        k = self.make_card()
+        k._ticket_system_data = {
+            'summary': 'Blue myself',
+            'reporter': 'tobias',
+            'developers': ['lindsay', ],
+            'status': {'name': 'Open', 'icon': 'http://example.com/open.gif'},
+        }
+        k.save()
+
+        raw = self._get_target_class().objects._collection.find_one({'_id': k.id})
+        assert '_ticket_system_data' not in raw
+        assert raw['reporter'] == 'tobias'
+        assert KardTicketData.load(k.id)['summary'] == 'Blue myself'
+
+        k = self._get_target_class().objects.get(id=k.id)
+        assert k.developers == ['lindsay', ]
+        assert k.ticket_status == 'Open'
+        assert k._ticket_data is None
+        assert k.ticket_system_data['summary'] == 'Blue myself'
+
+        k.delete()
+        assert KardTicketData.load(k.id) == {}
+
+    def test_reload_drops_cached_ticket_data(self):
+        from kardboard.models import KardTicketData
+
+        k = self.make_card()
+        k._ticket_system_data = {'summary': 'Blue myself'}
+        k.save()
+        assert k.ticket_system_data['summary'] == 'Blue myself'
+
+        KardTicketData.store(k.id, {'summary': 'Never nude'})
+        k.reload()
+        assert not k._ticket_data_changed
+        assert k.ticket_system_data['summary'] == 'Never nude'
@@ -2,6 +2,7 @@ import datetime
 import random
 from copy import deepcopy
 
+import mock
 import pytest
 from dateutil.relativedelta import relativedelta
 
@@ -242,12 +243,235 @@ class DailyRecordTests(KardboardTestCase):
         klass = self._get_target_class()
         from kardboard.tasks import queue_daily_record_updates
 
+        # Nothing's changed, so just today's record for each group
         queue_daily_record_updates.apply(args=[7, ], throw=True)
-        self.assertEqual(21, klass.objects.count())
+        self.assertEqual(3, klass.objects.count())
 
         # update_daily_records should be idempotent
         queue_daily_record_updates.apply(args=[7, ], throw=True)
-        self.assertEqual(21, klass.objects.count())
+        self.assertEqual(3, klass.objects.count())
+
+        # A card backlogged 2 days ago puts its groups' records out of date
+        self.make_card(team='Team 1',
+            backlog_date=datetime.datetime.now() - relativedelta(days=2)).save()
+        queue_daily_record_updates.apply(args=[7, ], throw=True)
+        self.assertEqual(3 + 2 + 2, klass.objects.count())
+
+    def test_rebuild_dirty(self):
+        from kardboard.models import DailyRecordLedger
+
+        klass = self._get_target_class()
+        today = datetime.datetime.now()
+        card = self.make_card(team='Team 2', backlog_date=today)
+        card.save()
+        DailyRecordLedger.claim()
+
+        card.start_date = today - relativedelta(days=4)
+        card.save()
+        written = klass.rebuild_dirty(today)
+
+        # 5 days for 'all' and 'team-2', today for 'team-1'
+        self.assertEqual(11, written)
+        self.assertEqual({}, DailyRecordLedger.claim())
+
+    def test_ledger_mark_races_another_mark(self):
+        from pymongo.collection import Collection
+        from kardboard.models import DailyRecordLedger
+
+        day = lambda d: datetime.datetime(2013, 6, d)
+        insert = Collection.insert
+        raced = []
+
+        def racing_insert(collection, doc, **kwargs):
+            # Another save marks a later day between the update and insert
+            if not raced:
+                raced.append(True)
+                insert(collection, {'_id': 'all', 'since': day(9)}, safe=True)
+            return insert(collection, doc, **kwargs)
+
+        with mock.patch.object(Collection, 'insert', racing_insert):
+            DailyRecordLedger.mark({'all': day(3)})
+        DailyRecordLedger.mark({'all': day(5)})
+
+        self.assertEqual({'all': day(3)}, DailyRecordLedger.claim())
+
+    def test_rebuild_range(self):
+        from kardboard.util import make_end_date
+
+        self._set_up_days()
+        klass = self._get_target_class()
+
+        written = klass.rebuild_range(self.date, self.date3, groups=['all'])
+        self.assertEqual(22, written)
+        self.assertEqual(22, klass.objects.count())
+
+        # Replaces rather than adds to what's there
+        klass.rebuild_range(self.date, self.date3, groups=['all'])
+        self.assertEqual(22, klass.objects.count())
+
+        fields = ('backlog', 'in_progress', 'done', 'completed',
+            'moving_cycle_time', 'moving_lead_time')
+        for date in self.dates:
+            date = make_end_date(date=date)
+            rebuilt = klass.objects.get(date=date)
+            rebuilt = [getattr(rebuilt, f) for f in fields]
+
+            klass.calculate(date)
+            expected = klass.objects.get(date=date)
+            expected = [getattr(expected, f) for f in fields]
+            self.assertEqual(expected, rebuilt)
+
+
+class TaskLockTests(KardboardTestCase):
+    def _get_target_class(self):
+        from kardboard.models import TaskLock
+        return TaskLock
+
+    def tearDown(self):
+        self._get_target_class().objects.delete()
+
+    def test_acquire(self):
+        TaskLock = self._get_target_class()
+        assert TaskLock.acquire('tasks.update_flow_reports:()', 60)
+        assert not TaskLock.acquire('tasks.update_flow_reports:()', 60)
+
+        TaskLock.release('tasks.update_flow_reports:()')
+        assert TaskLock.acquire('tasks.update_flow_reports:()', 60)
+
+    def test_acquire_expired(self):
+        TaskLock = self._get_target_class()
+        assert TaskLock.acquire('tasks.update_flow_reports:()', -1)
+        assert TaskLock.acquire('tasks.update_flow_reports:()', 60)
+
+    def test_delay_coalesced(self):
+        from kardboard.tasks import delay_coalesced, update_flow_reports
+
+        with mock.patch.object(update_flow_reports, 'apply_async') as apply_async:
+            delay_coalesced(update_flow_reports)
+            delay_coalesced(update_flow_reports)
+        self.assertEqual(1, apply_async.call_count)
+
+    def test_scheduled_run_keeps_lock(self):
+        from kardboard.tasks import delay_coalesced, update_flow_reports
+
+        with mock.patch.object(update_flow_reports, 'apply_async') as apply_async:
+            delay_coalesced(update_flow_reports)
+            with mock.patch('kardboard.models.FlowReport.capture_all'):
+                update_flow_reports()
+            delay_coalesced(update_flow_reports)
+            self.assertEqual(1, apply_async.call_count)
+
+            with mock.patch('kardboard.models.FlowReport.capture_all'):
+                update_flow_reports(**apply_async.call_args[1]['kwargs'])
+            delay_coalesced(update_flow_reports)
+        self.assertEqual(2, apply_async.call_count)
+
+
+class CycleTimeSketchTests(KardboardTestCase):
+    def _get_target_class(self):
+        from kardboard.models import CycleTimeSketch
+        return CycleTimeSketch
+
+    def _make_done(self, start_date, done_date, **kwargs):
+        card = self.make_card(
+            backlog_date=start_date,
+            start_date=start_date,
+            done_date=done_date,
+            team='Team 1',
+            **kwargs
+        )
+        card.save()
+        return card
+
+    def test_kept_up_as_cards_change(self):
+        Sketch = self._get_target_class()
+        june = lambda d: datetime.datetime(2013, 6, d)
+        card = self._make_done(june(3), june(6))
+        self._make_done(june(3), june(13))
+        self.assertEqual({3: 1, 10: 1},
+            Sketch.histogram('Team 1', june(2), june(15)))
+
+        card.done_date = june(4)
+        card.save()
+        self.assertEqual({1: 1, 10: 1},
+            Sketch.histogram('Team 1', june(2), june(15)))
+
+        card.delete()
+        self.assertEqual({10: 1},
+            Sketch.histogram('Team 1', june(2), june(15)))
+
+    def test_histogram_matches_the_cards(self):
+        Sketch = self._get_target_class()
+        june = lambda d: datetime.datetime(2013, 6, d)
+        for start, done in ((1, 4), (2, 9), (5, 12), (10, 20), (21, 28), (3, 29)):
+            self._make_done(june(start), june(done))
+        self._make_done(june(1), june(5), _service_class='Urgent')
+
+        # Part weeks at both ends, and whole weeks between
+        cards = self._get_card_class().objects.filter(
+            team='Team 1',
+            done_date__gte=june(5),
+            done_date__lte=datetime.datetime(2013, 6, 28, 23, 59, 59),
+            _service_class__nin=['Urgent'],
+        )
+        expected = {}
+        for card in cards:
+            expected[card._cycle_time] = expected.get(card._cycle_time, 0) + 1
+
+        self.assertEqual(expected,
+            Sketch.histogram('Team 1', june(5), june(28), ['Urgent']))
+        self.assertEqual({.5: 7, .8: 10, .95: 10},
+            Sketch.percentiles('Team 1', june(5), june(28), exclude_classes=['Urgent']))
+
+    def test_rebuild(self):
+        Sketch = self._get_target_class()
+        june = lambda d: datetime.datetime(2013, 6, d)
+        self._make_done(june(3), june(6))
+        self._make_done(june(3), june(13))
+        before = Sketch.histogram('Team 1', june(1), june(30))
+
+        Sketch.objects.delete()
+        self.assertEqual(2, Sketch.rebuild())
+        self.assertEqual(before, Sketch.histogram('Team 1', june(1), june(30)))
+
+
+class KardIntervalIndexTests(KardboardTestCase):
+    def _get_target_class(self):
+        return self._get_card_class()
+
+    def _age_index(self, klass):
+        klass._interval_index_refreshed_at -= datetime.timedelta(
+            seconds=self.config.get('CARD_INDEX_MAX_AGE', 60 * 5) + 1)
+
+    def test_refresh_reads_only_changed_cards(self):
+        klass = self._get_target_class()
+        self.make_card(key='IDX-1').save()
+        index = klass.interval_index()
+        self.assertEqual(1, len(index))
+
+        # Written by another process, so this one's index doesn't know
+        other = self.make_card(key='IDX-2')
+        other.save()
+        index.remove(other.id)
+        self._age_index(klass)
+
+        with mock.patch.object(klass, '_load_interval_index') as load:
+            refreshed = klass.interval_index()
+        self.assertFalse(load.called)
+        self.assert_(refreshed is index)
+        self.assert_(other.id in refreshed)
+
+    def test_refresh_rescans_after_deletes(self):
+        klass = self._get_target_class()
+        card = self.make_card(key='IDX-1')
+        card.save()
+        index = klass.interval_index()
+
+        klass.objects._collection.remove({'_id': card.id})
+        self._age_index(klass)
+
+        self.assert_(card.id not in klass.interval_index())
+        self.assert_(klass.interval_index() is not index)
 
 
 class KardClassTests(KardboardTestCase):
@@ -347,6 +571,31 @@ class KardTests(KardTestCase):
         k.save()
         self.assertEqual("Done", k.old_state)
 
+    def test_old_state_of_loaded_card(self):
+        k = self._make_one(state="Todo")
+        k.save()
+
+        loaded = self._get_target_class().objects.get(key=k.key)
+        self.assertEqual("Todo", loaded.persisted_value('state'))
+
+        loaded.state = "Doing"
+        with mock.patch.object(self._get_target_class(), 'objects') as objects:
+            self.assertEqual("Todo", loaded.old_state)
+            self.assertEqual(True, loaded.state_changing)
+            self.assertEqual(False, objects.only.called)
+
+    def test_field_changing(self):
+        k = self._make_one(state="Todo")
+        self.assertEqual(True, k.field_changing('start_date'))
+        k.save()
+        self.assertEqual(False, k.field_changing('start_date'))
+
+        k.start_date = datetime.datetime(2011, 5, 9)
+        self.assertEqual(True, k.field_changing('start_date'))
+        k.save()
+        self.assertEqual(False, k.field_changing('start_date'))
+        self.assertEqual(k.start_date, k.persisted_value('start_date'))
+
     def test_created_at(self):
         now = datetime.datetime.now()
         k = self._make_one()
@@ -482,6 +731,34 @@ class KardTests(KardTestCase):
             year=2011, month=6, day=12)
         self.assertEqual(expected, actual)
 
+    def test_moving_stats(self):
+        klass = self._get_target_class()
+        date = datetime.datetime(year=2011, month=6, day=12)
+
+        stats = klass.objects.moving_stats(date)
+        expected = (
+            int(round(klass.objects.done().average('_cycle_time'))),
+            int(round(klass.objects.done().average('_lead_time'))),
+        )
+        self.assertEqual(expected, (stats.cycle_time, stats.lead_time))
+        # Both done cards' cycle times, 34 and 6 days, are in the window
+        self.assertEqual(20, stats.std_dev)
+
+    def test_views(self):
+        klass = self._get_target_class()
+        cards = klass.objects.done().order_by('done_date')
+
+        views = cards.views()
+        self.assertEqual([c.key for c in cards], [v.key for v in views])
+        for card, view in zip(cards, views):
+            self.assertEqual(card.id, view.id)
+            self.assertEqual(card.cycle_time, view.cycle_time)
+            self.assertEqual(card.lead_time, view.lead_time)
+            self.assertEqual(card.service_class, view.service_class)
+            self.assertEqual(card.cycle_in_goal, view.cycle_in_goal)
+
+        self.assertEqual(1, len(cards.limit(1).views()))
+
     def test_done_in_week(self):
         klass = self._get_target_class()
         klass.objects.all().delete()
@@ -559,6 +836,111 @@ class KardTests(KardTestCase):
         self.assertEqual("CMSCMH-1", k.key)
 
 
+class KardBulkUpsertTests(KardTestCase):
+    def _rows(self):
+        return [
+            {
+                'key': 'bulk-1',
+                'title': 'Banana stand',
+                'backlog_date': datetime.datetime(2011, 5, 2),
+                'state': 'Todo',
+            },
+            {
+                'key': 'BULK-2',
+                'title': 'Bluth Company',
+                'backlog_date': datetime.datetime(2011, 5, 2),
+                'start_date': datetime.datetime(2011, 5, 9),
+                'done_date': datetime.datetime(2011, 6, 12),
+                'state': 'Doing',
+            },
+            {
+                'key': self.wip_card.key,
+                'state': 'Done',
+                'done_date': datetime.datetime(2011, 6, 12),
+            },
+        ]
+
+    def test_bulk_upsert(self):
+        from kardboard.models.statelog import StateLog
+        klass = self._get_target_class()
+
+        result = klass.bulk_upsert(self._rows(), chunk_size=2)
+        self.assertEqual((2, 1, []), result)
+
+        done = klass.objects.get(key='BULK-2')
+        self.assertEqual('Done', done.state)
+        self.assertEqual(done.cycle_time, done._cycle_time)
+        self.assertEqual(done.lead_time, done._lead_time)
+        self.assertEqual(self.config['DEFAULT_TYPE'], done._type)
+
+        wip_card = klass.objects.get(key=self.wip_card.key)
+        self.assertEqual(34, wip_card._cycle_time)
+        self.assertEqual(1, StateLog.objects.filter(card=wip_card,
+            exited__exists=False).count())
+        self.assertEqual(1, StateLog.objects.filter(card=done).count())
+
+    def test_bulk_upsert_is_idempotent(self):
+        klass = self._get_target_class()
+        klass.bulk_upsert(self._rows())
+        count = klass.objects.count()
+
+        result = klass.bulk_upsert(self._rows())
+        self.assertEqual((0, 0, []), result)
+        self.assertEqual(count, klass.objects.count())
+
+    def test_bulk_upsert_skips_invalid_rows(self):
+        klass = self._get_target_class()
+        rows = [{'key': 'BULK-3', 'title': 'No backlog date'}]
+
+        result = klass.bulk_upsert(rows)
+        self.assertEqual(0, result.inserted)
+        self.assertEqual(rows[0], result.errors[0][0])
+        self.assertEqual(0, klass.objects.filter(key='BULK-3').count())
+
+    def test_bulk_upsert_keeps_later_valid_row(self):
+        klass = self._get_target_class()
+        rows = [
+            {'key': 'BULK-3', 'title': 'No backlog date'},
+            {'key': 'BULK-3', 'title': 'Backlogged',
+                'backlog_date': datetime.datetime(2011, 5, 2)},
+        ]
+
+        result = klass.bulk_upsert(rows)
+        self.assertEqual(1, result.inserted)
+        self.assertEqual([rows[0]], [row for row, e in result.errors])
+        self.assertEqual('Backlogged', klass.objects.get(key='BULK-3').title)
+
+    def test_bulk_upsert_reports_rows_without_keys(self):
+        klass = self._get_target_class()
+        rows = [{'title': 'No key'}] + self._rows()
+
+        result = klass.bulk_upsert(rows)
+        self.assertEqual((2, 1), (result.inserted, result.updated))
+        self.assertEqual([rows[0]], [row for row, e in result.errors])
+
+    def test_bulk_upsert_updates_keys_stored_meanwhile(self):
+        from pymongo.collection import Collection
+
+        klass = self._get_target_class()
+        rival = self._make_one(key='BULK-2', title='Rival')
+        original = Collection.insert
+        raced = []
+
+        def insert(collection, docs, *args, **kwargs):
+            # Another import stores one of the new keys first
+            if not raced:
+                raced.append(rival)
+                rival.save()
+            return original(collection, docs, *args, **kwargs)
+
+        with mock.patch.object(Collection, 'insert', insert):
+            result = klass.bulk_upsert(self._rows())
+
+        self.assertEqual((1, 2, []), result)
+        self.assertEqual(1, klass.objects.filter(key='BULK-2').count())
+        self.assertEqual('Bluth Company', klass.objects.get(key='BULK-2').title)
+
+
 @pytest.mark.warningtest
 class KardWarningTests(KardTestCase):
     def setUp(self):
@@ -267,3 +267,48 @@ class ServiceClassRecordTests(ServiceClassTests):
         actual = r.data
 
         assert actual['Normal']['wip'] == 1
+
+    def test_calculate_months(self):
+        self._fixtures_for_test_calculate()
+        k = self.make_card(
+            _service_class='Speedy',
+            backlog_date=datetime(2013, 1, 1),
+            start_date=datetime(2013, 2, 3),
+            done_date=datetime(2013, 2, 4),
+        )
+        k.save()
+
+        Record = self._get_target_class()
+        expected = Record.calculate(
+            datetime(2013, 1, 1), datetime(2013, 3, 31)).data
+        actual = Record.calculate_months(
+            datetime(2013, 1, 15), datetime(2013, 3, 15)).data
+
+        self.assertEqual(expected, actual)
+        assert 6 == actual['Speedy']['wip']
+
+    def test_calculate_months_recalculates_changed_months(self):
+        from kardboard.models import ServiceClassPartial
+
+        self._fixtures_for_test_calculate()
+        Record = self._get_target_class()
+        Record.calculate_months(datetime(2013, 1, 1), datetime(2013, 2, 28))
+        assert 2 == ServiceClassPartial.objects.count()
+
+        # Cards done in a month since its partial was calculated
+        self._fixtures_for_test_calculate()
+        r = Record.calculate_months(datetime(2013, 1, 1), datetime(2013, 2, 28))
+        assert 50 == sum([v['wip'] for v in r.data.values()])
+
+        # A done date moved back from one month into another
+        k = self._get_card_class().objects.filter(done_date=datetime(2013, 1, 4))[0]
+        k.done_date = datetime(2013, 2, 4)
+        k.save()
+        january = Record.calculate_months(datetime(2013, 1, 1), datetime(2013, 1, 31))
+        february = Record.calculate_months(datetime(2013, 2, 1), datetime(2013, 2, 28))
+        assert 49 == sum([v['wip'] for v in january.data.values()])
+        assert 1 == sum([v['wip'] for v in february.data.values()])
+
+        k.delete()
+        february = Record.calculate_months(datetime(2013, 2, 1), datetime(2013, 2, 28))
+        assert 0 == sum([v['wip'] for v in february.data.values()])
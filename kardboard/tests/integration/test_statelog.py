@@ -123,6 +123,119 @@ class StatelogKardTests(StatelogTests):
         self.assertEqualDateTimes(sln.entered, mocked_now.return_value)
         self.assertEqual(0, sln.duration)
 
+    def test_latest(self):
+        StateLog = self._get_target_class()
+        card = self.cards[0]
+        for state in (self.states[1], self.states[0], self.states[1]):
+            card.state = state
+            card.save()
+
+        latest = StateLog.latest([(card.id, state) for state in self.states])
+
+        self.assertEqual(2, len(latest))
+        expected = StateLog.objects.filter(
+            card=card, state=self.states[1]).order_by('-entered')[0]
+        self.assertEqual(expected.id, latest[(card.id, self.states[1])].id)
+
+    @mock.patch('kardboard.models.statelog.now')
+    def test_state_totals(self, mocked_now):
+        from kardboard.models import CardStateTotals
+
+        mocked_now.return_value = datetime.now() - relativedelta(days=10)
+        card = self.make_card(state=self.states[0])
+        card.save()
+
+        mocked_now.return_value = datetime.now() - relativedelta(days=8)
+        card.state = self.states[1]
+        card.save()
+
+        expected = {self.states[0]: 48}
+        totals = CardStateTotals.for_cards([card.id], include_open=False)
+        self.assertEqual(expected, totals[card.id])
+
+        totals = CardStateTotals.for_cards([card.id])
+        self.assertEqual(8 * 24, totals[card.id][self.states[1]])
+
+        CardStateTotals.objects.delete()
+        self.assertEqual(1, CardStateTotals.rebuild())
+        totals = CardStateTotals.for_cards([card.id], include_open=False)
+        self.assertEqual(expected, totals[card.id])
+
+    def test_transition_counts(self):
+        from kardboard.models import StateTransitionCount
+        from kardboard.util import make_start_date
+
+        card = self.cards[0]
+        card.state = self.states[1]
+        card.save()
+
+        today = make_start_date(date=datetime.now())
+        counts = StateTransitionCount.counts(self.states[1], today, datetime.now())
+        self.assertEqual(1, counts[today]['entered'])
+        counts = StateTransitionCount.counts(self.states[1], today, datetime.now(),
+            teams=['Nobody'])
+        self.assertEqual({}, counts)
+
+        StateTransitionCount.objects.delete()
+        StateTransitionCount.rebuild()
+        counts = StateTransitionCount.counts(self.states[1], today, datetime.now())
+        self.assertEqual(1, counts[today]['entered'])
+
+    def test_resave_without_moving_skips_counts(self):
+        from kardboard.models import StateTransitionCount
+
+        card = self.cards[0]
+        with mock.patch.object(StateTransitionCount, 'add') as add:
+            card.save()
+        self.assertFalse(add.called)
+
+    def test_compact(self):
+        from kardboard.models import CardHistory
+
+        StateLog = self._get_target_class()
+        card = self.cards[0]
+        card.state = self.states[1]
+        card.save()
+        card.done_date = datetime.now() - relativedelta(days=5)
+        card.save()
+        logged = StateLog.objects.filter(card=card).count()
+
+        moved = CardHistory.compact(datetime.now())
+
+        self.assertEqual(logged - 1, moved)
+        self.assertEqual(1, StateLog.objects.filter(card=card).count())
+        self.assertEqual(logged, len(StateLog.for_card(card)))
+        self.assertEqual(0, CardHistory.compact(datetime.now()))
+
+        latest = StateLog.latest([(card.id, self.states[1])])
+        self.assertEqual(self.states[1], latest[(card.id, self.states[1])].state)
+
+    def test_spans(self):
+        from bson import ObjectId
+        from kardboard.models import CardHistory
+
+        day = lambda d: datetime(2013, 6, d)
+        first, second = ObjectId(), ObjectId()
+        CardHistory.objects._collection.insert([
+            {'_id': first, 'updated_at': day(30), 'logs': [
+                ['Todo', day(1), day(3), None],
+                ['Doing', day(3), day(12), None],
+                ['Done', day(12), day(13), None]]},
+            {'_id': second, 'updated_at': day(30), 'logs': [
+                ['Todo', day(2), day(4), None],
+                ['Doing', day(4), day(5), None]]},
+        ])
+        self.assertEqual(2, CardHistory.fill_bounds())
+        self.assertEqual(0, CardHistory.fill_bounds())
+
+        spans = list(CardHistory.spans(day(3), day(10)))
+
+        self.assertEqual([
+            (day(2), second, 'Todo', day(4)),
+            (day(3), first, 'Doing', day(12)),
+            (day(4), second, 'Doing', day(5)),
+        ], spans)
+
     @mock.patch('kardboard.models.statelog.now')
     def test_service_class_changes_sets_exited_at(self, mocked_now):
         StateLog = self._get_target_class()
@@ -275,3 +388,63 @@ class StatelogKardTests(StatelogTests):
         card.save()
         self.assertExitedStateOnceAt(card, DEPLOYING, mocked_now.return_value)
         self.assertEnteredStateOnceAt(card, DONE, mocked_now.return_value)
+
+
+class StatelogJournalTests(KardboardTestCase):
+    def setUp(self):
+        super(StatelogJournalTests, self).setUp()
+        from kardboard.models.states import States
+        self.states = States()
+        self.cards = [self.make_card() for i in xrange(0, 2)]
+        [card.save() for card in self.cards]
+        self.config['STATELOG_JOURNAL'] = True
+
+    def tearDown(self):
+        self.config['STATELOG_JOURNAL'] = False
+        self._get_target_class().objects.all().delete()
+
+    def _get_target_class(self):
+        from kardboard.models.statelog import StateLog
+        return StateLog
+
+    @mock.patch('kardboard.models.statelog.now')
+    def test_changes_are_written_on_flush(self, mocked_now):
+        StateLog = self._get_target_class()
+
+        mocked_now.return_value = datetime.now() - relativedelta(days=10)
+        card = self.make_card(state=self.states[0])
+        card.save()
+        created = mocked_now.return_value
+
+        mocked_now.return_value = datetime.now() - relativedelta(days=8)
+        card.state = self.states[1]
+        card.save()
+        moved = mocked_now.return_value
+
+        self.assertEqual(0, StateLog.objects.filter(card=card).count())
+        self.assertEqual(2, StateLog.flush_journal())
+
+        slo = StateLog.objects.get(card=card, state=self.states[0])
+        self.assertEqualDateTimes(slo.entered, created)
+        self.assertEqualDateTimes(slo.exited, moved)
+        self.assertEqual(48, slo.duration)
+
+        sln = StateLog.objects.get(card=card, state=self.states[1])
+        self.assertEqualDateTimes(sln.entered, moved)
+        self.assertEqual(None, sln.exited)
+
+    def test_flush_closes_logs_already_written(self):
+        StateLog = self._get_target_class()
+        card = self.cards[0]
+        card.state = self.states[1]
+        card.save()
+        StateLog.flush_journal()
+
+        card.state = self.states[2]
+        card.save()
+        StateLog.flush_journal()
+
+        self.assertEqual(1, StateLog.objects.filter(
+            card=card, exited__exists=False).count())
+        sl = StateLog.objects.get(card=card, state=self.states[1])
+        self.assert_(sl.exited is not None)
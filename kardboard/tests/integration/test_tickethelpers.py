@@ -62,6 +62,16 @@ class JIRAHelperTests(KardboardTestCase):
         self.assert_(len(k.ticket_system_data['developers']) > 0)
         self.assert_(len(k.ticket_system_data['testers']) > 0)
 
+    def test_cards_share_a_helper(self):
+        other = self.make_card()
+        helper = self.card.ticket_system
+        other_helper = other.ticket_system
+
+        self.assert_(helper.card is self.card)
+        self.assert_(other_helper.card is other)
+        self.assert_(helper.connection is other_helper.connection)
+        self.assert_(helper.issues is not other_helper.issues)
+
     def test_get_title(self):
         h = self._make_one()
         expected = self.ticket.summary
@@ -1,6 +1,8 @@
 """
 Tests for services/boards
 """
+import datetime
+
 import unittest2
 import mock
 
@@ -41,13 +43,15 @@ class TeamBoardTests(unittest2.TestCase):
         return self._get_target_class()(*args, **kwargs)
 
     def _make_card(self, **kwargs):
+        from kardboard.util import now
         mock_card = mock.Mock()
 
         if 'current_cycle_time' in kwargs.keys():
-            mock_card.current_cycle_time.return_value = \
-                kwargs['current_cycle_time']
-            del kwargs['current_cycle_time']
+            kwargs['start_date'] = now() - datetime.timedelta(
+                days=kwargs.pop('current_cycle_time'))
 
+        for key in ('backlog_date', 'start_date', 'done_date', 'cycle_goal'):
+            kwargs.setdefault(key, None)
         for key, value in kwargs.items():
             setattr(mock_card, key, value)
         return mock_card
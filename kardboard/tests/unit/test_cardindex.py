@@ -0,0 +1,59 @@
+"""
+Tests for services/cardindex
+"""
+import datetime
+
+import unittest2
+
+
+class CardIntervalIndexTests(unittest2.TestCase):
+    def setUp(self):
+        self.day = lambda d: datetime.datetime(2013, 6, d)
+        self.index = self._make_one()
+        # Backlogged on the 1st, started on the 5th, done on the 10th
+        self.index.add(1, self.day(1), self.day(5), self.day(10), 'Team 1', 'Card')
+        # Backlogged on the 2nd, started on the 8th
+        self.index.add(2, self.day(2), self.day(8), None, 'Team 1', 'Card')
+        # Backlogged on the 3rd
+        self.index.add(3, self.day(3), None, None, 'Team 2', 'Defect')
+
+    def _make_one(self):
+        from kardboard.services.cardindex import CardIntervalIndex
+        return CardIntervalIndex()
+
+    def test_backlogged(self):
+        assert self.index.backlogged(self.day(1)) == 1
+        assert self.index.backlogged(self.day(4)) == 3
+        assert self.index.backlogged(self.day(5)) == 2
+        assert self.index.backlogged(self.day(12)) == 1
+
+    def test_in_progress(self):
+        assert self.index.in_progress(self.day(4)) == 0
+        assert self.index.in_progress(self.day(8)) == 2
+        assert self.index.in_progress(self.day(10)) == 1
+
+    def test_done_and_completed(self):
+        assert self.index.done(self.day(9)) == 0
+        assert self.index.done(self.day(12)) == 1
+        assert self.index.completed(self.day(10)) == 1
+        assert self.index.completed(self.day(12)) == 0
+
+    def test_filters(self):
+        assert self.index.backlogged(self.day(4), teams=('Team 1', )) == 2
+        assert self.index.backlogged(self.day(4), types=('Defect', )) == 1
+        assert self.index.backlogged(
+            self.day(4), teams=('Team 1', ), types=('Defect', )) == 0
+
+    def test_started_before_backlogged(self):
+        self.index.add(4, self.day(6), self.day(4), None, 'Team 1', 'Card')
+        assert self.index.backlogged(self.day(7)) == 2
+        assert self.index.in_progress(self.day(5)) == 2
+
+    def test_update_and_remove(self):
+        self.index.add(2, self.day(2), self.day(8), self.day(9), 'Team 1', 'Card')
+        assert len(self.index) == 3
+        assert self.index.done(self.day(12)) == 2
+
+        self.index.remove(3)
+        assert 3 not in self.index
+        assert self.index.backlogged(self.day(4)) == 2
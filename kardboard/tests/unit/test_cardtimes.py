@@ -0,0 +1,61 @@
+"""
+Tests for services/cardtimes
+"""
+import datetime
+
+import unittest2
+import mock
+
+
+class CardTimesTests(unittest2.TestCase):
+    def setUp(self):
+        self.today = datetime.datetime(2013, 6, 20, 12)
+        self.day = lambda d: datetime.datetime(2013, 6, d, 12)
+
+    def _make_card(self, backlog_date, start_date=None, done_date=None,
+            cycle_goal=None):
+        card = mock.Mock()
+        card.backlog_date = backlog_date
+        card.start_date = start_date
+        card.done_date = done_date
+        card.cycle_goal = cycle_goal
+        return card
+
+    def _make_one(self, cards):
+        from kardboard.services.cardtimes import CardTimes
+        return CardTimes(cards, today=self.today)
+
+    def test_times(self):
+        cards = [
+            self._make_card(self.day(1)),
+            self._make_card(self.day(1), self.day(10)),
+            self._make_card(self.day(1), self.day(10), self.day(15)),
+        ]
+        times = self._make_one(cards)
+
+        assert [None, 10, 5] == times.cycle_times
+        assert [19, 19, 14] == times.lead_times
+        assert [None, 10, None] == times.ages
+
+    def test_goal_statuses(self):
+        cards = [
+            self._make_card(self.day(1), self.day(19), cycle_goal=(2, 5)),
+            self._make_card(self.day(1), self.day(17), cycle_goal=(2, 5)),
+            self._make_card(self.day(1), self.day(14), cycle_goal=(2, 5)),
+            self._make_card(self.day(1), self.day(8), cycle_goal=(2, 5)),
+            self._make_card(self.day(1), self.day(8)),
+        ]
+        times = self._make_one(cards)
+
+        assert [-1, 0, 1, 2, 0] == times.goal_statuses
+
+    def test_ordered(self):
+        cards = [
+            self._make_card(self.day(1), self.day(15)),
+            self._make_card(self.day(1), self.day(5)),
+            self._make_card(self.day(1), self.day(10)),
+        ]
+        times = self._make_one(cards)
+
+        ordered = times.ordered(times.cycle_times, reverse=True)
+        assert [cards[1], cards[2], cards[0]] == ordered
@@ -0,0 +1,61 @@
+"""
+Tests for models/configsnapshot
+"""
+
+import unittest2
+
+
+class ConfigSnapshotTests(unittest2.TestCase):
+    def setUp(self):
+        super(ConfigSnapshotTests, self).setUp()
+        self.config = {
+            'CARD_STATES': ('Backlog', 'In Progress', 'Done'),
+            'SERVICE_CLASSES': {
+                'default': {'name': 'Normal', 'upper': 10},
+                'Expedite': {'name': 'Expedite', 'upper': 2, 'wip': .05},
+            },
+            'REPORT_GROUPS': {
+                'dev': (('Team 1', 'Team 2'), 'Dev'),
+                'all-teams': ((), 'All'),
+            },
+        }
+
+    def _get_target_class(self):
+        from kardboard.models import ConfigSnapshot
+        return ConfigSnapshot
+
+    def _make_one(self):
+        return self._get_target_class()(self.config)
+
+    def test_states(self):
+        snapshot = self._make_one()
+        assert ['Backlog', 'In Progress', 'Done'] == list(snapshot.states)
+        assert ['In Progress'] == snapshot.states.in_progress
+
+    def test_service_class(self):
+        snapshot = self._make_one()
+        expected = {'name': 'Expedite', 'upper': 2, 'lower': '', 'wip': .05}
+        assert expected == snapshot.service_class('Expedite')
+
+    def test_service_class_default(self):
+        snapshot = self._make_one()
+        assert 'Normal' == snapshot.service_class(None)['name']
+        assert '' == snapshot.service_class('Unknown')['name']
+
+    def test_report_group_teams(self):
+        snapshot = self._make_one()
+        assert set(['Team 1', 'Team 2']) == snapshot.report_group_teams('dev')
+        assert snapshot.report_group_teams('all-teams') is None
+        assert snapshot.report_group_teams('missing') is None
+
+    def test_report_groups_for(self):
+        snapshot = self._make_one()
+        assert ['all', 'all-teams', 'dev'] == sorted(snapshot.report_groups_for(['Team 2']))
+        assert ['all', 'all-teams'] == sorted(snapshot.report_groups_for(['Team 3']))
+
+    def test_is_current(self):
+        snapshot = self._make_one()
+        assert snapshot.is_current(self.config)
+
+        self.config['CARD_STATES'] = ('Backlog', 'Done')
+        assert not snapshot.is_current(self.config)
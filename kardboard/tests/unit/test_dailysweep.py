@@ -0,0 +1,89 @@
+"""
+Tests for services/dailysweep
+"""
+import datetime
+
+import unittest2
+
+
+class WindowStatsTests(unittest2.TestCase):
+    def _call_fut(self, *args):
+        from kardboard.services.dailysweep import window_stats
+        return window_stats(*args)
+
+    def test_window_stats(self):
+        stats = self._call_fut([2, 4, 9, None], [5, 7])
+        self.assertEqual((5, 6, 4, 2), tuple(stats))
+
+    def test_empty_window(self):
+        stats = self._call_fut([], [])
+        self.assertEqual((0, 0, 0, 0), tuple(stats))
+
+
+class SweepDaysTests(unittest2.TestCase):
+    def _call_fut(self, *args, **kwargs):
+        from kardboard.services.dailysweep import sweep_days
+        return list(sweep_days(*args, **kwargs))
+
+    def _day(self, day, month=6):
+        return datetime.datetime(2013, month, day, 23, 59, 59)
+
+    def test_counts(self):
+        cards = [
+            (self._day(1), self._day(5), self._day(10), 5, 9),
+            (self._day(2), self._day(8), None, None, None),
+            (self._day(3), None, None, None, None),
+        ]
+        days = [self._day(d) for d in (1, 4, 8, 10, 12)]
+        summaries = self._call_fut(cards, days)
+
+        expected = [
+            (1, 0, 0, 0),
+            (3, 0, 0, 0),
+            (1, 2, 0, 0),
+            (1, 1, 1, 1),
+            (1, 1, 1, 0),
+        ]
+        actual = [(s.backlog, s.in_progress, s.done, s.completed)
+            for s in summaries]
+        self.assertEqual(expected, actual)
+
+    def test_moving_window(self):
+        cards = [
+            (self._day(1, 5), self._day(2, 5), self._day(3, 5), 1, 2),
+            (self._day(1, 5), self._day(2, 5), self._day(20, 5), 18, 19),
+            (self._day(1, 5), self._day(2, 5), self._day(10), 39, 40),
+        ]
+        days = [self._day(d, 5) for d in (2, 3, 20)] + [self._day(10)]
+        summaries = self._call_fut(cards, days, weeks=4)
+
+        actual = [s.moving.cycle_time for s in summaries]
+        self.assertEqual([0, 1, 10, 29], actual)
+
+
+class ChangedSinceTests(unittest2.TestCase):
+    def _call_fut(self, *args):
+        from kardboard.services.dailysweep import changed_since
+        return changed_since(*args)
+
+    def _day(self, day):
+        return datetime.datetime(2013, 6, day)
+
+    def test_unchanged(self):
+        card = (self._day(1), self._day(5), None, 'Team 1')
+        assert (None, set()) == self._call_fut(card, card)
+
+    def test_date_moved_back(self):
+        old = (self._day(1), self._day(5), None, 'Team 1')
+        new = (self._day(1), self._day(3), None, 'Team 1')
+        assert (self._day(3), set(['Team 1'])) == self._call_fut(old, new)
+
+    def test_team_changed(self):
+        old = (self._day(1), self._day(5), None, 'Team 1')
+        new = (self._day(1), self._day(5), None, 'Team 2')
+        expected = (self._day(1), set(['Team 1', 'Team 2']))
+        assert expected == self._call_fut(old, new)
+
+    def test_new_card(self):
+        new = (self._day(2), None, None, None)
+        assert (self._day(2), set()) == self._call_fut((None, ) * 4, new)
@@ -215,3 +215,23 @@ class EfficiencyTests(unittest2.TestCase):
         es = self._get_target_class()()
         result = es.make_incremental(data, 'Done')
         assert expected == result
+
+    def test_calculate_columns(self):
+        columns = {
+            'Backlog': [20, 18],
+            'Building': [5, None],
+            'Test': [2, 3],
+        }
+        mapping = {
+            'Queued': ('Backlog', ),
+            'In Process': ('Building', 'Test', 'Elaboration'),
+        }
+
+        Stats = self._get_target_class()
+        sums = Stats(mapping=mapping).calculate_columns(columns)
+        assert {'Queued': [20, 18], 'In Process': [7, 3]} == sums
+
+    def test_make_incremental_column(self):
+        Stats = self._get_target_class()
+        assert [0, 2, 2] == Stats().make_incremental_column([5, 7, 9])
+        assert [] == Stats().make_incremental_column([])
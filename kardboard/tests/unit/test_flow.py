@@ -0,0 +1,75 @@
+"""
+Tests for services/flow
+"""
+import unittest2
+
+
+class CountFlowTests(unittest2.TestCase):
+    def _call_fut(self, *args):
+        from kardboard.services.flow import count_flow
+        return count_flow(*args)
+
+    def test_count_flow(self):
+        cards = [
+            ('Todo', 'Team 1', 'Card'),
+            ('Todo', 'Team 1', 'Defect'),
+            ('Doing', 'Team 2', 'Card'),
+            ('Unknown', 'Team 2', 'Card'),
+        ]
+        groups = {
+            'all': None,
+            'team-2': frozenset(['Team 2']),
+        }
+        flow = self._call_fut(cards, ['Todo', 'Doing'], groups, ['Defect'])
+
+        assert ({'Todo': 2, 'Doing': 1}, {'Todo': 1, 'Doing': 1}) == flow['all']
+        assert ({'Todo': 0, 'Doing': 1}, {'Todo': 0, 'Doing': 1}) == flow['team-2']
+
+    def test_no_cards(self):
+        flow = self._call_fut([], ['Todo'], {'all': None})
+        assert {'all': ({'Todo': 0}, {'Todo': 0})} == flow
+
+
+class SweepFlowTests(unittest2.TestCase):
+    def _day(self, day, hour=23):
+        import datetime
+        return datetime.datetime(2013, 6, day, hour, 59, 59)
+
+    def _call_fut(self, *args):
+        from kardboard.services.flow import sweep_flow
+        return list(sweep_flow(*args))
+
+    def test_sweep_flow(self):
+        cards = {1: ('Team 1', 'Card'), 2: ('Team 2', 'Defect')}
+        logs = [
+            (self._day(1, 9), 1, 'Todo', self._day(3, 9)),
+            (self._day(2, 9), 2, 'Todo', None),
+            (self._day(3, 9), 1, 'Doing', None),
+        ]
+        days = [self._day(1), self._day(2), self._day(3)]
+        groups = {'team-1': frozenset(['Team 1']), 'all': None}
+
+        flows = self._call_fut(logs, days, ['Todo', 'Doing'], groups,
+            cards, ['Defect'])
+
+        assert days == [day for day, flow in flows]
+        assert [
+            ({'Todo': 1, 'Doing': 0}, {'Todo': 1, 'Doing': 0}),
+            ({'Todo': 2, 'Doing': 0}, {'Todo': 1, 'Doing': 0}),
+            ({'Todo': 1, 'Doing': 1}, {'Todo': 0, 'Doing': 1}),
+        ] == [flow['all'] for day, flow in flows]
+        assert {'Todo': 0, 'Doing': 1} == flows[2][1]['team-1'][0]
+
+
+class SliceColumnsTests(unittest2.TestCase):
+    def test_slice_columns(self):
+        from kardboard.services.flow import slice_columns
+
+        chunks = [
+            ([1, 2, 3], ['Todo'], [[5, 6, 7]]),
+            ([4, 5], ['Todo', 'Done'], [[8, 9], [1, 2]]),
+        ]
+        dates, series = slice_columns(chunks, 2, 4, ['Todo', 'Done'])
+
+        assert [2, 3, 4] == dates
+        assert {'Todo': [6, 7, 8], 'Done': [None, None, 1]} == series
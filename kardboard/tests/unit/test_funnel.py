@@ -66,14 +66,11 @@ class FunnelTests(unittest2.TestCase):
     def test_find_cards(self):
         with mock.patch('kardboard.services.funnel.Kard') as mock_Kard:
             f = self._get_class()('Build to OTIS', {})
-            mock_Kard.objects.filter.return_value.exclude.return_value = []
+            mock_Kard.objects.filter.return_value.views.return_value = []
             result = f.find_cards()
             mock_Kard.objects.filter.assert_called_with(
                 state="Build to OTIS",
             )
-            mock_Kard.objects.filter.return_value.exclude.assert_called_with(
-                '_ticket_system_data',
-            )
             assert result == []
 
     def test_state_duration(self):
@@ -86,10 +83,48 @@ class FunnelTests(unittest2.TestCase):
             mock_StateLog.objects.filter.return_value.order_by.return_value = [fake_statelog, ]
             duration = f.state_duration(card)
             mock_StateLog.objects.filter.assert_called_with(
-                card=card,
+                card=card.id,
                 state=f.state
             )
             mock_StateLog.objects.filter.return_value.order_by.assert_called_with(
                 '-entered',
             )
             assert 20 == duration
+
+    def _make_card(self, key, priority=None):
+        card = mock.Mock()
+        card.id = key.lower()
+        card.key = key
+        card.priority = priority
+        return card
+
+    def test_times_in_state(self):
+        with mock.patch('kardboard.services.funnel.StateLog') as mock_StateLog:
+            f = self._get_class()('Build to OTIS', {})
+            cards = [self._make_card('CMSCMS-1'), self._make_card('CMSCMS-2')]
+            fake_statelog = mock.Mock()
+            fake_statelog.duration = 20
+            mock_StateLog.latest.return_value = {
+                ('cmscms-1', 'Build to OTIS'): fake_statelog,
+            }
+
+            result = f.times_in_state(cards)
+            mock_StateLog.latest.assert_called_with([
+                ('cmscms-1', 'Build to OTIS'),
+                ('cmscms-2', 'Build to OTIS'),
+            ])
+            assert {'CMSCMS-1': 20, 'CMSCMS-2': None} == result
+
+    def test_ordered_cards(self):
+        f = self._get_class()('Build to OTIS', {})
+        cards = [
+            self._make_card('CMSCMS-1'),
+            self._make_card('CMSCMS-2', priority=2),
+            self._make_card('CMSCMS-3'),
+            self._make_card('CMSCMS-4', priority=1),
+        ]
+        times_in_state = {'CMSCMS-1': 10, 'CMSCMS-3': 30}
+
+        result = f.ordered_cards(cards, times_in_state)
+        expected = ['CMSCMS-4', 'CMSCMS-2', 'CMSCMS-3', 'CMSCMS-1']
+        assert expected == [c.key for c in result]
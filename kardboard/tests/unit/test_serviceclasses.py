@@ -0,0 +1,89 @@
+"""
+Tests for services/serviceclasses
+"""
+import datetime
+
+import unittest2
+
+
+class ServiceClassAggregatorTests(unittest2.TestCase):
+    def setUp(self):
+        self.today = datetime.datetime(2013, 6, 20)
+        self.day = lambda d: datetime.datetime(2013, 6, d)
+        self.classes = {
+            'Speedy': {'name': 'Speedy', 'upper': 4},
+            'default': {'name': 'Normal', 'upper': 10},
+        }
+
+    def _make_one(self):
+        from kardboard.services.serviceclasses import ServiceClassAggregator
+        return ServiceClassAggregator(
+            lambda name: self.classes[name or 'default'], today=self.today)
+
+    def test_report(self):
+        aggregator = self._make_one()
+        aggregator.add('Speedy', self.day(17), None)
+        aggregator.add('Speedy', self.day(10), None)
+        aggregator.add(None, self.day(1), self.day(9))
+        aggregator.add('default', self.day(1), self.day(15))
+
+        report = aggregator.report()
+
+        assert {
+            'service_class': 'Speedy',
+            'wip': 2,
+            'wip_percent': .5,
+            'cycle_time_average': 7,
+            'cards_hit_goal': 1,
+            'cards_hit_goal_percent': .5,
+        } == report['Speedy']
+        assert 11 == report['Normal']['cycle_time_average']
+        assert ['Normal', 'Speedy'] == sorted(report.keys())
+
+    def test_merge(self):
+        january, february = self._make_one(), self._make_one()
+        january.add('Speedy', self.day(17), None)
+        january.add(None, self.day(1), self.day(9))
+        february.add('Speedy', self.day(10), None)
+        february.add('default', self.day(1), self.day(15))
+
+        merged = self._make_one()
+        merged.merge(january.partial())
+        merged.merge(february.partial())
+
+        whole = self._make_one()
+        whole.add('Speedy', self.day(17), None)
+        whole.add('Speedy', self.day(10), None)
+        whole.add(None, self.day(1), self.day(9))
+        whole.add('default', self.day(1), self.day(15))
+        assert whole.report() == merged.report()
+
+    def test_merge_empty(self):
+        aggregator = self._make_one()
+        aggregator.merge(self._make_one().partial())
+        assert [] == aggregator.partial()
+        assert {} == aggregator.report()
+
+    def test_empty(self):
+        assert {} == self._make_one().report()
+
+
+class ChangedMonthsTests(unittest2.TestCase):
+    def _call(self, old, new):
+        from kardboard.services.serviceclasses import changed_months
+        return changed_months(old, new)
+
+    def test_moved_done_date(self):
+        old = ('A', None, datetime.datetime(2013, 5, 1), datetime.datetime(2013, 5, 30))
+        new = ('B', None, datetime.datetime(2013, 5, 1), datetime.datetime(2013, 6, 2))
+        months = self._call(old, new)
+        assert months == set([
+            ('A', datetime.datetime(2013, 5, 1)),
+            ('B', datetime.datetime(2013, 6, 1)),
+        ])
+
+    def test_deleted_and_unchanged(self):
+        done = ('A', 'Speedy', None, datetime.datetime(2013, 5, 30))
+        assert self._call(done, None) == set([('A', datetime.datetime(2013, 5, 1))])
+        assert self._call(done, done) == set()
+        assert self._call(('A', None, None, None), ('A', 'Speedy', None, None)) == set()
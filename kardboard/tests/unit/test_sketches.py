@@ -0,0 +1,70 @@
+"""
+Tests for services/sketches
+"""
+import datetime
+
+import unittest2
+
+
+class SketchesTests(unittest2.TestCase):
+    def setUp(self):
+        self.day = lambda d: datetime.datetime(2013, 6, d)
+
+    def test_cycle_time_changes_moves_a_card(self):
+        from kardboard.services.sketches import cycle_time_changes
+
+        old = ('Team 1', 'Normal', self.day(1), self.day(4))
+        new = ('Team 2', 'Normal', self.day(1), self.day(11))
+        expected = [
+            ('Team 1', 'Normal', self.day(4), 3, -1),
+            ('Team 2', 'Normal', self.day(11), 10, 1),
+        ]
+        assert expected == cycle_time_changes(old, new)
+
+    def test_cycle_time_changes_deleted(self):
+        from kardboard.services.sketches import cycle_time_changes
+
+        old = ('Team 1', None, self.day(1), self.day(4))
+        assert [('Team 1', None, self.day(4), 3, -1)] == \
+            cycle_time_changes(old, None)
+        assert [] == cycle_time_changes((None, None, None, None), None)
+
+    def test_bucket_cycle_times_by_week(self):
+        from kardboard.services.sketches import bucket_cycle_times
+
+        changes = [
+            ('Team 1', None, self.day(8), 3, 1),
+            ('Team 1', None, self.day(9), 3, 1),
+            ('Team 1', 'Urgent', self.day(9), 1, 1),
+            ('Team 1', None, self.day(10), 5, -1),
+        ]
+        expected = {
+            ('Team 1', self.day(2), None): {3: 1},
+            ('Team 1', self.day(9), None): {3: 1, 5: -1},
+            ('Team 1', self.day(9), 'Urgent'): {1: 1},
+        }
+        assert expected == bucket_cycle_times(changes)
+
+    def test_whole_weeks(self):
+        from kardboard.services.sketches import whole_weeks
+
+        # A window that starts and ends on week boundaries is all whole weeks
+        end = datetime.datetime(2013, 6, 15, 23, 59, 59)
+        assert (self.day(2), self.day(16)) == whole_weeks(self.day(2), end)
+
+        first, last = whole_weeks(self.day(4), self.day(12))
+        assert first >= last
+
+    def test_merged_percentiles_match_the_whole(self):
+        from kardboard.services.sketches import merge_histograms, percentile
+
+        weeks = [{1: 2, 4: 1}, {2: 3, 9: 1}, {4: 2, 20: 1}]
+        whole = {1: 2, 2: 3, 4: 3, 9: 1, 20: 1}
+        merged = merge_histograms(weeks)
+        assert whole == merged
+        for pct in (.5, .8, .95):
+            assert percentile(pct, whole) == percentile(pct, merged)
+
+    def test_percentile_empty(self):
+        from kardboard.services.sketches import percentile
+        assert percentile(.8, {}) is None
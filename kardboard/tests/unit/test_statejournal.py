@@ -0,0 +1,52 @@
+"""
+Tests for services/statejournal
+"""
+import datetime
+
+import unittest2
+
+
+class PlanFlushTests(unittest2.TestCase):
+    def setUp(self):
+        self.day = lambda d: datetime.datetime(2013, 6, d)
+
+    def _change(self, card_id, kind, state, day, service_class='Normal'):
+        from kardboard.services.statejournal import StateChange
+        return StateChange(card_id, kind, state, service_class, self.day(day))
+
+    def _call_fut(self, changes):
+        from kardboard.services.statejournal import plan_flush
+        return plan_flush(changes)
+
+    def test_new_card(self):
+        plan = self._call_fut([self._change(1, 'new', 'Todo', 1)])
+        assert [] == plan.closed
+        assert [{
+            'card': 1,
+            'state': 'Todo',
+            'service_class': 'Normal',
+            'entered': self.day(1),
+            'exited': None,
+        }] == plan.logs
+
+    def test_moves_are_chained(self):
+        plan = self._call_fut([
+            self._change(1, 'moved', 'Doing', 2),
+            self._change(2, 'moved', 'Doing', 3),
+            self._change(1, 'moved', 'Done', 4),
+        ])
+        assert [(1, self.day(2)), (2, self.day(3))] == plan.closed
+        assert [(1, 'Doing', self.day(2), self.day(4)),
+            (1, 'Done', self.day(4), None),
+            (2, 'Doing', self.day(3), None)] == \
+            [(l['card'], l['state'], l['entered'], l['exited']) for l in plan.logs]
+
+    def test_reclassed(self):
+        plan = self._call_fut([
+            self._change(1, 'reclassed', 'Todo', 1, 'Expedite'),
+            self._change(1, 'moved', 'Doing', 2),
+            self._change(1, 'reclassed', 'Doing', 3, 'Expedite'),
+        ])
+        assert [(1, 'Todo', 'Expedite')] == plan.reclassed
+        assert [(1, self.day(2))] == plan.closed
+        assert 'Expedite' == plan.logs[0]['service_class']
@@ -372,3 +372,91 @@ class TeamStatsTest(unittest2.TestCase):
                 mock_done_in_range.return_value = return_value
                 result = self.service.monthly_throughput_ave(months=3)
                 assert result == 4
+
+
+@pytest.mark.teamstats
+class TeamStatsSnapshotTest(unittest2.TestCase):
+    def setUp(self):
+        super(TeamStatsSnapshotTest, self).setUp()
+        self.today = datetime(2013, 6, 30, 12)
+        normal = {'name': 'Normal', 'upper': 10}
+        urgent = {'name': 'Urgent', 'upper': 2}
+        self.rows = [
+            # The four weeks before the last four
+            ('Normal', {'key': 'A-1', 'done_date': datetime(2013, 5, 10),
+                'cycle_time': 12, 'service_class': normal}),
+            ('Urgent', {'key': 'A-2', 'done_date': datetime(2013, 5, 20),
+                'cycle_time': 1, 'service_class': urgent}),
+            # The last four weeks
+            ('Normal', {'key': 'A-3', 'done_date': datetime(2013, 6, 10),
+                'cycle_time': 8, 'service_class': normal}),
+            ('Normal', {'key': 'A-4', 'done_date': datetime(2013, 6, 20),
+                'cycle_time': 4, 'service_class': normal}),
+            ('Urgent', {'key': 'A-5', 'done_date': datetime(2013, 6, 29),
+                'cycle_time': 3, 'service_class': urgent}),
+        ]
+
+    def _make_one(self, exclude_classes=[]):
+        from kardboard.services.teams import TeamStatsSnapshot
+
+        with mock.patch.object(TeamStatsSnapshot, '_load') as mock_load:
+            mock_load.return_value = self.rows
+            service = TeamStatsSnapshot('Team Foo', exclude_classes,
+                weeks=8, today=self.today)
+        service._oldest_card_date = datetime(2012, 1, 1)
+        return service
+
+    def test_windows(self):
+        service = self._make_one()
+
+        assert 3 == service.throughput(4)
+        assert 2 == service.throughput(4, weeks_offset=4)
+        assert [8, 4, 3] == service.cycle_times(4)
+        assert 8 == service.percentile(.8, 4)
+        assert 12 == service.percentile(.8, 4, weeks_offset=4)
+        assert 2 / 3.0 == service.hit_sla(4)
+        assert .5 == service.hit_sla(4, weeks_offset=4)
+
+    def test_card_info(self):
+        service = self._make_one()
+        service.cycle_times(4)
+        assert ['A-3', 'A-4', 'A-5'] == [c['key'] for c in service.card_info]
+
+    def test_exclude_classes(self):
+        from kardboard.services.teams import TeamStats
+
+        service = self._make_one(['Urgent'])
+        assert 2 == service.throughput(4)
+
+        with mock.patch.object(TeamStats, 'oldest_card_date') as mock_oldest:
+            mock_oldest.return_value = datetime(2012, 1, 1)
+            assert 3 == service.without([]).throughput(4)
+        assert 2 == service.throughput(4)
+
+    def test_reads_older_windows(self):
+        service = self._make_one()
+        with mock.patch.object(service, '_load') as mock_load:
+            mock_load.return_value = []
+            assert 0 == service.throughput(4, weeks_offset=8)
+            assert mock_load.called
+
+    def test_oldest_card_date_read_once(self):
+        from kardboard.services.teams import TeamStats
+
+        service = self._make_one()
+        service._oldest_card_date = None
+        with mock.patch.object(TeamStats, 'oldest_card_date') as mock_oldest:
+            mock_oldest.return_value = datetime(2012, 1, 1)
+            service.throughput(4)
+            service.throughput(4, weeks_offset=4)
+            assert 1 == mock_oldest.call_count
+
+    def test_histogram_older_than_the_snapshot(self):
+        from kardboard.services.teams import CycleTimeSketch
+
+        service = self._make_one()
+        with mock.patch.object(CycleTimeSketch, 'histogram') as mock_histogram:
+            mock_histogram.return_value = {5: 1}
+            assert {5: 1} == service.histogram(4, weeks_offset=8)
+            assert {8: 1, 4: 1, 3: 1} == service.histogram(4)
+            assert 1 == mock_histogram.call_count
@@ -0,0 +1,45 @@
+"""
+Tests for services/transitions
+"""
+import datetime
+
+import unittest2
+
+
+class TransitionsTests(unittest2.TestCase):
+    def setUp(self):
+        self.day = lambda d, h=0: datetime.datetime(2013, 6, d, h)
+
+    def test_bucket_transitions(self):
+        from kardboard.services.transitions import (
+            ENTERED, EXITED, bucket_transitions)
+
+        transitions = [
+            (1, 'Todo', ENTERED, self.day(3, 9)),
+            (2, 'Todo', ENTERED, self.day(3, 17)),
+            (1, 'Todo', EXITED, self.day(3, 18)),
+            (3, 'Todo', EXITED, self.day(4, 10)),
+        ]
+        teams = {1: 'Team 1', 2: 'Team 1', 3: 'Team 2'}
+
+        expected = {
+            ('Team 1', 'Todo', self.day(3)): {ENTERED: 2, EXITED: 1},
+            ('Team 2', 'Todo', self.day(4)): {EXITED: 1},
+        }
+        assert expected == bucket_transitions(transitions, teams)
+
+    def test_daily_series_weekdays_only(self):
+        from kardboard.services.transitions import EXITED, daily_series
+
+        # The 7th and 8th of June 2013 were a Friday and Saturday
+        counts = {self.day(7): {EXITED: 3}, self.day(8): {EXITED: 1}}
+        series = daily_series(counts, self.day(6), self.day(10, 12),
+            weekdays_only=True)
+
+        assert [(self.day(6), 0), (self.day(7), 3), (self.day(10), 0)] == series
+
+    def test_histogram(self):
+        from kardboard.services.transitions import histogram
+
+        series = [(self.day(3), 0), (self.day(4), 2), (self.day(5), 0)]
+        assert {0: 2, 2: 1} == histogram(series)
@@ -68,3 +68,34 @@ class UtilTests(unittest2.TestCase):
         self.assertEqual(6, end.month)
         self.assertEqual(11, end.day)
         self.assertEqual(2011, end.year)
+
+    def test_chunked(self):
+        from kardboard.util import chunked
+
+        chunks = list(chunked(iter(xrange(0, 7)), 3))
+        self.assertEqual([[0, 1, 2], [3, 4, 5], [6]], chunks)
+        self.assertEqual([], list(chunked([], 3)))
+
+    def test_rolling_stats(self):
+        from kardboard.util import RollingStats, average, standard_deviation
+
+        window = RollingStats([3, 8, 1, 12])
+        window.add(6)
+        window.remove(1)
+        values = [3, 8, 12, 6]
+
+        self.assertEqual(average(values), window.mean())
+        self.assertAlmostEqual(standard_deviation(values), window.standard_deviation())
+        self.assertEqual(7, window.median())
+        # Deviations from 7 are 4, 1, 5 and 1
+        self.assertEqual(2.5, window.median_abs_dev())
+
+    def test_rolling_stats_empty(self):
+        from kardboard.util import RollingStats
+
+        window = RollingStats([4])
+        self.assertEqual(None, window.standard_deviation())
+        window.remove(4)
+        self.assertEqual(None, window.mean())
+        self.assertEqual(None, window.median_abs_dev())
+        self.assertRaises(ValueError, window.remove, 4)
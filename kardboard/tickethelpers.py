@@ -1,3 +1,6 @@
+import copy
+import importlib
+import time
 import urlparse
 import datetime
 import cPickle as pickle
@@ -11,11 +14,62 @@ from kardboard.util import ImproperlyConfigured, log_exception
 from kardboard.tasks import update_ticket
 
 
+_helper_classes = {}
+_helpers = {}
+
+
+def get_helper_class(helper_setting):
+    """The class named by a :ref:`TICKET_HELPER` setting."""
+    klass = _helper_classes.get(helper_setting)
+    if klass is None:
+        modname = '.'.join(helper_setting.split('.')[:-1])
+        klassnam = helper_setting.split('.')[-1]
+        mod = importlib.import_module(modname)
+        klass = getattr(mod, klassnam)
+        _helper_classes[helper_setting] = klass
+    return klass
+
+
+def get_ticket_helper(kard, config=None):
+    """
+    The :ref:`TICKET_HELPER` for kard, or for no card in particular if
+    kard is None.
+
+    One helper is set up for each helper setting and kept for as long as
+    the settings it reads stay the same. Cards get a binding to it, so
+    they share its connection and lookups instead of each building their
+    own.
+    """
+    if config is None:
+        config = app.config
+    helper_setting = config['TICKET_HELPER']
+    klass = get_helper_class(helper_setting)
+    settings = [config.get(name) for name in klass.SETTINGS]
+
+    shared = _helpers.get(helper_setting)
+    if shared is None or shared[0] is not config or shared[1] != settings:
+        shared = (config, settings, klass(config, None))
+        _helpers[helper_setting] = shared
+    return shared[2].bind(kard)
+
+
 class TicketHelper(object):
+    SETTINGS = ()
+    """The config keys a helper reads when it's set up."""
+
     def __init__(self, config, kard):
         self.app_config = config
         self.card = kard
 
+    def bind(self, kard):
+        """
+        A copy of the helper for kard. It shares everything the helper
+        set up, so subclasses should reset any per-card state here.
+        """
+        helper = copy.copy(self)
+        helper.card = kard
+        return helper
+
     def get_title(self, key=None):
         """
         The title of the ticket
@@ -122,6 +176,8 @@ class TestTicketHelper(TicketHelper):
 
 
 class JIRAHelper(TicketHelper):
+    SETTINGS = ('JIRA_WSDL', 'JIRA_CREDENTIALS', 'TESTING')
+    AUTH_TIMEOUT = 60 * 60
     clients = {}
 
     def __init__(self, config, kard):
@@ -131,7 +187,8 @@ class JIRAHelper(TicketHelper):
         self.statsd = app.statsd.get_client('tickethelpers.JIRAHelper')
 
         self.issues = {}
-        self._service = None
+        # Shared by every binding of this helper
+        self.connection = {}
 
         try:
             self.wsdl_url = self.app_config['JIRA_WSDL']
@@ -151,11 +208,23 @@ class JIRAHelper(TicketHelper):
     def cache_prefix(self):
         return "jira_%s" % self.wsdl_url
 
+    def bind(self, kard):
+        helper = super(JIRAHelper, self).bind(kard)
+        helper.issues = {}
+        return helper
+
+    def _connected(self):
+        if self.connection.get('expires', 0) <= time.time():
+            self.connect()
+        return self.connection
+
     @property
     def service(self):
-        if self._service is None:
-            self.connect()
-        return self._service
+        return self._connected()['service']
+
+    @property
+    def auth(self):
+        return self._connected()['auth']
 
     def connect(self):
         auth_key = "offline_auth_%s" % self.cache_prefix
@@ -178,16 +247,21 @@ class JIRAHelper(TicketHelper):
         if not auth:
             self.logger.warn("Cache miss for %s" % auth_key)
             auth = client.service.login(self.username, self.password)
-            cache.set(auth_key, auth, 60 * 60)  # Cache for an hour
-
-        self.auth = auth
-        self._service = client.service
+            cache.set(auth_key, auth, self.AUTH_TIMEOUT)
+
+        # Resolved statuses, types and resolutions are kept until the
+        # auth runs out too, so they're refreshed as often as before
+        self.connection.clear()
+        self.connection.update(
+            service=client.service,
+            auth=auth,
+            metadata={},
+            expires=time.time() + self.AUTH_TIMEOUT,
+        )
 
     def login(self, username, password):
-        if not self._service:
-            self.connect()
         try:
-            auth = self._service.login(username, password)
+            auth = self.service.login(username, password)
             return auth
         except:
             return False
@@ -261,19 +335,34 @@ class JIRAHelper(TicketHelper):
         dic = dict([(key, getattr(obj, key)) for key in keys])
         return dic
 
-    def resolve_resolution(self, resolution_id):
-        key = "%s_resolutions" % self.cache_prefix
-        resolutions = cache.get(key)
-        if resolutions:
+    def _metadata(self, key, fetch, use_cache=True):
+        """
+        A list of JIRA objects from fetch, as dicts. It's kept in this
+        process until the connection is renewed, and also in the cache
+        if use_cache is True.
+        """
+        metadata = self._connected()['metadata']
+        if key in metadata:
+            return metadata[key]
+
+        values = None
+        if use_cache:
+            values = cache.get(key)
+        if values:
             try:
-                resolutions = pickle.loads(resolutions)
+                values = pickle.loads(values)
             except pickle.UnpicklingError:
-                resolutions = None
-        if not resolutions:
+                values = None
+        if not values:
             self.logger.warn("Cache miss for %s" % key)
-            resolutions = self.service.getResolutions()
-            resolutions = [self.object_to_dict(r) for r in resolutions]
-            cache.set(key, pickle.dumps(resolutions))
+            values = [self.object_to_dict(v) for v in fetch()]
+            cache.set(key, pickle.dumps(values))
+        metadata[key] = values
+        return values
+
+    def resolve_resolution(self, resolution_id):
+        key = "%s_resolutions" % self.cache_prefix
+        resolutions = self._metadata(key, lambda: self.service.getResolutions())
         resolution = [r for r in resolutions if r.get('id') == resolution_id]
         try:
             return resolution[0]
@@ -284,17 +373,7 @@ class JIRAHelper(TicketHelper):
 
     def resolve_status(self, status_id):
         key = "%s_statuses" % self.cache_prefix
-        statuses = cache.get(key)
-        if statuses:
-            try:
-                statuses = pickle.loads(statuses)
-            except pickle.UnpicklingError:
-                statuses = None
-        if not statuses:
-            self.logger.warn("Cache miss for %s" % key)
-            statuses = self.service.getStatuses()
-            statuses = [self.object_to_dict(s) for s in statuses]
-            cache.set(key, pickle.dumps(statuses))
+        statuses = self._metadata(key, lambda: self.service.getStatuses())
         status = [s for s in statuses if s.get('id') == status_id]
         try:
             return status[0]
@@ -305,21 +384,13 @@ class JIRAHelper(TicketHelper):
 
     def resolve_type(self, type_id):
         key = "%s_issue_types_and_subtasks" % self.cache_prefix
-        the_types = cache.get(key)
-        the_types = None
-        if the_types:
-            try:
-                the_types = pickle.loads(the_types)
-            except pickle.UnpicklingError:
-                the_types = None
-        if the_types is None:
-            self.logger.warn("Cache miss for %s" % key)
-            the_types = self.service.getIssueTypes()
-            the_types = [self.object_to_dict(t) for t in the_types]
-            the_subtask_types = self.service.getSubTaskIssueTypes()
-            the_subtask_types = [self.object_to_dict(st) for st in the_subtask_types]
-            the_types.extend(the_subtask_types)
-            cache.set(key, pickle.dumps(the_types))
+
+        def fetch():
+            the_types = list(self.service.getIssueTypes())
+            the_types.extend(self.service.getSubTaskIssueTypes())
+            return the_types
+
+        the_types = self._metadata(key, fetch, use_cache=False)
         the_type = [t for t in the_types if t['id'] == type_id]
         try:
             return the_type[0]
@@ -1,10 +1,12 @@
 import datetime
+import math
 import re
 import traceback
 import logging
 import os
 import functools
 
+from bisect import bisect_left, insort
 from logging.handlers import RotatingFileHandler
 
 import jinja2.ext
@@ -58,6 +60,106 @@ def delta_in_hours(delta):
     return hours
 
 
+class RollingStats(object):
+    """
+    Statistics over a window of numbers that slides by adding and
+    removing one number at a time.
+
+    Running sums give the mean and sample standard deviation in constant
+    time and a sorted list gives the exact median and median absolute
+    deviation by binary search, so moving the window costs a little per
+    number entering or leaving it rather than a pass over all of it.
+
+    >>> window = RollingStats([2, 4, 9])
+    >>> window.mean(), window.median(), window.median_abs_dev()
+    (5.0, 4, 2)
+    >>> window.remove(2)
+    >>> window.add(10)
+    >>> window.mean(), window.median(), window.median_abs_dev()
+    (7.666666666666667, 9, 1)
+    """
+    def __init__(self, values=()):
+        self.values = []
+        self.total = 0
+        self.total_squares = 0
+        for value in values:
+            self.add(value)
+
+    def __len__(self):
+        return len(self.values)
+
+    def add(self, value):
+        insort(self.values, value)
+        self.total += value
+        self.total_squares += value * value
+
+    def remove(self, value):
+        i = bisect_left(self.values, value)
+        if i == len(self.values) or self.values[i] != value:
+            raise ValueError("%r isn't in the window" % (value, ))
+        del self.values[i]
+        self.total -= value
+        self.total_squares -= value * value
+
+    def mean(self):
+        if not self.values:
+            return None
+        return self.total / float(len(self.values))
+
+    def standard_deviation(self):
+        """Uses N-1, like standard_deviation(). None for fewer than 2 values."""
+        n = len(self.values)
+        if n < 2:
+            return None
+        variance = (self.total_squares - self.total * self.total / float(n)) / (n - 1)
+        return math.sqrt(max(variance, 0))
+
+    def _middle(self, kth, n):
+        if n % 2:
+            return kth(n // 2)
+        return (kth(n // 2 - 1) + kth(n // 2)) / 2.0
+
+    def median(self):
+        if not self.values:
+            return None
+        return self._middle(self.values.__getitem__, len(self.values))
+
+    def median_abs_dev(self):
+        """
+        See http://en.wikipedia.org/wiki/Median_absolute_deviation
+        """
+        if not self.values:
+            return None
+        values, middle = self.values, self.median()
+
+        # Deviations below and above the median, each in ascending order
+        split = bisect_left(values, middle)
+        below = lambda i: middle - values[split - 1 - i]
+        above = lambda j: values[split + j] - middle
+        n_below, n_above = split, len(values) - split
+
+        def kth(k):
+            # The (k + 1)th smallest deviation is the larger of the last
+            # ones taken from each side when taking i from below
+            lo = max(0, k + 1 - n_above)
+            hi = min(k + 1, n_below)
+            while lo < hi:
+                i = (lo + hi) // 2
+                if above(k - i) > below(i):
+                    lo = i + 1
+                else:
+                    hi = i
+            i, j = lo, k + 1 - lo
+            taken = []
+            if i:
+                taken.append(below(i - 1))
+            if j:
+                taken.append(above(j - 1))
+            return max(taken)
+
+        return self._middle(kth, len(values))
+
+
 class ImproperlyConfigured(Exception):
     pass
 
@@ -127,6 +229,24 @@ def days_between(date1, date2):
     return int(round(diff_in_days))
 
 
+def chunked(iterable, size):
+    """
+    Yields lists of at most size items from iterable, without
+    materialising the whole thing.
+
+    >>> list(chunked(xrange(5), 2))
+    [[0, 1], [2, 3], [4]]
+    """
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
 def month_ranges(date, num_months):
     if num_months == 1:
         return [month_range(date), ]
@@ -1,7 +1,6 @@
 import csv
 import cStringIO
 import datetime
-import importlib
 import os
 import time
 from math import isnan
@@ -23,12 +22,14 @@ from flask import (
 import kardboard.auth
 from kardboard.version import VERSION
 from kardboard.app import app
-from kardboard.models import Kard, DailyRecord, Q, Person, ReportGroup, States, DisplayBoard, PersonCardSet, FlowReport, StateLog, ServiceClassRecord, ServiceClassSnapshot
+from kardboard.models import Kard, DailyRecord, Q, Person, ReportGroup, config_snapshot, DisplayBoard, PersonCardSet, FlowSeries, StateLog, ServiceClassRecord, ServiceClassSnapshot
 from kardboard.forms import get_card_form, _make_choice_field_ready, LoginForm, CardBlockForm, CardUnblockForm
 import kardboard.util
 from kardboard.services import teams as teams_service
+from kardboard.services import transitions as transitions_service
 from kardboard.services.funnel import Funnel
 from kardboard.services.wiplimits import WIPLimits
+from kardboard.tickethelpers import get_ticket_helper
 from kardboard.util import (
     munge_date,
     month_range,
@@ -88,10 +89,11 @@ def _make_backlog_markers(lead_time, weekly_throughput, backlog_cards):
     return backlog_markers
 
 
-def _team_backlog_markers(team, cards, weeks=12):
+def _team_backlog_markers(team, cards, weeks=12, team_stats=None):
     exclude_classes = _get_excluded_classes()
 
-    team_stats = teams_service.TeamStats(team.name, exclude_classes)
+    if team_stats is None:
+        team_stats = teams_service.TeamStatsSnapshot(team.name, exclude_classes, weeks)
 
     weekly_throughput = team_stats.weekly_throughput_ave(weeks)
     confidence_80 = team_stats.percentile(.80, weeks)
@@ -153,7 +155,8 @@ def team(team_slug=None):
 
     weeks = 4
     exclude_classes = _get_excluded_classes()
-    team_stats = teams_service.TeamStats(team.name, exclude_classes)
+    # Every metric below, this window and the one before it, comes from one read
+    team_stats = teams_service.TeamStatsSnapshot(team.name, exclude_classes, weeks * 2)
     weekly_throughput = team_stats.weekly_throughput_ave(weeks)
 
     hit_sla = team_stats.hit_sla(weeks)
@@ -161,8 +164,9 @@ def team(team_slug=None):
     hit_sla, hit_sla_delta = zero_if_none(hit_sla), zero_if_none(hit_sla_delta)
     hit_sla_delta = hit_sla - hit_sla_delta
 
-    total_throughput = teams_service.TeamStats(team.name).throughput(weeks)
-    total_throughput_delta = teams_service.TeamStats(team.name).throughput(weeks,
+    all_classes_stats = team_stats.without([])
+    total_throughput = all_classes_stats.throughput(weeks)
+    total_throughput_delta = all_classes_stats.throughput(weeks,
         weeks_offset=weeks)
     total_throughput, total_throughput_delta = zero_if_none(total_throughput), zero_if_none(total_throughput_delta)
     total_throughput_delta = total_throughput - total_throughput_delta
@@ -190,7 +194,7 @@ def team(team_slug=None):
         },
     ]
 
-    board = TeamBoard(team.name, States(), wip_limits)
+    board = TeamBoard(team.name, config_snapshot().states, wip_limits)
     backlog_limit = weekly_throughput * 4 or 30
     cards = Kard.objects.for_team_board(
         team=team.name,
@@ -203,6 +207,7 @@ def team(team_slug=None):
         team,
         board.columns[0]['cards'],
         weeks,
+        team_stats,
     )
 
     report_config = (
@@ -258,8 +263,8 @@ def team_backlog(team_slug=None):
 
     backlog = Kard.objects.filter(
         team=team.name,
-        state=States().backlog,
-    ).exclude('_ticket_system_data').order_by('priority')
+        state=config_snapshot().states.backlog,
+    ).order_by('priority').views()
 
     backlog_marker_data, backlog_markers = _team_backlog_markers(team, backlog, weeks)
 
@@ -287,14 +292,17 @@ def team_backlog(team_slug=None):
 
 
 def funnel(state_slug):
-    states = States()
+    states = config_snapshot().states
     try:
         state = states.find_by_slug(state_slug)
         funnel = Funnel(state, app.config.get('FUNNEL_VIEWS', {})[state])
     except KeyError:
         abort(404)
 
-    cards = funnel.ordered_cards()
+    # One fetch of the cards and one of their StateLogs for the whole page
+    cards = funnel.find_cards()
+    times_in_state = funnel.times_in_state(cards)
+    ordered_cards = funnel.ordered_cards(cards, times_in_state)
 
     funnel_auth = False
     if kardboard.auth.is_authenticated() is True:
@@ -319,14 +327,14 @@ def funnel(state_slug):
 
     title = "%s: All boards" % state
 
-    funnel_markers = funnel.markers()
+    funnel_markers = funnel.markers(cards)
 
     context = {
         'title': title.replace("Backlog", "Ready: Elabo").replace("OTIS", "TIE"),
         'state': state,
         'state_slug': state_slug,
-        'cards': cards,
-        'times_in_state': funnel.times_in_state(),
+        'cards': ordered_cards,
+        'times_in_state': times_in_state,
         'funnel_throughput': funnel.throughput,
         'funnel_markers': funnel_markers,
         'funnel_auth': funnel_auth,
@@ -359,7 +367,7 @@ def _init_new_card_form(*args, **kwargs):
 
 
 def _init_card_form(*args, **kwargs):
-    states = States()
+    states = config_snapshot().states
     new = kwargs.get('new', False)
     if new:
         del kwargs['new']
@@ -445,7 +453,7 @@ def card(key):
     except Kard.DoesNotExist:
         abort(404)
 
-    card_log = StateLog.objects.filter(card=card)
+    card_log = StateLog.for_card(card)
 
     context = {
         'title': "%s -- %s" % (card.key, card.title),
@@ -618,7 +626,7 @@ def done(group="all", months=3, start=None):
     done = rg.queryset
 
     cards = done.filter(done_date__gte=start,
-        done_date__lte=end).order_by('-done_date')
+        done_date__lte=end).order_by('-done_date').views()
 
     context = {
         'title': "Completed Cards",
@@ -641,7 +649,7 @@ def blocked(group="all", months=3, start=None):
     blocked_cards = rg.queryset
 
     blocked_cards = blocked_cards.filter(start_date__gte=start,
-        start_date__lte=end, blocked_ever=True).order_by('-start_date')
+        start_date__lte=end, blocked_ever=True).order_by('-start_date').views()
 
     context = {
         'title': "Blocked",
@@ -665,7 +673,7 @@ def value_txt_report(year_number, month_number, group="all"):
     done = rg.queryset
 
     cards = done.filter(done_date__gte=start_date,
-        done_date__lte=end_date).order_by('-done_date')
+        done_date__lte=end_date).order_by('-done_date').views()
 
     cards = [c for c in cards if c.is_card]
 
@@ -700,14 +708,10 @@ def report_leaderboard(group="all", months=3, person=None, start_month=None, sta
 
     people = {}
     for card in cards:
-        try:
-            devs = card.ticket_system_data['developers']
-            for d in devs:
-                p = people.get(d, PersonCardSet(d))
-                p.add_card(card)
-                people[d] = p
-        except KeyError:
-            pass
+        for d in card.developers:
+            p = people.get(d, PersonCardSet(d))
+            p.add_card(card)
+            people[d] = p
 
     if person:
         person = people.get(person, None)
@@ -902,7 +906,7 @@ def report_cycle(group="all", months=3, year=None, month=None, day=None):
 
 
 def report_assignee(group="all"):
-    states = States()
+    states = config_snapshot().states
     states_of_interest = [s for s in states if s not in (states.backlog, states.done)]
     # ReportGroup of WIP
     rg = ReportGroup(group, Kard.objects.filter(state__in=states_of_interest))
@@ -1038,55 +1042,38 @@ def report_efficiency(group="all", months=3):
     start_day = make_start_date(date=months_ranges[0][0])
     end_day = make_end_date(date=end)
 
-    records = FlowReport.objects.filter(
-        date__gte=start_day,
-        date__lte=end_day,
-        group=group
-    )
-
-    incremented_state_counts = []
-    for r in records:
-        a_record = {'date': r.date}
-        a_record.update(r.state_counts)
-        incremented_state_counts.append(a_record)
-
-    for group_name in app.config.get('EFFICIENCY_INCREMENTS', ()):
-        stats.make_incremental(incremented_state_counts, group_name)
+    increments = app.config.get('EFFICIENCY_INCREMENTS', ())
+    states = set(increments)
+    for mapped_states in state_mappings.values():
+        states.update(mapped_states)
+    dates, columns, updated_at = FlowSeries.slice(group, start_day, end_day, states)
+    if not dates:
+        abort(404)
 
-    data = []
-    for r in incremented_state_counts:
-        efficiency_stats = stats.calculate(r)
-        data.append(
-            {'date': r['date'], 'stats': efficiency_stats}
-        )
+    for state in increments:
+        columns[state] = stats.make_incremental_column(columns[state])
+    sums = stats.calculate_columns(columns)
 
     chart = {}
-    chart['categories'] = [report.date.strftime("%m/%d") for report in records]
+    chart['categories'] = [date.strftime("%m/%d") for date in dates]
     group_names = app.config.get('EFFICIENCY_MAPPINGS_ORDER', state_mappings.keys())
-    series = []
-    for group_name in group_names:
-        seri_data = []
-        for d in data:
-            seri_data.append(d['stats'][group_name])
-        seri = dict(name=group_name, data=seri_data)
-        series.append(seri)
-    chart['series'] = series
+    chart['series'] = [dict(name=group_name, data=sums[group_name])
+        for group_name in group_names]
 
     table_data = []
-    for row in data:
-        table_row = {'Date': row['date']}
+    for i, date in enumerate(dates):
+        table_row = {'Date': date}
         for group_name in group_names:
-            table_row[group_name] = row['stats'][group_name]
+            table_row[group_name] = sums[group_name][i]
         table_data.append(table_row)
 
-    start_date = records.order_by('date').first().date
     context = {
         'title': "Efficiency",
-        'start_date': start_date,
+        'start_date': dates[0],
         'chart': chart,
         'table_data': table_data,
         'data_keys': ['Date', ] + list(group_names),
-        'updated_at': records.order_by('date')[len(records) - 1].date,
+        'updated_at': dates[-1],
         'version': VERSION,
     }
     return render_template('chart-efficiency.html', **context)
@@ -1130,6 +1117,26 @@ def report_flow(group="all", months=3):
     return render_template('chart-flow.html', **context)
 
 
+def report_transitions(state_slug, group="all", months=3):
+    try:
+        state = config_snapshot().states.find_by_slug(state_slug)
+    except KeyError:
+        abort(404)
+
+    end = make_end_date(date=kardboard.util.now())
+    start = make_start_date(date=month_ranges(end, months)[0][0])
+
+    weekdays_only = request.args.get('weekdays', '') == '1'
+    data = {'state': state, 'group': group}
+    for kind in (transitions_service.ENTERED, transitions_service.EXITED):
+        series = transitions_service.state_transitions(state, start, end,
+            group, kind, weekdays_only)
+        data[kind] = [(day.strftime("%Y-%m-%d"), count) for day, count in series]
+        data['%s_histogram' % kind] = sorted(
+            transitions_service.histogram(series).items())
+    return jsonify(**data)
+
+
 def report_detailed_flow_cards(group="all", months=3):
     return report_detailed_flow(group, months, cards_only=True)
 
@@ -1141,56 +1148,32 @@ def report_detailed_flow(group="all", months=3, cards_only=False):
     start_day = make_start_date(date=months_ranges[0][0])
     end_day = make_end_date(date=end)
 
-    if cards_only:
-        only_arg = ('state_card_counts', 'date', 'group')
-    else:
-        only_arg = ('state_counts', 'date', 'group')
-
-    reports = FlowReport.objects.filter(
-        date__gte=start_day,
-        date__lte=end_day,
-        group=group).only(*only_arg)
-    if not reports:
+    states = list(config_snapshot().states)
+    dates, columns, updated_at = FlowSeries.slice(group, start_day, end_day,
+        states, cards_only=cards_only)
+    if not dates:
         abort(404)
 
     chart = {}
-    chart['categories'] = []
+    chart['categories'] = [date.strftime("%m/%d") for date in dates]
 
     series = []
-    for state in States():
-        seri = {'name': state, 'data': []}
-        series.append(seri)
-
-    done_starting_point = 0
-    for report in reports:
-        chart['categories'].append(report.date.strftime("%m/%d"))
-        for seri in series:
-            if cards_only:
-                daily_seri_data = report.state_card_counts.get(seri['name'], 0)
-            else:
-                daily_seri_data = report.state_counts.get(seri['name'], 0)
-
-            if seri['name'] == "Done":
-                if len(seri['data']) == 0:
-                    done_starting_point = daily_seri_data
-                    daily_seri_data = 0
-                else:
-                    daily_seri_data = daily_seri_data - done_starting_point
-
-            seri['data'].append(daily_seri_data)
+    for state in states:
+        data = [count or 0 for count in columns[state]]
+        if state == "Done":
+            data = [count - data[0] for count in data]
+        series.append({'name': state, 'data': data})
     chart['series'] = series
 
-    start_date = reports.order_by('date').first().date
-    reports.order_by('-date')
     context = {
         'title': "Detailed Cumulative Flow",
-        'reports': reports,
+        'rows': zip(dates, zip(*[columns[state] for state in states])),
         'months': months,
         'cards_only': cards_only,
         'chart': chart,
-        'start_date': start_date,
-        'updated_at': reports[0].updated_at,
-        'states': States(),
+        'start_date': dates[0],
+        'updated_at': updated_at,
+        'states': states,
         'version': VERSION,
     }
     return render_template('report-detailed-flow.html', **context)
@@ -1204,13 +1187,7 @@ def login():
     f = LoginForm(request.form)
 
     if request.method == "POST" and f.validate():
-        helper_setting = app.config['TICKET_HELPER']
-        modname = '.'.join(helper_setting.split('.')[:-1])
-        klassnam = helper_setting.split('.')[-1]
-        mod = importlib.import_module(modname)
-        klass = getattr(mod, klassnam)
-
-        helper = klass(app.config, None)
+        helper = get_ticket_helper(None)
         result = helper.login(f.username.data, f.password.data)
         if result:
             session['username'] = f.username.data
@@ -1279,6 +1256,8 @@ app.add_url_rule('/reports/<group>/cycle/distribution/all/', 'report_cycle_distr
 app.add_url_rule('/reports/<group>/cycle/distribution/all/<int:months>/', 'report_cycle_distribution', report_cycle_distribution)
 app.add_url_rule('/reports/<group>/flow/', 'report_flow', report_flow)
 app.add_url_rule('/reports/<group>/flow/<int:months>/', 'report_flow', report_flow)
+app.add_url_rule('/reports/<group>/transitions/<state_slug>/', 'report_transitions', report_transitions)
+app.add_url_rule('/reports/<group>/transitions/<state_slug>/<int:months>/', 'report_transitions', report_transitions)
 app.add_url_rule('/reports/<group>/flow/detail/', 'report_detailed_flow', report_detailed_flow)
 app.add_url_rule('/reports/<group>/flow/detail/<int:months>/', 'report_detailed_flow', report_detailed_flow)
 app.add_url_rule('/reports/<group>/flow/detail/cards/', 'report_detailed_flow_cards', report_detailed_flow_cards)
@@ -1307,3 +1286,5 @@ app.add_url_rule('/team/<team_slug>/', 'team', team)
 app.add_url_rule('/team/<team_slug>/backlog/', 'team_backlog', team_backlog, methods=["GET", "POST"])
 app.add_url_rule('/funnel/<state_slug>/', 'funnel', funnel, methods=["GET", "POST"])
 app.add_url_rule('/favicon.ico', 'favicon', favicon)
+
+app.teardown_request(StateLog.flush_journal)